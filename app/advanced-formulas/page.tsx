@@ -2,7 +2,7 @@
 
 import { useState, useRef, useEffect } from 'react'
 import { Search, FileText, Database, Upload, CheckCircle, XCircle, Loader2, Eye, Trash2, Save, ArrowLeft } from 'lucide-react'
-import { buildApiUrl } from '@/lib/config'
+import { apiFetch, buildApiUrl } from '@/lib/config'
 
 export default function AdvancedFormulasPage() {
   const [activeTab, setActiveTab] = useState('vlookup')
@@ -24,7 +24,7 @@ export default function AdvancedFormulasPage() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const response = await fetch(buildApiUrl('/data-info'))
+        const response = await apiFetch(buildApiUrl('/data-info'))
         if (response.ok) {
           const dataInfo = await response.json()
           setData(dataInfo)
@@ -40,7 +40,7 @@ export default function AdvancedFormulasPage() {
   useEffect(() => {
     const fetchLookupTables = async () => {
       try {
-        const response = await fetch(buildApiUrl('/lookup-tables'))
+        const response = await apiFetch(buildApiUrl('/lookup-tables'))
         if (response.ok) {
           const tables = await response.json()
           setLookupTables(tables)
@@ -385,7 +385,7 @@ function VLOOKUPForm({ data, lookupTables, selectedLookupTable, setSelectedLooku
     setError(null)
 
     try {
-      const response = await fetch(buildApiUrl('/apply-vlookup'), {
+      const response = await apiFetch(buildApiUrl('/apply-vlookup'), {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -609,7 +609,7 @@ function XLOOKUPForm({ data, lookupTables, selectedLookupTable, setSelectedLooku
     setError(null)
 
     try {
-      const response = await fetch(buildApiUrl('/apply-xlookup'), {
+      const response = await apiFetch(buildApiUrl('/apply-xlookup'), {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -729,6 +729,7 @@ function XLOOKUPForm({ data, lookupTables, selectedLookupTable, setSelectedLooku
             <option value="exact_or_next">Exact or Next</option>
             <option value="exact_or_previous">Exact or Previous</option>
             <option value="wildcard">Wildcard Match</option>
+            <option value="wildcard_pattern">Wildcard Pattern (* and ?)</option>
           </select>
         </div>
 
@@ -792,14 +793,16 @@ function XLOOKUPForm({ data, lookupTables, selectedLookupTable, setSelectedLooku
 function DAXForm({ data, lookupTables, selectedLookupTable, setSelectedLookupTable, onApply, setLoading, setError }: any) {
   const [formData, setFormData] = useState({
     resultColumnName: 'DAX_Result',
-    filters: [{ column: '', value: '' }],
-    returnColumn: ''
+    filters: [{ column: '', value: '', mainColumn: '' }],
+    returnColumn: '',
+    onMultiple: 'first',
+    alternateResult: ''
   })
 
   const addFilter = () => {
     setFormData({
       ...formData,
-      filters: [...formData.filters, { column: '', value: '' }]
+      filters: [...formData.filters, { column: '', value: '', mainColumn: '' }]
     })
   }
 
@@ -810,14 +813,14 @@ function DAXForm({ data, lookupTables, selectedLookupTable, setSelectedLookupTab
     })
   }
 
-  const updateFilter = (index: number, field: 'column' | 'value', value: string) => {
+  const updateFilter = (index: number, field: 'column' | 'value' | 'mainColumn', value: string) => {
     const newFilters = [...formData.filters]
     newFilters[index][field] = value
     setFormData({ ...formData, filters: newFilters })
   }
 
   const handleApply = async () => {
-    if (!selectedLookupTable || !formData.returnColumn || formData.filters.some(f => !f.column || !f.value)) {
+    if (!selectedLookupTable || !formData.returnColumn || formData.filters.some(f => !f.column || (!f.value && !f.mainColumn))) {
       setError('Please select a lookup table and configure all filter conditions')
       return
     }
@@ -826,14 +829,16 @@ function DAXForm({ data, lookupTables, selectedLookupTable, setSelectedLookupTab
     setError(null)
 
     try {
-      const response = await fetch(buildApiUrl('/apply-dax-lookup'), {
+      const response = await apiFetch(buildApiUrl('/apply-dax-lookup'), {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           lookupTableId: selectedLookupTable.id,
           returnColumn: formData.returnColumn,
           resultColumnName: formData.resultColumnName,
-          filters: formData.filters
+          filters: formData.filters,
+          onMultiple: formData.onMultiple,
+          alternateResult: formData.alternateResult
         })
       })
 
@@ -911,6 +916,36 @@ function DAXForm({ data, lookupTables, selectedLookupTable, setSelectedLookupTab
             ))}
           </select>
         </div>
+
+        {/* Multiple Matches */}
+        <div>
+          <label className="block text-sm font-medium text-gray-700 mb-2" style={{ fontFamily: 'Inter, sans-serif' }}>
+            If Multiple Values Match
+          </label>
+          <select
+            value={formData.onMultiple}
+            onChange={(e) => setFormData({...formData, onMultiple: e.target.value})}
+            className="w-full p-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+          >
+            <option value="first">Use First Match</option>
+            <option value="blank">Use Alternate Result</option>
+            <option value="error">Raise Error</option>
+          </select>
+        </div>
+
+        {/* Alternate Result */}
+        <div>
+          <label className="block text-sm font-medium text-gray-700 mb-2" style={{ fontFamily: 'Inter, sans-serif' }}>
+            Alternate Result
+          </label>
+          <input
+            type="text"
+            value={formData.alternateResult}
+            onChange={(e) => setFormData({...formData, alternateResult: e.target.value})}
+            className="w-full p-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+            placeholder="Value when nothing matches (optional)"
+          />
+        </div>
       </div>
 
       {/* Filter Conditions */}
@@ -941,12 +976,23 @@ function DAXForm({ data, lookupTables, selectedLookupTable, setSelectedLookupTab
                 <option key={col.name} value={col.name}>{col.name}</option>
               ))}
             </select>
+            <select
+              value={filter.mainColumn}
+              onChange={(e) => updateFilter(index, 'mainColumn', e.target.value)}
+              className="flex-1 p-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+            >
+              <option value="">Match a fixed value...</option>
+              {data?.column_info?.map((col: any) => (
+                <option key={col.name} value={col.name}>Main column: {col.name}</option>
+              ))}
+            </select>
             <input
               type="text"
               value={filter.value}
               onChange={(e) => updateFilter(index, 'value', e.target.value)}
               className="flex-1 p-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-transparent"
               placeholder="Enter value"
+              disabled={!!filter.mainColumn}
             />
             {formData.filters.length > 1 && (
               <button
@@ -966,7 +1012,7 @@ function DAXForm({ data, lookupTables, selectedLookupTable, setSelectedLookupTab
           Formula Preview
         </label>
         <div className="bg-gray-100 p-4 rounded-lg font-mono text-sm">
-          LOOKUPVALUE({formData.returnColumn || 'return_column'}, {formData.filters.map(f => `${f.column || 'column'} = "${f.value || 'value'}"`).join(', ')})
+          LOOKUPVALUE({formData.returnColumn || 'return_column'}, {formData.filters.map(f => `${f.column || 'column'} = ${f.mainColumn ? `[${f.mainColumn}]` : `"${f.value || 'value'}"`}`).join(', ')})
         </div>
       </div>
 
@@ -974,7 +1020,7 @@ function DAXForm({ data, lookupTables, selectedLookupTable, setSelectedLookupTab
       <div className="mt-6">
         <button
           onClick={handleApply}
-          disabled={!selectedLookupTable || !formData.returnColumn || formData.filters.some(f => !f.column || !f.value)}
+          disabled={!selectedLookupTable || !formData.returnColumn || formData.filters.some(f => !f.column || (!f.value && !f.mainColumn))}
           className="btn-primary transition-all duration-200 hover:scale-105 disabled:opacity-50 disabled:cursor-not-allowed"
         >
           <span className="button_top flex items-center space-x-2">
@@ -1004,7 +1050,7 @@ function LookupTableManager({ lookupTables, setLookupTables, setSelectedLookupTa
     formData.append('table_name', tableName)
 
     try {
-      const response = await fetch(buildApiUrl('/upload-lookup-table'), {
+      const response = await apiFetch(buildApiUrl('/upload-lookup-table'), {
         method: 'POST',
         body: formData
       })
@@ -1024,7 +1070,7 @@ function LookupTableManager({ lookupTables, setLookupTables, setSelectedLookupTa
 
   const handleDeleteTable = async (tableId: string) => {
     try {
-      const response = await fetch(buildApiUrl(`/delete-lookup-table/${tableId}`), {
+      const response = await apiFetch(buildApiUrl(`/delete-lookup-table/${tableId}`), {
         method: 'DELETE'
       })
 
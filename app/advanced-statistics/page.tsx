@@ -23,7 +23,7 @@ import {
   Eye,
   Trash2
 } from 'lucide-react'
-import { buildApiUrl } from '@/lib/config'
+import { apiFetch, buildApiUrl } from '@/lib/config'
 
 export default function AdvancedStatisticsPage() {
   const [activeTab, setActiveTab] = useState('hypothesis')
@@ -37,7 +37,7 @@ export default function AdvancedStatisticsPage() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const response = await fetch(buildApiUrl('/data-info'))
+        const response = await apiFetch(buildApiUrl('/data-info'))
         if (response.ok) {
           const newData = await response.json()
           setData(newData)
@@ -444,7 +444,7 @@ function HypothesisTestPanel({ data, onApply, setLoading, setError, setProgress
         })
       }, 200)
 
-      const response = await fetch(buildApiUrl('/hypothesis-test'), {
+      const response = await apiFetch(buildApiUrl('/hypothesis-test'), {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -614,7 +614,7 @@ function MultivariatePanel({ data, onApply, setLoading, setError, setProgress }:
         })
       }, 200)
 
-      const response = await fetch(buildApiUrl('/multivariate'), {
+      const response = await apiFetch(buildApiUrl('/multivariate'), {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -807,7 +807,7 @@ function BayesianPanel({ data, onApply, setLoading, setError, setProgress }: any
         })
       }, 200)
 
-      const response = await fetch(buildApiUrl('/bayesian'), {
+      const response = await apiFetch(buildApiUrl('/bayesian'), {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
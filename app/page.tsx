@@ -6,7 +6,7 @@ import DataUpload from '@/components/DataUpload'
 import DataExploration from '@/components/DataExploration'
 import DataVisualization from '@/components/DataVisualization'
 import ReportGeneration from '@/components/ReportGeneration'
-import { buildApiUrl } from '@/lib/config';
+import { apiFetch, buildApiUrl } from '@/lib/config';
 
 export default function HomePage() {
   const [activeTab, setActiveTab] = useState('upload')
@@ -16,7 +16,7 @@ export default function HomePage() {
 
   const refreshData = async () => {
     try {
-      const response = await fetch(buildApiUrl('/data-info'))
+      const response = await apiFetch(buildApiUrl('/data-info'))
       if (response.ok) {
         const newData = await response.json()
         setData(newData)
@@ -0,0 +1,151 @@
+"""
+Peak RSS per endpoint with the copy-on-write DataProcessor vs the previous one,
+which deep-copied the frame twice on construction.
+
+Run from the backend directory (Linux only, it reads and resets the peak RSS
+through /proc/self):
+    python benchmarks/memory_benchmark.py [--rows 1000000]
+
+Each implementation runs in a fresh process. Before every request the peak RSS
+is reset, so the reported figure is how far above its starting RSS the process
+went while serving that one request.
+"""
+import argparse
+import ctypes
+import gc
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ENDPOINTS = [
+    ("GET", "/data-info", None),
+    ("POST", "/detect-outliers", {"column": "amount", "method": "iqr"}),
+    ("POST", "/clean-data", {"method": "mean"}),
+    ("POST", "/remove-outliers", {"column": "amount", "method": "zscore"}),
+    ("POST", "/convert-type", {"column": "quantity", "target_type": "string"}),
+    ("POST", "/generate-report", {"title": "Benchmark", "company": "Bench", "charts": "[]"}),
+]
+
+
+def _status_kb(field: str) -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise RuntimeError(f"{field} not found in /proc/self/status")
+
+
+def _release_free_memory() -> None:
+    """Return freed heap to the OS, so memory reused from an earlier request shows up again"""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _reset_peak() -> None:
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+
+
+def _legacy_init(self, df, read_only=False):
+    """DataProcessor.__init__ as it was: two deep copies, whatever the request does"""
+    self.read_only = False
+    self.df = df.copy()
+    self.original_df = df.copy()
+    self.touched_columns = set()
+    self.kept_rows = np.ones(len(df), dtype=bool)
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    amount = rng.normal(100, 25, rows)
+    amount[rng.random(rows) < 0.05] = np.nan
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "amount": amount,
+        "quantity": rng.integers(1, 50, rows),
+        "price": rng.gamma(2.0, 10.0, rows),
+        "region": rng.choice(["North", "South", "East", "West"], rows).astype(object),
+        "sku": pd.Series(rng.integers(0, 20_000, rows)).map("SKU-{:05d}".format).astype(object),
+    })
+
+
+def run(implementation: str, rows: int) -> None:
+    """Serve every endpoint once and print one JSON line per endpoint"""
+    import asyncio
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    import data_processing
+    from routes import data, data_info, report
+    from shared_state import set_current_data, set_current_cleaned_data
+
+    if implementation == "legacy":
+        data_processing.DataProcessor.__init__ = _legacy_init
+
+    app = FastAPI()
+    for module in (data, data_info, report):
+        app.include_router(module.router)
+    client = TestClient(app)
+
+    df = make_frame(rows)
+    frame_mb = df.memory_usage(deep=True).sum() / 2 ** 20
+    asyncio.run(set_current_data(df))
+    for method, path, form in ENDPOINTS:
+        # Every request starts from the same data, as a new version so nothing is cached
+        asyncio.run(set_current_cleaned_data(df))
+        _release_free_memory()
+        _reset_peak()
+        start_kb = _status_kb("VmRSS")
+        response = client.request(method, path, data=form)
+        peak_kb = _status_kb("VmHWM")
+        print(json.dumps({
+            "endpoint": path,
+            "status": response.status_code,
+            "frame_mb": round(frame_mb, 1),
+            "peak_mb": round((peak_kb - start_kb) / 1024, 1)
+        }), flush=True)
+        del response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--implementation", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.implementation:
+        run(args.implementation, args.rows)
+        return
+
+    # A fixed mmap threshold makes glibc give every large array its own mapping, which is
+    # unmapped on free, so one request's freed arrays cannot hide the next one's growth
+    env = dict(os.environ, MALLOC_MMAP_THRESHOLD_="131072")
+    results = {}
+    for implementation in ("legacy", "current"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--rows", str(args.rows), "--implementation", implementation],
+            check=True, capture_output=True, text=True, env=env
+        ).stdout
+        results[implementation] = [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+
+    frame_mb = results["current"][0]["frame_mb"]
+    print(f"rows: {args.rows:,}  frame: {frame_mb:.1f} MB")
+    print(f"{'endpoint':<20}{'status':>8}{'legacy peak (MB)':>19}{'current peak (MB)':>20}{'saved':>9}")
+    for legacy, current in zip(results["legacy"], results["current"]):
+        saved = legacy["peak_mb"] - current["peak_mb"]
+        print(f"{current['endpoint']:<20}{current['status']:>8}{legacy['peak_mb']:>19.1f}"
+              f"{current['peak_mb']:>20.1f}{saved:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
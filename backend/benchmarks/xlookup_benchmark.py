@@ -0,0 +1,89 @@
+"""
+XLOOKUP exact_or_next / exact_or_previous: per-row scan vs vectorized as-of join.
+
+Run from the backend directory:
+    python benchmarks/xlookup_benchmark.py [--keys 10000] [--legacy-sample 2000]
+
+The per-row implementation is quadratic, so it is timed on a sample of rows
+and extrapolated linearly to the full row count (its cost per row does not
+depend on the number of rows).
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lookup_engine import SortedLookup, unique_keys  # noqa: E402
+
+
+def legacy_xlookup(lookup_values: pd.Series, lookup_df: pd.DataFrame, search_mode: str) -> pd.Series:
+    """The previous per-row implementation, kept here for comparison"""
+    lookup_dict = dict(zip(lookup_df.iloc[:, 0], lookup_df.iloc[:, 1]))
+
+    def xlookup(value):
+        if pd.isna(value):
+            return ''
+        if value in lookup_dict:
+            return lookup_dict[value]
+        if search_mode == 'exact_or_next':
+            for lv in sorted(lookup_dict.keys()):
+                if lv >= value:
+                    return lookup_dict[lv]
+        else:
+            for lv in sorted(lookup_dict.keys(), reverse=True):
+                if lv <= value:
+                    return lookup_dict[lv]
+        return ''
+
+    return lookup_values.apply(xlookup)
+
+
+def vectorized_xlookup(lookup_values: pd.Series, lookup_df: pd.DataFrame, search_mode: str) -> pd.Series:
+    keys, values = unique_keys(lookup_df.iloc[:, 0], lookup_df.iloc[:, 1])
+    sorted_lookup = SortedLookup(keys, values)
+    if search_mode == 'exact_or_next':
+        return sorted_lookup.exact_or_next(lookup_values, '')
+    return sorted_lookup.exact_or_previous(lookup_values, '')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=10_000, help="rows in the lookup table")
+    parser.add_argument("--legacy-sample", type=int, default=2_000, help="rows timed for the per-row version")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    lookup_df = pd.DataFrame({
+        "key": rng.choice(args.keys * 10, size=args.keys, replace=False),
+        "value": rng.integers(0, 1_000_000, size=args.keys)
+    })
+
+    print(f"lookup keys: {args.keys:,}")
+    print(f"{'mode':<18}{'rows':>12}{'per-row (s)':>16}{'vectorized (s)':>17}{'speedup':>10}")
+    for search_mode in ('exact_or_next', 'exact_or_previous'):
+        for rows in args.sizes:
+            lookup_values = pd.Series(rng.integers(0, args.keys * 10, size=rows))
+
+            sample = lookup_values.iloc[:min(rows, args.legacy_sample)]
+            start = time.perf_counter()
+            expected = legacy_xlookup(sample, lookup_df, search_mode)
+            legacy_seconds = (time.perf_counter() - start) * rows / len(sample)
+
+            start = time.perf_counter()
+            result = vectorized_xlookup(lookup_values, lookup_df, search_mode)
+            vectorized_seconds = time.perf_counter() - start
+
+            assert result.iloc[:len(sample)].tolist() == expected.tolist()
+            estimate = "~" if len(sample) < rows else " "
+            print(f"{search_mode:<18}{rows:>12,}{estimate:>4}{legacy_seconds:>12.2f}"
+                  f"{vectorized_seconds:>17.4f}{legacy_seconds / vectorized_seconds:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,58 @@
+import os
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Hashable, List, Optional, Sequence, Tuple
+from profiling import profile_columns, DatasetProfile
+from profile_cache import ProfileCache
+from sketches import DatasetSketch, sketch_frame
+from type_inference import convert_columns
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # Copy-on-write is always on from pandas 3; DataProcessor relies on it to share columns
+    pd.set_option("mode.copy_on_write", True)
+
+# Threads IsolationForest uses to build and score its trees (-1: all cores)
+ISOLATION_FOREST_JOBS = int(os.environ.get("EAA_ISOLATION_FOREST_JOBS", "1"))
+# Outlier flags of recent IsolationForest fits, so removing right after detecting does not refit
+outlier_model_cache = ProfileCache(int(os.environ.get("EAA_OUTLIER_MODEL_CACHE_ENTRIES", "8")))
+
+# Frames with at least this many rows are profiled from sketches by default (0 disables)
+APPROX_PROFILE_ROWS = int(os.environ.get("EAA_APPROX_PROFILE_ROWS", "0"))
 
 class DataProcessor:
-    def __init__(self, df: pd.DataFrame):
-        self.df = df.copy()
-        self.original_df = df.copy()
+    """Profiling and cleaning operations on a frame that is never modified.
+
+    With read_only=True the processor works on the frame itself and its cleaning
+    operations raise. Otherwise self.df is a shallow copy: under copy-on-write
+    the columns stay shared with the input until an operation replaces them, so
+    only what an operation changes is ever copied.
+    """
+    def __init__(self, df: pd.DataFrame, read_only: bool = False, cache_key: Optional[Hashable] = None):
+        self.read_only = read_only
+        # Identifies df (e.g. a data version) so fitted outlier models can be reused
+        self.cache_key = cache_key
+        self.df = df if read_only else df.copy(deep=False)
+        self.original_df = df
+        # What the operations so far changed, relative to original_df
+        self.touched_columns = set()
+        self.kept_rows = np.ones(len(df), dtype=bool)
+    
+    def _check_writable(self) -> None:
+        if self.read_only:
+            raise ValueError("This DataProcessor is read-only")
+    
+    def _touch(self, columns) -> None:
+        self.touched_columns.update(columns)
+    
+    def _drop_rows(self, mask: np.ndarray) -> None:
+        """Drop the rows of self.df selected by a positional mask, recording them"""
+        self.kept_rows[np.flatnonzero(self.kept_rows)[mask]] = False
+        self.df = self.df[~mask]
+    
+    def derive_profile(self, previous: DatasetProfile) -> DatasetProfile:
+        """Profile of self.df from the profile of original_df, redoing only what changed"""
+        dropped = self.original_df[~self.kept_rows] if not self.kept_rows.all() else None
+        return previous.derive(self.df, self.touched_columns, dropped)
     
     def get_basic_info(self) -> Dict[str, Any]:
         rows, cols = self.df.shape
@@ -18,67 +65,43 @@ class DataProcessor:
             'missing_values': missing_values
         }
     def get_column_info(self) -> List[Dict[str, Any]]:
-        columns_info = []
-        for col in self.df.columns:
-            col_info = {
-                'name': col,
-                'dtype': str(self.df[col].dtype),
-                'missing_count': int(self.df[col].isnull().sum()),
-                'unique_count': int(self.df[col].nunique())
-            }
-            if self.df[col].dtype in ['int64', 'float64']:
-                mean_val = self.df[col].mean()
-                std_val = self.df[col].std()
-                min_val = self.df[col].min()
-                max_val = self.df[col].max()
-                col_info.update({
-                    'mean': float(mean_val) if pd.notna(mean_val) else None,
-                    'std': float(std_val) if pd.notna(std_val) else None,
-                    'min': float(min_val) if pd.notna(min_val) else None,
-                    'max': float(max_val) if pd.notna(max_val) else None
-                })
-            else:
-                mode_result = self.df[col].mode()
-                col_info['top_value'] = str(mode_result.iloc[0]) if not mode_result.empty else None
-            columns_info.append(col_info)
-        return columns_info
+        return profile_columns(self.df)
     def get_preview(self, rows: int = 10) -> List[Dict[str, Any]]:
-        preview_data = self.df.head(rows).copy()
-        preview = []
-        for _, row in preview_data.iterrows():
-            row_dict = {}
-            for col, value in row.items():
-                if pd.isna(value):
-                    row_dict[col] = None
-                elif pd.api.types.is_numeric_dtype(self.df[col]):
-                    row_dict[col] = float(value) if pd.notna(value) else None
-                else:
-                    row_dict[col] = str(value) if pd.notna(value) else None
-            preview.append(row_dict)
-        return preview
+        return frame_preview(self.df, 0, rows)
     def clean_missing_values(self, method: str = "drop", fill_value: Optional[Any] = None) -> pd.DataFrame:
+        self._check_writable()
+        # Filling only changes, and so only copies, the columns that have missing values
+        has_missing = self.df.isna().any()
         if method == "drop":
-            self.df = self.df.dropna()
-        elif method == "mean":
-            numeric_cols = self.df.select_dtypes(include=[np.number]).columns
-            self.df[numeric_cols] = self.df[numeric_cols].fillna(self.df[numeric_cols].mean())
-        elif method == "median":
-            numeric_cols = self.df.select_dtypes(include=[np.number]).columns
-            self.df[numeric_cols] = self.df[numeric_cols].fillna(self.df[numeric_cols].median())
+            self._drop_rows(self.df.isna().any(axis=1).to_numpy())
+        elif method in ("mean", "median", "zero"):
+            numeric_cols = [col for col in self.df.select_dtypes(include=[np.number]).columns if has_missing[col]]
+            if numeric_cols:
+                if method == "mean":
+                    fill = self.df[numeric_cols].mean()
+                elif method == "median":
+                    fill = self.df[numeric_cols].median()
+                else:
+                    fill = 0
+                self.df[numeric_cols] = self.df[numeric_cols].fillna(fill)
+            self._touch(numeric_cols)
         elif method == "mode":
             for col in self.df.columns:
+                if not has_missing[col]:
+                    continue
                 mode_val = self.df[col].mode()
                 if not mode_val.empty:
                     self.df[col] = self.df[col].fillna(mode_val.iloc[0])
-        elif method == "zero":
-            numeric_cols = self.df.select_dtypes(include=[np.number]).columns
-            self.df[numeric_cols] = self.df[numeric_cols].fillna(0)
+            self._touch(col for col in self.df.columns if has_missing[col])
         elif method == "custom" and fill_value is not None:
             self.df = self.df.fillna(fill_value)
+            self._touch(col for col in self.df.columns if has_missing[col])
         return self.df
     def detect_outliers(self, column: str, method: str = "zscore", threshold: float = 3.0) -> List[int]:
         if column not in self.df.columns:
             return []
+        if method == "isolation_forest":
+            return self.isolation_forest_outliers([column])
         col_data = self.df[column].dropna()
         if method == "zscore":
             z_scores = np.abs((col_data - col_data.mean()) / col_data.std())
@@ -90,28 +113,141 @@ class DataProcessor:
             lower_bound = Q1 - 1.5 * IQR
             upper_bound = Q3 + 1.5 * IQR
             outlier_indices = (col_data < lower_bound) | (col_data > upper_bound)
-        elif method == "isolation_forest":
-            if len(col_data) < 10:
-                return []
-            from sklearn.ensemble import IsolationForest
-            iso_forest = IsolationForest(contamination=0.1, random_state=42)
-            outlier_indices = iso_forest.fit_predict(col_data.values.reshape(-1, 1)) == -1
         outlier_rows = col_data[outlier_indices].index.tolist()
         return outlier_rows
-    def remove_outliers(self, column: str, method: str = "zscore") -> pd.DataFrame:
-        outlier_indices = self.detect_outliers(column, method)
-        self.df = self.df.drop(outlier_indices)
+    def isolation_forest_outliers(self, columns: Sequence[str], contamination: float = 0.1,
+                                  max_samples: Any = "auto") -> List[int]:
+        """Index labels of the rows an IsolationForest over the columns flags, rows with a
+        missing value left out. Each tree is fit on max_samples rows ("auto": up to 256).
+        With a cache_key the flags are cached, so detect then remove fits once."""
+        key = None
+        if self.cache_key is not None:
+            key = ("isolation_forest", self.cache_key, tuple(columns), contamination, max_samples)
+            cached = outlier_model_cache.get(key)
+            if cached is not None:
+                return cached["outliers"]
+        data = self.df[list(columns)].dropna()
+        if len(data) < 10:
+            return []
+        from sklearn.ensemble import IsolationForest
+        iso_forest = IsolationForest(contamination=contamination, max_samples=max_samples,
+                                     n_jobs=ISOLATION_FOREST_JOBS, random_state=42)
+        flags = iso_forest.fit_predict(data.to_numpy(dtype=float)) == -1
+        outliers = data.index[flags].tolist()
+        if key is not None:
+            outlier_model_cache.put(key, {"model": iso_forest, "outliers": outliers})
+        return outliers
+    def detect_outliers_all(self, method: str = "zscore", threshold: float = 3.0) -> Dict[str, Any]:
+        """Outlier counts of every numeric column at once, with z-scores or IQR fences
+        computed on the whole numeric matrix (same rules as detect_outliers)"""
+        numeric = self.df.select_dtypes(include=[np.number])
+        values = numeric.to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if method == "zscore":
+                counts = (~np.isnan(values)).sum(axis=0)
+                means = np.nanmean(values, axis=0) if len(values) else np.full(values.shape[1], np.nan)
+                stds = np.nanstd(values, axis=0, ddof=1) if len(values) else means
+                stds = np.where(counts > 1, stds, np.nan)
+                flags = np.abs((values - means) / stds) > threshold
+            elif method == "iqr":
+                if len(values):
+                    q1, q3 = np.nanquantile(values, [0.25, 0.75], axis=0)
+                else:
+                    q1 = q3 = np.full(values.shape[1], np.nan)
+                iqr = q3 - q1
+                flags = (values < q1 - 1.5 * iqr) | (values > q3 + 1.5 * iqr)
+            else:
+                raise ValueError("method must be zscore or iqr")
+        return {
+            "columns": [{"name": name, "outlier_count": int(count)}
+                        for name, count in zip(numeric.columns, flags.sum(axis=0))],
+            "rows_with_outliers": int(flags.any(axis=1).sum())
+        }
+    def remove_outliers(self, column: Optional[str], method: str = "zscore",
+                        columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Drop the outliers of one column, or with columns (isolation_forest only) the rows a
+        multivariate IsolationForest over those columns flags"""
+        self._check_writable()
+        if columns:
+            outlier_indices = self.isolation_forest_outliers(columns)
+        else:
+            outlier_indices = self.detect_outliers(column, method)
+        self._drop_rows(self.df.index.isin(outlier_indices))
         return self.df
     def convert_data_type(self, column: str, target_type: str) -> pd.DataFrame:
+        return self.convert_data_types({column: target_type})
+
+    def convert_data_types(self, conversions: Dict[str, str]) -> pd.DataFrame:
+        """Convert several columns at once (in parallel, with inferred formats for text columns)"""
+        self._check_writable()
         try:
-            if target_type == "string":
-                self.df[column] = self.df[column].astype(str)
-            elif target_type == "numeric":
-                self.df[column] = pd.to_numeric(self.df[column], errors='coerce')
-            elif target_type == "datetime":
-                self.df[column] = pd.to_datetime(self.df[column], errors='coerce')
-            elif target_type == "categorical":
-                self.df[column] = self.df[column].astype('category')
-            return self.df
+            converted = convert_columns(self.df, conversions)
         except Exception as e:
-            raise ValueError(f"Error converting {column} to {target_type}: {str(e)}") 
\ No newline at end of file
+            columns = ", ".join(map(str, conversions))
+            targets = ", ".join(sorted(set(conversions.values())))
+            raise ValueError(f"Error converting {columns} to {targets}: {str(e)}")
+        for column, series in converted.items():
+            self.df[column] = series
+        self._touch(list(converted))
+        return self.df
+
+def frame_preview(df: pd.DataFrame, offset: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+    """Rows offset..offset+limit as dicts: numeric columns as float, others as str, missing as None.
+
+    Converts column by column instead of cell by cell.
+    """
+    page = df.iloc[offset:offset + limit]
+    if page.shape[1] == 0:
+        return [{} for _ in range(len(page))]
+    columns = []
+    for i in range(page.shape[1]):
+        series = page.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            values = series.to_numpy(dtype=float, na_value=np.nan).tolist()
+            columns.append([None if value != value else value for value in values])
+        else:
+            missing = series.isna().to_numpy()
+            columns.append([None if is_missing else str(value) for value, is_missing in zip(series.tolist(), missing)])
+    names = list(page.columns)
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+def profile_summary(df: pd.DataFrame, profile: Optional[DatasetProfile] = None):
+    """basic_info, column_info and preview for df together with its DatasetProfile (built unless given)"""
+    if profile is None:
+        profile = DatasetProfile.build(df)
+    summary = {
+        "basic_info": profile.basic_info(),
+        "column_info": profile.column_info(),
+        "preview": frame_preview(df)
+    }
+    return summary, profile
+
+def build_summary(df: pd.DataFrame) -> Dict[str, Any]:
+    """basic_info, column_info and preview for a frame, as returned by most endpoints"""
+    return profile_summary(df)[0]
+
+def use_approximate(rows: int, requested: Optional[bool] = None) -> bool:
+    """Whether to profile approximately: as requested, else by the EAA_APPROX_PROFILE_ROWS threshold"""
+    if requested is not None:
+        return requested
+    return APPROX_PROFILE_ROWS > 0 and rows >= APPROX_PROFILE_ROWS
+
+def approximate_summary(df: pd.DataFrame, sketch: Optional[DatasetSketch] = None) -> Tuple[Dict[str, Any], DatasetSketch]:
+    """Like profile_summary, but distinct counts and top values come from sketches (built unless
+    given) and the summary carries their error bounds under "approximation"
+    """
+    if sketch is None:
+        sketch = sketch_frame(df)
+    column_info = sketch.column_info(df.dtypes)
+    summary = {
+        "basic_info": {
+            'rows': int(len(df)),
+            'columns': int(df.shape[1]),
+            'file_size': f"{df.memory_usage(deep=True).sum() / 1024:.1f} KB",
+            'missing_values': int(sum(col['missing_count'] for col in column_info))
+        },
+        "column_info": column_info,
+        "preview": frame_preview(df),
+        "approximation": sketch.error_bounds()
+    }
+    return summary, sketch
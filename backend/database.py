@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, LargeBinary
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, LargeBinary, inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -30,7 +31,39 @@ class SavedData(Base):
     id = Column(Integer, primary_key=True, index=True)
     dataset_id = Column(Integer, index=True)
     data_type = Column(String)  # 'cleaned', 'processed', 'original'
-    data_content = Column(LargeBinary)  # Pickled pandas DataFrame
+    data_content = Column(LargeBinary)  # Pickled pandas DataFrame (legacy rows and non-Arrow frames)
+    storage_format = Column(String)  # 'arrow' or 'pickle'; NULL for rows written before Arrow storage
+    file_path = Column(String)  # Arrow IPC file when storage_format is 'arrow'
+    schema_json = Column(Text)  # JSON list of column names and dtypes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class CleaningRecipe(Base):
+    __tablename__ = "cleaning_recipes"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, index=True)
+    description = Column(Text)
+    steps = Column(Text)  # JSON list of transformation steps, in order
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SharedDataset(Base):
+    """A published version of a session's current data, when datasets are shared between workers"""
+    __tablename__ = "shared_datasets"
+    # AUTOINCREMENT keeps ids (the data versions) from being reused
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, index=True)  # data version
+    session_id = Column(String, index=True)
+    dataset_id = Column(String)
+    original_path = Column(String)  # Arrow IPC file of the original data
+    cleaned_path = Column(String)  # Arrow IPC file of the cleaned data; NULL if it could not be shared
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Migration(Base):
+    """A one-off data migration, claimed by the first worker process to start it"""
+    __tablename__ = "migrations"
+
+    name = Column(String, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class User(Base):
@@ -41,7 +74,30 @@ class User(Base):
 
 # Create tables
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        try:
+            table.create(bind=engine, checkfirst=True)
+        except OperationalError:
+            # Created meanwhile by another worker process (uvicorn --workers N)
+            pass
+    _add_missing_columns()
+
+def _add_missing_columns():
+    """create_all does not alter existing tables, so add columns introduced since"""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {col['name'] for col in inspector.get_columns(table.name)}
+        missing = [col for col in table.columns if col.name not in existing]
+        if not missing:
+            continue
+        for col in missing:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}'))
+            except OperationalError:
+                # Added meanwhile by another worker process (duplicate column)
+                if col.name not in {c['name'] for c in inspect(engine).get_columns(table.name)}:
+                    raise
 
 # Database dependency
 def get_db():
@@ -0,0 +1,582 @@
+"""
+Datasets held in memory, per session.
+
+A session (the X-Session-Id request header, "default" without one) can have
+several datasets loaded, keyed by dataset id, one of them active: the
+shared_state functions read and replace the active dataset of the session of
+the current request. The frames of all sessions share one memory budget
+(EAA_DATASET_MEMORY_BUDGET_MB); above it the least recently used datasets
+are spilled, as are datasets not used for EAA_DATASET_SPILL_IDLE_SECONDS, by
+a background thread, so requests never wait for spill files to be written. A
+spilled dataset has its frames written to Arrow files in a directory of this
+process and keeps only its schema, row count and profile in memory; its next
+access memory-maps the files again, so columns are paged back in as they are
+read. Datasets Arrow cannot represent are evicted instead if they can be
+reloaded: an evicted dataset keeps its version and its transformation plan, so
+its next access reloads the original from storage and replays the plan to
+rebuild the cleaned data exactly as it was.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dataset_store import DATASET_DIR, frame_schema, read_arrow, write_arrow
+from profile_cache import current_profile_key, profile_cache
+
+# Spills, reloads and evictions happen routinely (e.g. every sweep); the metrics count them
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+SESSION_HEADER = "X-Session-Id"
+
+# Memory all sessions' frames may use together before datasets are spilled (0: no limit)
+DATASET_MEMORY_BUDGET_MB = int(os.environ.get("EAA_DATASET_MEMORY_BUDGET_MB", "2048"))
+# Inactive datasets beyond this many registered ones are forgotten entirely
+DATASET_REGISTRY_ENTRIES = int(os.environ.get("EAA_DATASET_REGISTRY_ENTRIES", "256"))
+# Whether cold datasets are spilled to disk (otherwise only reloadable ones are evicted)
+DATASET_SPILL = int(os.environ.get("EAA_DATASET_SPILL", "1"))
+# Datasets not used for this long are spilled (0: only under memory pressure)
+DATASET_SPILL_IDLE_SECONDS = float(os.environ.get("EAA_DATASET_SPILL_IDLE_SECONDS", "1800"))
+DATASET_SPILL_DIR = os.environ.get("EAA_DATASET_SPILL_DIR", os.path.join(DATASET_DIR, "spill"))
+# Values sampled to estimate the memory of object columns
+_MEMORY_SAMPLE_ROWS = 1000
+
+# Session of the request being served, set by the middleware in main.py
+session_id: contextvars.ContextVar[str] = contextvars.ContextVar("session_id", default=DEFAULT_SESSION)
+
+
+class VersionConflict(Exception):
+    """The dataset was changed since the version a change started from"""
+
+
+def _column_buffer(series: pd.Series) -> Tuple[Hashable, int]:
+    """Key of the buffer holding a column's data, and the column's (estimated) bytes.
+
+    Columns that shallow copies share under copy-on-write have the same key, so
+    a cleaned frame only adds the columns it replaced.
+    """
+    values = series.array
+    if isinstance(series.dtype, np.dtype):
+        data = series.to_numpy(copy=False)
+        size = data.nbytes
+        if series.dtype == object and len(series):
+            positions = np.linspace(0, len(series) - 1, min(len(series), _MEMORY_SAMPLE_ROWS)).astype(np.int64)
+            size = int(series.iloc[positions].memory_usage(index=False, deep=True) * len(series) / len(positions))
+        return ("numpy", data.__array_interface__["data"][0], data.nbytes), size
+    if isinstance(values, pd.Categorical):
+        return ("codes", values.codes.__array_interface__["data"][0]), int(values.nbytes)
+    if isinstance(values, (pd.arrays.ArrowExtensionArray, pd.arrays.ArrowStringArray)):
+        chunks = pa.chunked_array(values.__arrow_array__()).chunks
+        addresses = tuple(buffer.address for chunk in chunks for buffer in chunk.buffers() if buffer is not None)
+        return ("arrow", addresses), int(values.nbytes)
+    return ("array", id(values)), int(values.nbytes)
+
+
+def same_columns(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Whether b is a shallow copy of a that still shares every column"""
+    if a.shape != b.shape or not a.columns.equals(b.columns) or not a.index.equals(b.index):
+        return False
+    return all(_column_buffer(a.iloc[:, i])[0] == _column_buffer(b.iloc[:, i])[0] for i in range(a.shape[1]))
+
+
+def _plan_frames(entry: "DatasetEntry") -> List[pd.DataFrame]:
+    """Frames the entry's plan keeps (formula columns, checkpoints), which stay in memory while
+    the entry is spilled or evicted"""
+    return entry.plan.frames() if entry.plan is not None else []
+
+
+def frames_memory(*frames: Optional[pd.DataFrame]) -> int:
+    """Estimated bytes of the given frames together, counting shared columns once"""
+    buffers: Dict[Hashable, int] = {}
+    for df in frames:
+        if df is None:
+            continue
+        buffers[("index", id(df.index))] = int(df.index.memory_usage())
+        for position in range(df.shape[1]):
+            key, size = _column_buffer(df.iloc[:, position])
+            buffers[key] = size
+    return sum(buffers.values())
+
+
+class DatasetEntry:
+    """One dataset of a session: its original and cleaned frames (None while spilled or
+    evicted), the version of the cleaned data and its transformation plan"""
+
+    def __init__(self, session: str, dataset_id: Hashable, original: pd.DataFrame,
+                 loader: Optional[Callable[[], pd.DataFrame]] = None):
+        self.session = session
+        self.dataset_id = dataset_id
+        self.original: Optional[pd.DataFrame] = original
+        self.cleaned: Optional[pd.DataFrame] = None
+        self.version = 0
+        self.plan = None
+        # Arrow files of the frames while datasets are shared between workers (see shared_datasets)
+        self.original_path: Optional[str] = None
+        self.cleaned_path: Optional[str] = None
+        # Reads the original again from storage; datasets without one are only ever spilled
+        self.loader = loader
+        self.memory_bytes = 0
+        self.last_access = time.time()
+        # Guards the frames and version, held only briefly: the published frames are never
+        # changed in place, a new version replaces them as a whole
+        self.lock = threading.Lock()
+        # Held by a request changing the dataset for the whole change (see shared_state.edit_current_data)
+        self.write_lock = asyncio.Lock()
+        # Kept while the frames are on disk: shape and columns of the current data and,
+        # if it had been computed, its profile summary
+        self.rows = len(original)
+        self.schema = frame_schema(original)
+        self.profile: Optional[Dict[str, Any]] = None
+        # Spill files of the original and of the cleaned data of spill_version
+        self.spill_original: Optional[str] = None
+        self.spill_cleaned: Optional[str] = None
+        self.spill_version: Optional[int] = None
+        self.unspillable_version: Optional[int] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.original is not None
+
+    @property
+    def spilled(self) -> bool:
+        return not self.loaded and self.spill_original is not None and self.spill_version == self.version
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dataset_id": self.dataset_id,
+            "version": self.version,
+            "state": "loaded" if self.loaded else "spilled" if self.spilled else "evicted",
+            "loaded": self.loaded,
+            "evictable": self.loader is not None,
+            "memory_bytes": self.memory_bytes,
+            "rows": self.rows,
+            "schema": self.schema,
+            "idle_seconds": round(time.time() - self.last_access, 3)
+        }
+
+
+class DatasetRegistry:
+    """Datasets by (session, dataset id) in LRU order, with the active dataset of each session"""
+
+    def __init__(self, budget_bytes: int, max_entries: int):
+        self.budget_bytes = max(0, budget_bytes)
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Tuple[str, Hashable], DatasetEntry]" = OrderedDict()
+        self._active: Dict[str, Hashable] = {}
+        self._lock = threading.Lock()
+        # Versions are unique across sessions, so caches keyed by version never mix datasets
+        # (shared_datasets assigns them instead while datasets are shared between workers)
+        self._version = 0
+        self._version_lock = threading.Lock()
+        self.evictions = 0
+        self.reloads = 0
+        self.reload_seconds = 0.0
+        self.spills = 0
+        self.spill_seconds = 0.0
+        self.spill_bytes = 0
+        self.rehydrations = 0
+        self.rehydrate_seconds = 0.0
+        # Spill files of this process, removed on shutdown
+        self.spill_dir = os.path.join(DATASET_SPILL_DIR, uuid.uuid4().hex[:12])
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_sweeper = threading.Event()
+        # Set when the sweeper should enforce the memory budget
+        self._enforce = threading.Event()
+
+    def next_version(self) -> int:
+        with self._version_lock:
+            self._version += 1
+            return self._version
+
+    def register(self, df: pd.DataFrame, dataset_id: Hashable,
+                 loader: Optional[Callable[[], pd.DataFrame]] = None,
+                 session: Optional[str] = None) -> DatasetEntry:
+        """Add (or replace) a dataset of the session and make it the active one"""
+        session = session or session_id.get()
+        entry = DatasetEntry(session, dataset_id, df, loader)
+        with self._lock:
+            replaced = self._entries.get((session, dataset_id))
+            self._entries[(session, dataset_id)] = entry
+            self._entries.move_to_end((session, dataset_id))
+            self._active[session] = dataset_id
+        if replaced is not None:
+            self._remove_spill_files(replaced)
+        self._account(entry)
+        return entry
+
+    def activate(self, dataset_id: Hashable, session: Optional[str] = None) -> Optional[DatasetEntry]:
+        """Make an already registered dataset of the session the active one"""
+        session = session or session_id.get()
+        with self._lock:
+            if (session, dataset_id) not in self._entries:
+                return None
+            self._active[session] = dataset_id
+        return self.active(session)
+
+    def active(self, session: Optional[str] = None) -> Optional[DatasetEntry]:
+        """The active dataset of the session, marked as just used (not necessarily loaded)"""
+        session = session or session_id.get()
+        with self._lock:
+            key = (session, self._active.get(session))
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.last_access = time.time()
+        return entry
+
+    def get(self, dataset_id: Hashable, session: Optional[str] = None) -> Optional[DatasetEntry]:
+        """A registered dataset of the session, marked as just used without activating it"""
+        session = session or session_id.get()
+        with self._lock:
+            entry = self._entries.get((session, dataset_id))
+            if entry is not None:
+                self._entries.move_to_end((session, dataset_id))
+                entry.last_access = time.time()
+        return entry
+
+    def snapshot(self, entry: DatasetEntry) -> Tuple[pd.DataFrame, Optional[pd.DataFrame], int]:
+        """Original frame, cleaned frame and version of the entry, reading it back if it was
+        spilled or evicted"""
+        reloaded = False
+        with entry.lock:
+            if not entry.loaded:
+                self._load(entry)
+                reloaded = True
+            state = entry.original, entry.cleaned, entry.version
+        if reloaded:
+            self._account(entry)
+        return state
+
+    def _load(self, entry: DatasetEntry) -> None:
+        """Bring a spilled or evicted entry back into memory; caller holds entry.lock"""
+        if entry.spilled:
+            self._rehydrate(entry)
+        else:
+            self._reload(entry)
+
+    def _rehydrate(self, entry: DatasetEntry) -> None:
+        """Memory-map the spill files of the entry; caller holds entry.lock"""
+        started = time.time()
+        original = read_arrow(entry.spill_original)
+        if entry.spill_cleaned is None:
+            cleaned = None
+        elif entry.spill_cleaned == entry.spill_original:
+            cleaned = original.copy(deep=False)
+        else:
+            cleaned = read_arrow(entry.spill_cleaned)
+        if entry.plan is not None:
+            entry.plan.base = original
+        entry.cleaned, entry.original = cleaned, original
+        entry.profile = None
+        with self._lock:
+            self.rehydrations += 1
+            self.rehydrate_seconds += time.time() - started
+        logger.debug("Rehydrated dataset %s of session %s in %.3fs",
+                     entry.dataset_id, entry.session, time.time() - started)
+
+    def _reload(self, entry: DatasetEntry) -> None:
+        """Read the original back and rebuild the cleaned data; caller holds entry.lock"""
+        started = time.time()
+        original = entry.loader()
+        cleaned = original.copy(deep=False)
+        if entry.plan is not None:
+            entry.plan.base = original
+            cleaned = entry.plan.frame_at(entry.plan.position)
+        entry.cleaned, entry.original = cleaned, original
+        with self._lock:
+            self.reloads += 1
+            self.reload_seconds += time.time() - started
+        logger.debug("Reloaded dataset %s of session %s in %.2fs",
+                     entry.dataset_id, entry.session, time.time() - started)
+
+    def update(self, entry: DatasetEntry, cleaned: pd.DataFrame, version: Optional[int] = None,
+               expected_version: Optional[int] = None) -> int:
+        """Replace the entry's cleaned data, returning its new version (the given one, if any);
+        with expected_version only if the entry still has that version, else VersionConflict"""
+        with entry.lock:
+            if expected_version is not None and entry.version != expected_version:
+                raise VersionConflict(f"Dataset {entry.dataset_id} is at version {entry.version}, "
+                                      f"not {expected_version}")
+            if not entry.loaded:
+                self._load(entry)
+            entry.cleaned = cleaned
+            entry.version = version if version is not None else self.next_version()
+            version = entry.version
+        self._account(entry)
+        return version
+
+    def remove(self, session: Optional[str] = None) -> None:
+        """Forget the active dataset of the session"""
+        session = session or session_id.get()
+        with self._lock:
+            dataset_id = self._active.pop(session, None)
+            removed = self._entries.pop((session, dataset_id), None)
+        if removed is not None:
+            self._remove_spill_files(removed)
+
+    def _account(self, entry: DatasetEntry) -> None:
+        """Recompute the entry's memory, then spill or evict other datasets while over budget"""
+        with entry.lock:
+            if entry.loaded:
+                current = entry.cleaned if entry.cleaned is not None else entry.original
+                entry.memory_bytes = frames_memory(entry.original, entry.cleaned, *_plan_frames(entry))
+                entry.rows, entry.schema = len(current), frame_schema(current)
+            else:
+                entry.memory_bytes = frames_memory(*_plan_frames(entry))
+        self._request_enforcement()
+
+    def _request_enforcement(self) -> None:
+        """Have the sweeper thread enforce the budget, so requests never wait for spill writes;
+        without a sweeper (e.g. in scripts) it is enforced right away"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            self._enforce.set()
+        else:
+            self.enforce_budget()
+
+    def enforce_budget(self) -> None:
+        """Spill or evict the least recently used datasets while over the memory budget, and
+        forget inactive datasets beyond the entry limit"""
+        victims, forgotten_entries = [], []
+        with self._lock:
+            if self.budget_bytes:
+                total = sum(candidate.memory_bytes for candidate in self._entries.values())
+                # The most recently used dataset stays
+                candidates = list(self._entries.values())[:-1]
+                for candidate in candidates:
+                    if total <= self.budget_bytes:
+                        break
+                    if not candidate.loaded or (candidate.loader is None and not DATASET_SPILL):
+                        continue
+                    total -= candidate.memory_bytes
+                    victims.append(candidate)
+            while len(self._entries) > self.max_entries:
+                # Sessions keep their active dataset; the oldest inactive one goes first
+                forgettable = next((key for key in self._entries if self._active.get(key[0]) != key[1]), None)
+                if forgettable is None:
+                    break
+                forgotten_entries.append(self._entries.pop(forgettable))
+        for forgotten in forgotten_entries:
+            self._drop_frames(forgotten)
+            self._remove_spill_files(forgotten)
+        for victim in victims:
+            self._spill_or_evict(victim)
+
+    def _spill_or_evict(self, entry: DatasetEntry) -> None:
+        """Spill the entry; evict it if it cannot be spilled but can be reloaded"""
+        if DATASET_SPILL and self._spill(entry):
+            return
+        if entry.loader is not None:
+            self._evict(entry)
+
+    def _spill(self, entry: DatasetEntry) -> bool:
+        """Write the entry's frames to Arrow files (unless already on disk) and release them;
+        False if Arrow cannot represent them. The files are written without holding
+        entry.lock; if the data changed meanwhile the entry stays loaded."""
+        started = time.time()
+        with entry.lock:
+            if not entry.loaded:
+                return entry.spilled
+            if entry.unspillable_version == entry.version:
+                return False
+            version, original, cleaned = entry.version, entry.original, entry.cleaned
+            # Shared between workers, the original is already in an Arrow file
+            original_path = entry.spill_original or entry.original_path
+            same_as_original = cleaned is not None and same_columns(original, cleaned)
+            cleaned_path = None
+            if entry.spill_version == version:
+                cleaned_path = entry.spill_cleaned
+            elif cleaned is not None and not same_as_original:
+                cleaned_path = entry.cleaned_path
+        write_original = original_path is None
+        write_cleaned = cleaned is not None and not same_as_original and cleaned_path is None
+        written = []
+        try:
+            if write_original:
+                original_path = self._spill_path()
+                self._write_spill(original, original_path)
+                written.append(original_path)
+            if write_cleaned:
+                cleaned_path = self._spill_path()
+                self._write_spill(cleaned, cleaned_path)
+                written.append(cleaned_path)
+        except Exception as e:
+            for path in written:
+                os.remove(path)
+            with entry.lock:
+                # Not retried until the data changes
+                if entry.version == version:
+                    entry.unspillable_version = version
+            logger.warning("Dataset %s of session %s cannot be spilled: %s", entry.dataset_id, entry.session, e)
+            return False
+        if same_as_original:
+            cleaned_path = original_path
+        written_bytes = sum(os.path.getsize(path) for path in written)
+        with entry.lock:
+            if not entry.loaded or entry.version != version or \
+                    (write_original and entry.spill_original is not None):
+                # Changed (or spilled by another thread) while the files were written
+                for path in written:
+                    os.remove(path)
+                return entry.spilled or entry.loaded
+            entry.spill_original = original_path
+            if entry.spill_version != version:
+                self._remove_spill_file(entry, entry.spill_cleaned, keep=cleaned_path)
+                entry.spill_cleaned, entry.spill_version = cleaned_path, version
+            entry.profile = profile_cache.peek(current_profile_key(entry.version))
+            self._release(entry)
+            # The plan's frames stay in memory
+            kept = frames_memory(*_plan_frames(entry))
+            freed, entry.memory_bytes = entry.memory_bytes - kept, kept
+        with self._lock:
+            self.spills += 1
+            self.spill_seconds += time.time() - started
+            self.spill_bytes += written_bytes
+        logger.debug("Spilled dataset %s of session %s (%.1f MB, %.1f MB written) in %.3fs",
+                     entry.dataset_id, entry.session, freed / 2 ** 20, written_bytes / 2 ** 20, time.time() - started)
+        return True
+
+    def _spill_path(self) -> str:
+        return os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.arrow")
+
+    def _write_spill(self, df: pd.DataFrame, path: str) -> None:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        try:
+            write_arrow(df, path)
+        except Exception:
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+            raise
+
+    def _remove_spill_file(self, entry: DatasetEntry, path: Optional[str], keep: Optional[str] = None) -> None:
+        # Only files in the spill directory; frames still mapped from a removed file keep their mapping
+        if path and path not in (keep, entry.spill_original) and \
+                os.path.dirname(path) == self.spill_dir and os.path.exists(path):
+            os.remove(path)
+
+    def _remove_spill_files(self, entry: DatasetEntry) -> None:
+        with entry.lock:
+            original, entry.spill_original = entry.spill_original, None
+            self._remove_spill_file(entry, entry.spill_cleaned)
+            self._remove_spill_file(entry, original)
+            entry.spill_cleaned = entry.spill_version = None
+
+    def _release(self, entry: DatasetEntry) -> None:
+        """Drop the entry's frames; caller holds entry.lock"""
+        entry.original = entry.cleaned = None
+        if entry.plan is not None:
+            entry.plan.base = None
+
+    def _drop_frames(self, entry: DatasetEntry) -> None:
+        with entry.lock:
+            self._release(entry)
+            entry.memory_bytes = 0
+
+    def _evict(self, entry: DatasetEntry) -> None:
+        with entry.lock:
+            if not entry.loaded:
+                return
+            self._release(entry)
+            # The plan's frames stay in memory
+            kept = frames_memory(*_plan_frames(entry))
+            freed, entry.memory_bytes = entry.memory_bytes - kept, kept
+        with self._lock:
+            self.evictions += 1
+        logger.debug("Evicted dataset %s of session %s (%.1f MB)", entry.dataset_id, entry.session, freed / 2 ** 20)
+
+    def spill_idle(self, idle_seconds: Optional[float] = None) -> int:
+        """Spill (or evict) the loaded datasets not used for idle_seconds (default
+        DATASET_SPILL_IDLE_SECONDS); returns how many"""
+        cutoff = time.time() - (DATASET_SPILL_IDLE_SECONDS if idle_seconds is None else idle_seconds)
+        with self._lock:
+            idle = [entry for entry in self._entries.values() if entry.loaded and entry.last_access < cutoff]
+        released = 0
+        for entry in idle:
+            self._spill_or_evict(entry)
+            released += int(not entry.loaded)
+        return released
+
+    def start_sweeper(self) -> None:
+        """Enforce the memory budget when asked to and spill idle datasets (if
+        DATASET_SPILL_IDLE_SECONDS is set) from a background thread"""
+        if self._sweeper is not None:
+            return
+        interval = min(60.0, max(1.0, DATASET_SPILL_IDLE_SECONDS / 4)) if DATASET_SPILL_IDLE_SECONDS else None
+
+        def sweep():
+            next_sweep = time.monotonic() + interval if interval else None
+            while not self._stop_sweeper.is_set():
+                self._enforce.wait(max(0.0, next_sweep - time.monotonic()) if next_sweep else None)
+                self._enforce.clear()
+                if self._stop_sweeper.is_set():
+                    break
+                try:
+                    self.enforce_budget()
+                    if next_sweep is not None and time.monotonic() >= next_sweep:
+                        self.spill_idle()
+                        next_sweep = time.monotonic() + interval
+                except Exception as e:
+                    logger.warning("Spilling datasets failed: %s", e)
+
+        self._sweeper = threading.Thread(target=sweep, name="eaa-spill", daemon=True)
+        self._sweeper.start()
+
+    def close(self) -> None:
+        """Stop the sweeper and remove this process's spill files"""
+        self._stop_sweeper.set()
+        self._enforce.set()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def session_stats(self, session: Optional[str] = None) -> Dict[str, Any]:
+        """Datasets and memory of one session"""
+        session = session or session_id.get()
+        with self._lock:
+            entries = [entry for (owner, _), entry in self._entries.items() if owner == session]
+            active = self._active.get(session)
+        return {
+            "session_id": session,
+            "active_dataset_id": active,
+            "memory_bytes": sum(entry.memory_bytes for entry in entries),
+            "datasets": [dict(entry.to_dict(), active=entry.dataset_id == active) for entry in entries]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Memory per session and spill/rehydrate and eviction/reload counters"""
+        with self._lock:
+            entries = list(self._entries.values())
+            sessions: Dict[str, Dict[str, Any]] = {}
+            for entry in entries:
+                usage = sessions.setdefault(entry.session, {"datasets": 0, "loaded": 0, "spilled": 0, "memory_bytes": 0})
+                usage["datasets"] += 1
+                usage["loaded"] += int(entry.loaded)
+                usage["spilled"] += int(entry.spilled)
+                usage["memory_bytes"] += entry.memory_bytes
+            return {
+                "budget_bytes": self.budget_bytes,
+                "memory_bytes": sum(entry.memory_bytes for entry in entries),
+                "datasets": len(entries),
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+                "reload_seconds": round(self.reload_seconds, 3),
+                "spilled": sum(int(entry.spilled) for entry in entries),
+                "spills": self.spills,
+                "spill_seconds": round(self.spill_seconds, 3),
+                "spill_bytes": self.spill_bytes,
+                "rehydrations": self.rehydrations,
+                "rehydrate_seconds": round(self.rehydrate_seconds, 3),
+                "spill_idle_seconds": DATASET_SPILL_IDLE_SECONDS,
+                "sessions": sessions
+            }
+
+
+registry = DatasetRegistry(DATASET_MEMORY_BUDGET_MB * 2 ** 20, DATASET_REGISTRY_ENTRIES)
@@ -0,0 +1,185 @@
+"""
+Columnar on-disk storage for saved DataFrames.
+
+Frames are written as uncompressed Arrow IPC files next to the database and
+SavedData keeps only the file reference and schema. Reads memory-map the file,
+so numeric columns are handed to pandas without copying and only the requested
+columns are ever touched. Frames Arrow cannot represent (mixed-type object
+columns, non-string or duplicate column names) fall back to a pickled blob.
+"""
+import json
+import logging
+import os
+import pickle
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy.exc import IntegrityError
+
+from database import Migration, SavedData, SessionLocal
+
+DATASET_DIR = os.environ.get("EAA_DATASET_DIR", "./dataset_files")
+
+STORAGE_ARROW = "arrow"
+STORAGE_PICKLE = "pickle"
+
+# Name of the Migration row of migrate_pickled_rows
+ARROW_MIGRATION = "pickled_rows_to_arrow"
+
+logger = logging.getLogger(__name__)
+
+
+def frame_schema(df: pd.DataFrame) -> List[Dict[str, str]]:
+    """Column names and dtypes, in column order"""
+    return [{"name": str(col), "dtype": str(dtype)} for col, dtype in df.dtypes.items()]
+
+
+def _can_store_as_arrow(df: pd.DataFrame) -> bool:
+    return all(isinstance(col, str) for col in df.columns) and not df.columns.has_duplicates
+
+
+def write_arrow(df: pd.DataFrame, path: str) -> None:
+    """Write df to an Arrow IPC file atomically (temp file + rename)"""
+    table = pa.Table.from_pandas(df, preserve_index=None)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_arrow(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Memory-map an Arrow IPC file and convert (only the requested columns) to pandas"""
+    source = pa.memory_map(path, "r")
+    table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas(split_blocks=True)
+
+
+def arrow_columns(path: str) -> List[str]:
+    """Data column names of an Arrow IPC file, without reading any column data"""
+    schema = pa.ipc.open_file(pa.memory_map(path, "r")).schema
+    pandas_meta = schema.pandas_metadata or {}
+    index_columns = {c for c in pandas_meta.get("index_columns", []) if isinstance(c, str)}
+    return [name for name in schema.names if name not in index_columns]
+
+
+def store_frame(df: pd.DataFrame, dataset_id: int, data_type: str) -> Dict[str, Any]:
+    """Persist df and return the SavedData column values that reference it"""
+    schema_json = json.dumps(frame_schema(df))
+    if _can_store_as_arrow(df):
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        path = os.path.join(DATASET_DIR, f"{dataset_id}_{data_type}_{uuid.uuid4().hex[:12]}.arrow")
+        try:
+            write_arrow(df, path)
+            return {
+                "storage_format": STORAGE_ARROW,
+                "file_path": path,
+                "schema_json": schema_json,
+                "data_content": None
+            }
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            print(f"Arrow storage unavailable for dataset {dataset_id}, using pickle: {str(e)}")
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+    return {
+        "storage_format": STORAGE_PICKLE,
+        "file_path": None,
+        "schema_json": schema_json,
+        "data_content": pickle.dumps(df)
+    }
+
+
+def load_frame(saved_data: SavedData, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load a saved frame, optionally only the given columns (named as frame_columns names them)"""
+    if saved_data.storage_format == STORAGE_ARROW and saved_data.file_path:
+        return read_arrow(saved_data.file_path, columns)
+    df = pickle.loads(saved_data.data_content)
+    if columns is None:
+        return df
+    # Pickled frames may have labels other than text (e.g. years from an Excel header), which the
+    # schema names as text: select by position and label the columns with the names asked for
+    positions: Dict[str, int] = {}
+    for position, col in enumerate(df.columns):
+        positions.setdefault(str(col), position)
+    missing = [col for col in columns if col not in positions]
+    if missing:
+        raise KeyError(f"{missing} not in the saved columns")
+    projected = df.iloc[:, [positions[col] for col in columns]]
+    projected.columns = list(columns)
+    return projected
+
+
+def saved_frame_loader(saved_data_id: int) -> Callable[[], pd.DataFrame]:
+    """A function that loads a SavedData row's frame again, e.g. after the in-memory copy was evicted"""
+    def load() -> pd.DataFrame:
+        db = SessionLocal()
+        try:
+            saved_data = db.query(SavedData).filter(SavedData.id == saved_data_id).first()
+            if saved_data is None:
+                raise LookupError(f"Saved data {saved_data_id} no longer exists")
+            return load_frame(saved_data)
+        finally:
+            db.close()
+    return load
+
+
+def frame_columns(saved_data: SavedData) -> List[str]:
+    """Column names of a saved frame, read from its schema rather than its data"""
+    if saved_data.schema_json:
+        return [col["name"] for col in json.loads(saved_data.schema_json)]
+    if saved_data.storage_format == STORAGE_ARROW and saved_data.file_path:
+        return arrow_columns(saved_data.file_path)
+    return list(pickle.loads(saved_data.data_content).columns)
+
+
+def delete_frame_file(saved_data: SavedData) -> None:
+    """Remove the on-disk file behind a SavedData row, if any"""
+    if saved_data.file_path and os.path.exists(saved_data.file_path):
+        os.remove(saved_data.file_path)
+
+
+def migrate_pickled_rows(db) -> int:
+    """Move legacy pickled SavedData rows to Arrow files; returns the number migrated.
+
+    Only the worker process that adds the Migration row runs it (the others return 0);
+    if it fails, the row is removed again so the next start retries.
+    """
+    db.add(Migration(name=ARROW_MIGRATION))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return 0
+    try:
+        return _migrate_pickled_rows(db)
+    except Exception:
+        db.rollback()
+        db.query(Migration).filter(Migration.name == ARROW_MIGRATION).delete()
+        db.commit()
+        raise
+
+
+def _migrate_pickled_rows(db) -> int:
+    legacy_ids = [row_id for (row_id,) in db.query(SavedData.id).filter(
+        SavedData.storage_format.is_(None),
+        SavedData.data_content.isnot(None)
+    ).all()]
+    migrated = 0
+    for row_id in legacy_ids:
+        saved_data = db.query(SavedData).filter(SavedData.id == row_id).first()
+        try:
+            df = pickle.loads(saved_data.data_content)
+            stored = store_frame(df, saved_data.dataset_id, saved_data.data_type)
+        except Exception as e:
+            logger.warning("Could not migrate saved data %s: %s", row_id, e)
+            continue
+        for key, value in stored.items():
+            setattr(saved_data, key, value)
+        db.commit()
+        if stored["storage_format"] == STORAGE_ARROW:
+            migrated += 1
+    return migrated
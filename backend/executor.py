@@ -0,0 +1,229 @@
+"""
+Bounded worker pools for running blocking pandas/sklearn/matplotlib work off the event loop
+"""
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+# Seconds clients are asked to wait before retrying when a pool is full
+RETRY_AFTER_SECONDS = int(os.environ.get("EAA_RETRY_AFTER_SECONDS", "5"))
+
+# Default settings per pool; each can be overridden with
+# EAA_<NAME>_POOL_KIND (thread/process), EAA_<NAME>_POOL_WORKERS and EAA_<NAME>_POOL_QUEUE
+POOL_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    # pandas, numpy, scipy and sklearn work
+    "compute": {"kind": "thread", "workers": min(8, os.cpu_count() or 2), "queue": 32},
+    # matplotlib/reportlab rendering; pyplot keeps global state, so one worker by default
+    "render": {"kind": "thread", "workers": 1, "queue": 8},
+    # Reading back (and replaying), publishing and syncing the datasets of this process's
+    # registry, which workers of another process could not reach: threads only
+    "datasets": {"kind": "thread", "workers": 4, "queue": 64},
+}
+
+_LATENCY_WINDOW = 1000
+
+
+class PoolSaturated(Exception):
+    """Raised when a pool already has max_workers running and max_queue waiting tasks"""
+
+
+class TaskHTTPError(Exception):
+    """An HTTPException raised in a worker process, in a form that pickles back to the parent"""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _call_timed(fn: Callable, args: tuple, kwargs: dict):
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return started, result
+
+
+def _call_timed_in_process(fn: Callable, args: tuple, kwargs: dict):
+    """_call_timed for process pools: errors are raised as exceptions the parent can unpickle"""
+    try:
+        return _call_timed(fn, args, kwargs)
+    except HTTPException as e:
+        raise TaskHTTPError(e.status_code, e.detail) from None
+    except Exception as e:
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise RuntimeError(f"{type(e).__name__}: {str(e)}") from None
+        raise
+
+
+def _process_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class WorkerPool:
+    """A thread or process pool with a bounded backlog and latency metrics"""
+
+    def __init__(self, name: str, kind: str = "thread", max_workers: int = 4, max_queue: int = 16):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind '{kind}' for pool '{name}'")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queue_waits = deque(maxlen=_LATENCY_WINDOW)
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # Workers are not forked from this process, whose other threads (e.g. the spill
+                # sweeper) may hold locks a forked child would wait on forever
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_process_context())
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=f"eaa-{self.name}")
+        return self._executor
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(f"Worker pool '{self.name}' is at capacity")
+            self._pending += 1
+            self.submitted += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool, raising PoolSaturated if the backlog is full"""
+        self._admit()
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        failed = False
+        try:
+            executor = self._get_executor()
+            if self.kind == "thread":
+                # Keep request-scoped context variables visible inside the worker thread
+                ctx = contextvars.copy_context()
+                started, result = await loop.run_in_executor(executor, ctx.run, _call_timed, fn, args, kwargs)
+            else:
+                # fn and its arguments are pickled, so they must be module-level functions and picklable data
+                started, result = await loop.run_in_executor(executor, _call_timed_in_process, fn, args, kwargs)
+            self._queue_waits.append(max(0.0, started - submitted_at))
+            return result
+        except TaskHTTPError as e:
+            failed = True
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+            self._latencies.append(time.time() - submitted_at)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._pending
+        latencies = list(self._latencies)
+        queue_waits = list(self._queue_waits)
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(pending, self.max_workers),
+            "queue_depth": max(0, pending - self.max_workers),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "latency_seconds": {
+                "avg": sum(latencies) / len(latencies) if latencies else None,
+                "p50": _percentile(latencies, 0.5),
+                "p95": _percentile(latencies, 0.95),
+                "max": max(latencies) if latencies else None
+            },
+            "queue_wait_seconds": {
+                "avg": sum(queue_waits) / len(queue_waits) if queue_waits else None,
+                "p95": _percentile(queue_waits, 0.95)
+            }
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pools: Dict[str, WorkerPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name: str) -> WorkerPool:
+    """Get (creating on first use) the named worker pool"""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            defaults = POOL_DEFAULTS.get(name, POOL_DEFAULTS["compute"])
+            prefix = f"EAA_{name.upper()}_POOL"
+            pool = WorkerPool(
+                name,
+                kind=os.environ.get(f"{prefix}_KIND", defaults["kind"]),
+                max_workers=int(os.environ.get(f"{prefix}_WORKERS", defaults["workers"])),
+                max_queue=int(os.environ.get(f"{prefix}_QUEUE", defaults["queue"]))
+            )
+            _pools[name] = pool
+        return pool
+
+
+async def run_in_pool(pool_name: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run blocking work in a named pool, turning a full backlog into HTTP 503 with Retry-After"""
+    try:
+        return await get_pool(pool_name).run(fn, *args, **kwargs)
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"{str(e)}, please retry shortly",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+
+def pool_metrics() -> Dict[str, Any]:
+    """Metrics for every pool created so far"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.metrics() for pool in pools}
+
+
+def shutdown_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
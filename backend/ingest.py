@@ -0,0 +1,210 @@
+"""
+Streaming ingestion of uploaded CSV/Excel files shared by all upload endpoints
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from executor import get_pool, run_in_pool
+
+# Bytes pulled from the request body per read while spooling
+SPOOL_CHUNK_BYTES = 1024 * 1024
+# Rows parsed per pandas chunk for CSV files
+CSV_CHUNK_ROWS = int(os.environ.get("EAA_CSV_CHUNK_ROWS", "100000"))
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+
+class IngestProgress:
+    """Progress of a single upload, readable while the upload is running"""
+
+    def __init__(self, upload_id: str, filename: str):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.status = "spooling"
+        self.bytes_spooled = 0
+        self.rows_parsed = 0
+        self.chunks_parsed = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "status": self.status,
+            "bytes_spooled": self.bytes_spooled,
+            "rows_parsed": self.rows_parsed,
+            "chunks_parsed": self.chunks_parsed,
+            "elapsed_seconds": round(end - self.started_at, 3),
+            "error": self.error
+        }
+
+
+# Recent uploads by id so clients can poll /upload-progress/{upload_id}
+_progress: Dict[str, IngestProgress] = {}
+_progress_lock = threading.Lock()
+_MAX_TRACKED_UPLOADS = 100
+
+
+def start_progress(filename: str, upload_id: Optional[str] = None) -> IngestProgress:
+    """Register a new upload for progress reporting"""
+    progress = IngestProgress(upload_id or uuid.uuid4().hex, filename)
+    with _progress_lock:
+        _progress[progress.upload_id] = progress
+        while len(_progress) > _MAX_TRACKED_UPLOADS:
+            _progress.pop(next(iter(_progress)))
+    return progress
+
+
+def get_progress(upload_id: str) -> Optional[IngestProgress]:
+    """Get progress for an upload id, if it is still tracked"""
+    with _progress_lock:
+        return _progress.get(upload_id)
+
+
+async def spool_upload(file: UploadFile, progress: Optional[IngestProgress] = None) -> str:
+    """Copy the request body to a temp file in fixed-size chunks and return its path"""
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    fd, path = tempfile.mkstemp(prefix="eaa_upload_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            while True:
+                chunk = await file.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    break
+                spool.write(chunk)
+                if progress is not None:
+                    progress.bytes_spooled += len(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _combine_pieces(pieces: List[pd.Series]) -> Optional[pd.Series]:
+    """Join the chunks' pieces of a CSV column into the column a single read gives, or None
+    if the chunks parsed it to types that only text covers (e.g. numbers, then words)"""
+    if len(pieces) == 1:
+        return pieces[0]
+    # A chunk with only empty values parses to float whatever the column holds
+    dtypes = {piece.dtype for piece in pieces if piece.notna().any()}
+    if len(dtypes) == 1:
+        dtype = dtypes.pop()
+        if not pd.api.types.is_numeric_dtype(dtype):
+            pieces = [piece if piece.dtype == dtype else piece.astype(dtype) for piece in pieces]
+    elif not all(pd.api.types.is_numeric_dtype(d) and not pd.api.types.is_bool_dtype(d) for d in dtypes):
+        return None
+    # Integer and float pieces join to float, as a single read parses them
+    return pd.concat(pieces, ignore_index=True)
+
+
+def read_tabular(path: str, filename: str, progress: Optional[IngestProgress] = None,
+                 on_chunk: Optional[Callable[[pd.DataFrame], None]] = None) -> pd.DataFrame:
+    """Parse a spooled CSV (incrementally, in row chunks) or Excel file into a DataFrame"""
+    if progress is not None:
+        progress.status = "parsing"
+    lower_name = filename.lower()
+    if lower_name.endswith('.csv'):
+        names = None
+        # Parsed pieces of each column, one per chunk
+        pieces = []
+        with pd.read_csv(path, chunksize=CSV_CHUNK_ROWS) as reader:
+            for chunk in reader:
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                if progress is not None:
+                    progress.rows_parsed += len(chunk)
+                    progress.chunks_parsed += 1
+                if names is None:
+                    names = list(chunk.columns)
+                    pieces = [[] for _ in names]
+                # The parser gives each column its own array, so keeping the columns keeps no more than the chunk
+                for i in range(len(names)):
+                    pieces[i].append(chunk.iloc[:, i])
+                del chunk
+        if names is None:
+            return pd.DataFrame()
+        columns = []
+        reread = []
+        for i, column_pieces in enumerate(pieces):
+            column = _combine_pieces(column_pieces)
+            if column is None:
+                reread.append(i)
+            columns.append(column)
+            # Release the pieces as soon as the column is combined
+            pieces[i] = None
+        if reread:
+            # Chunks parsed these columns to different types: read them again as text, which a single read gives
+            text = pd.read_csv(path, usecols=reread, dtype=str)
+            for position, i in enumerate(reread):
+                columns[i] = text.iloc[:, position]
+        # Chunks continue the row numbering, so a fresh RangeIndex matches a single read_csv
+        return pd.concat([column.reset_index(drop=True) for column in columns], axis=1, keys=names)
+    df = pd.read_excel(path)
+    if on_chunk is not None:
+        on_chunk(df)
+    if progress is not None:
+        progress.rows_parsed = len(df)
+        progress.chunks_parsed = 1
+    return df
+
+
+async def _parse_in_pool(path: str, filename: str, progress: IngestProgress,
+                         on_chunk: Optional[Callable[[pd.DataFrame], None]]) -> pd.DataFrame:
+    """read_tabular in the compute pool. A worker process cannot update progress or call
+    on_chunk as it goes, so there the whole file is parsed first and both catch up after"""
+    if get_pool("compute").kind == "thread":
+        return await run_in_pool("compute", read_tabular, path, filename, progress, on_chunk)
+    df = await run_in_pool("compute", read_tabular, path, filename)
+    if on_chunk is not None:
+        await run_in_threadpool(on_chunk, df)
+    progress.rows_parsed = len(df)
+    progress.chunks_parsed = 1
+    return df
+
+
+async def ingest_upload(file: UploadFile, upload_id: Optional[str] = None,
+                        on_chunk: Optional[Callable[[pd.DataFrame], None]] = None) -> pd.DataFrame:
+    """Spool an uploaded file to disk and parse it, raising HTTP 400 for bad input"""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No filename provided")
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"Unsupported file format: {file.filename}")
+    progress = start_progress(file.filename, upload_id)
+    path = await spool_upload(file, progress)
+    try:
+        if progress.bytes_spooled == 0:
+            progress.status = "failed"
+            progress.error = "Empty file"
+            raise HTTPException(status_code=400, detail="Empty file")
+        try:
+            # Parse off the event loop so /upload-progress can be polled meanwhile
+            df = await _parse_in_pool(path, file.filename, progress, on_chunk)
+        except HTTPException as e:
+            # The compute pool is full (503)
+            progress.status = "failed"
+            progress.error = str(e.detail)
+            raise
+        except Exception as pandas_error:
+            progress.status = "failed"
+            progress.error = str(pandas_error)
+            raise HTTPException(status_code=400, detail=f"Error reading file: {str(pandas_error)}")
+        if df.empty:
+            progress.status = "failed"
+            progress.error = "File contains no data"
+            raise HTTPException(status_code=400, detail="File contains no data")
+        progress.status = "done"
+        return df
+    finally:
+        progress.finished_at = time.time()
+        os.remove(path)
@@ -0,0 +1,196 @@
+"""
+LRU cache of prepared lookup structures, keyed by lookup table and return column.
+
+A cached entry holds the unique keys and values of one (lookup table, return
+column) pair; the hash index, sorted keys and substring index are built from
+them the first time a formula needs them and then reused. Entries remember the
+stored version of the table they were built from, so a replaced table is never
+served stale, and the cache evicts least recently used entries to stay within
+EAA_LOOKUP_CACHE_MB.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from database import SavedData
+from dataset_store import load_frame
+from executor import run_in_pool
+from lookup_engine import SortedLookup, SubstringIndex, unique_keys
+
+LOOKUP_CACHE_MB = float(os.environ.get("EAA_LOOKUP_CACHE_MB", "256"))
+
+
+def _array_bytes(values: np.ndarray) -> int:
+    if values.dtype == object:
+        return values.nbytes + sum(sys.getsizeof(v) for v in values)
+    return values.nbytes
+
+
+class PreparedLookup:
+    """Unique keys and values of a lookup table column pair, plus search structures built on demand"""
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray):
+        self.keys = keys
+        self.values = values
+        self.nbytes = _array_bytes(keys) + _array_bytes(values)
+        self._structures: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._on_grow: Optional[Callable[[], None]] = None
+
+    def _structure(self, name: str, build: Callable[[], Any], size: Callable[[Any], int]) -> Any:
+        with self._lock:
+            structure = self._structures.get(name)
+            if structure is None:
+                structure = build()
+                self._structures[name] = structure
+                self.nbytes += size(structure)
+                grew = True
+            else:
+                grew = False
+        if grew and self._on_grow is not None:
+            self._on_grow()
+        return structure
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sent to worker processes without the lock and the cache's callback; a copy
+        # builds its own structures and never counts against the cache's budget
+        with self._lock:
+            state = self.__dict__.copy()
+            state["_structures"] = dict(self._structures)
+        del state["_lock"]
+        state["_on_grow"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def hash_index(self) -> pd.Index:
+        """Hash map from key to position, for exact matches"""
+        return self._structure("hash", lambda: pd.Index(self.keys), lambda index: index.memory_usage())
+
+    def sorted_lookup(self) -> SortedLookup:
+        """Keys sorted once, for approximate and as-of matches"""
+        return self._structure("sorted", lambda: SortedLookup(self.keys, self.values),
+                               lambda lookup: lookup.keys.nbytes + lookup.values.nbytes)
+
+    def substring_index(self) -> SubstringIndex:
+        """Trigram index over the keys, for wildcard matches"""
+        return self._structure("substring", lambda: SubstringIndex(self.keys), lambda index: index.nbytes())
+
+
+class LookupCache:
+    """Thread-safe LRU of PreparedLookup entries with a memory budget and hit/miss counters"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[Hashable, PreparedLookup]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, table_id: int, return_column: str, version: Hashable,
+            load: Callable[[], Tuple[np.ndarray, np.ndarray]]) -> PreparedLookup:
+        """Cached entry for the table version, calling load() to build it on a miss"""
+        prepared = self.lookup(table_id, return_column, version)
+        if prepared is None:
+            prepared = self.add(table_id, return_column, version, *load())
+        return prepared
+
+    def lookup(self, table_id: int, return_column: str, version: Hashable) -> Optional[PreparedLookup]:
+        """Cached entry for the table version, None (counted as a miss) if there is none"""
+        key = (table_id, return_column)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+            return None
+
+    def add(self, table_id: int, return_column: str, version: Hashable,
+            keys: np.ndarray, values: np.ndarray) -> PreparedLookup:
+        """Cache the unique keys and values of a table version"""
+        prepared = PreparedLookup(keys, values)
+        with self._lock:
+            self._entries[(table_id, return_column)] = (version, prepared)
+            self._entries.move_to_end((table_id, return_column))
+            prepared._on_grow = self._enforce_budget
+            self._enforce_budget()
+        return prepared
+
+    def _used_bytes(self) -> int:
+        return sum(prepared.nbytes for _, prepared in self._entries.values())
+
+    def _enforce_budget(self) -> None:
+        with self._lock:
+            while self._entries and self._used_bytes() > self.max_bytes:
+                _, (_, prepared) = self._entries.popitem(last=False)
+                prepared._on_grow = None
+                self.evictions += 1
+
+    def invalidate_table(self, table_id: int) -> int:
+        """Drop every entry of a lookup table; returns the number dropped"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == table_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "used_bytes": self._used_bytes(),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+lookup_cache = LookupCache(int(LOOKUP_CACHE_MB * 1024 * 1024))
+
+
+def table_version(saved_data: SavedData) -> Hashable:
+    """Identifies one stored version of a lookup table"""
+    return (saved_data.id, saved_data.file_path or str(saved_data.created_at))
+
+
+def _load_unique_keys(saved_data: SavedData, key_column: str, return_column: str) -> Tuple[np.ndarray, np.ndarray]:
+    columns = list(dict.fromkeys([key_column, return_column]))
+    lookup_df = load_frame(saved_data, columns)
+    return unique_keys(lookup_df[key_column], lookup_df[return_column])
+
+
+def prepared_lookup(saved_data: SavedData, key_column: str, return_column: str) -> PreparedLookup:
+    """Prepared keys/values of a lookup table, loading only the key and return columns on a miss"""
+    return lookup_cache.get(saved_data.dataset_id, return_column, table_version(saved_data),
+                            lambda: _load_unique_keys(saved_data, key_column, return_column))
+
+
+async def pooled_prepared_lookup(saved_data: SavedData, key_column: str, return_column: str) -> PreparedLookup:
+    """prepared_lookup for request handlers: the cache stays in this process and only a miss
+    loads the columns, in the compute pool (which may run in other processes)"""
+    version = table_version(saved_data)
+    prepared = lookup_cache.lookup(saved_data.dataset_id, return_column, version)
+    if prepared is None:
+        keys, values = await run_in_pool("compute", _load_unique_keys, saved_data, key_column, return_column)
+        prepared = lookup_cache.add(saved_data.dataset_id, return_column, version, keys, values)
+    return prepared
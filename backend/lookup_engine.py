@@ -0,0 +1,281 @@
+"""
+Vectorized lookup structures used by the formula endpoints
+"""
+import re
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def unique_keys(keys: pd.Series, values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Non-null keys in first-seen order, each paired with the value of its last occurrence.
+
+    This is what dict(zip(keys, values)) produces, without building the dict.
+    """
+    codes, uniques = pd.factorize(keys)
+    rows = np.flatnonzero(codes >= 0)
+    last_row = np.full(len(uniques), -1, dtype=np.int64)
+    np.maximum.at(last_row, codes[rows], rows)
+    return np.asarray(uniques), values.to_numpy()[last_row]
+
+
+def _as_result(result: np.ndarray, index: pd.Index) -> pd.Series:
+    return pd.Series(result, index=index).infer_objects()
+
+
+class SortedLookup:
+    """Lookup keys sorted once, so every row resolves with one binary search"""
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray):
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.values = values[order]
+
+    def _positions(self, lookup_values: pd.Series, side: str = "left") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        values = lookup_values.to_numpy()
+        valid = ~pd.isna(values)
+        x = values[valid]
+        return valid, x, np.searchsorted(self.keys, x, side=side)
+
+    def nearest(self, lookup_values: pd.Series, if_not_found: Any) -> pd.Series:
+        """VLOOKUP approximate match: the closest key, ties going to the smaller key.
+
+        Values below the first key take the first key and values above the last
+        key take the last one. Missing lookup values resolve to if_not_found.
+        """
+        result = np.full(len(lookup_values), if_not_found, dtype=object)
+        if len(self.keys) == 0:
+            return _as_result(result, lookup_values.index)
+        valid, x, pos = self._positions(lookup_values)
+        last = len(self.keys) - 1
+        chosen = np.minimum(pos, last)
+        # Rows strictly between two keys pick whichever neighbour is closer
+        between = (pos > 0) & (pos <= last)
+        between[between] = self.keys[pos[between]] != x[between]
+        if between.any():
+            xb = x[between]
+            upper = pos[between]
+            take_lower = np.abs(xb - self.keys[upper - 1]) <= np.abs(xb - self.keys[upper])
+            chosen[between] = np.where(take_lower, upper - 1, upper)
+        result[valid] = self.values[chosen]
+        return _as_result(result, lookup_values.index)
+
+    def exact_or_next(self, lookup_values: pd.Series, if_not_found: Any) -> pd.Series:
+        """XLOOKUP exact_or_next: the smallest key >= each value (an as-of join forwards)"""
+        result = np.full(len(lookup_values), if_not_found, dtype=object)
+        if len(self.keys) == 0:
+            return _as_result(result, lookup_values.index)
+        valid, _, pos = self._positions(lookup_values, side="left")
+        found = pos < len(self.keys)
+        rows = np.flatnonzero(valid)
+        result[rows[found]] = self.values[pos[found]]
+        return _as_result(result, lookup_values.index)
+
+    def exact_or_previous(self, lookup_values: pd.Series, if_not_found: Any) -> pd.Series:
+        """XLOOKUP exact_or_previous: the largest key <= each value (an as-of join backwards)"""
+        result = np.full(len(lookup_values), if_not_found, dtype=object)
+        if len(self.keys) == 0:
+            return _as_result(result, lookup_values.index)
+        valid, _, pos = self._positions(lookup_values, side="right")
+        pos -= 1
+        found = pos >= 0
+        rows = np.flatnonzero(valid)
+        result[rows[found]] = self.values[pos[found]]
+        return _as_result(result, lookup_values.index)
+
+
+GRAM_SIZE = 3
+# Candidate lists at most this long are verified directly instead of being intersected further
+_VERIFY_DIRECTLY = 64
+
+
+def _grams(text: str) -> set:
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def _wildcard_regex(pattern: str) -> Tuple["re.Pattern", List[str]]:
+    """Compile an Excel-style pattern (* any run, ? one char, ~ escapes) and return its literal runs"""
+    parts, literals, literal = [], [], ""
+    chars = iter(pattern)
+    for ch in chars:
+        if ch == "~":
+            ch = next(chars, "~")
+            literal += ch
+            parts.append(re.escape(ch))
+        elif ch in "*?":
+            parts.append(".*" if ch == "*" else ".")
+            literals.append(literal)
+            literal = ""
+        else:
+            literal += ch
+            parts.append(re.escape(ch))
+    literals.append(literal)
+    return re.compile("".join(parts), re.DOTALL), [lit for lit in literals if lit]
+
+
+class SubstringIndex:
+    """Trigram index over the lower-cased lookup keys, built once per lookup table.
+
+    Positions refer to the keys as passed in (first-seen order from unique_keys),
+    so the index can be shared by every return column of the table and the
+    earliest matching key wins, as with a scan over dict(zip(keys, values)).
+    """
+
+    def __init__(self, keys: np.ndarray):
+        self.lowered = [str(k).lower() for k in keys]
+        self.first_position: Dict[str, int] = {}
+        postings: Dict[str, List[int]] = {}
+        for pos, key in enumerate(self.lowered):
+            self.first_position.setdefault(key, pos)
+            for gram in _grams(key):
+                postings.setdefault(gram, []).append(pos)
+        self.postings = {gram: np.asarray(positions, dtype=np.int64) for gram, positions in postings.items()}
+        self.key_lengths = sorted({len(key) for key in self.first_position})
+
+    def _candidates(self, fragments: List[str]) -> Optional[np.ndarray]:
+        """Sorted positions of keys that may contain the fragments; None means no constraint.
+
+        Only the rarest trigrams are intersected, callers verify each candidate.
+        """
+        grams = set()
+        for fragment in fragments:
+            grams |= _grams(fragment)
+        if not grams:
+            return None
+        lists = []
+        for gram in grams:
+            positions = self.postings.get(gram)
+            if positions is None:
+                return np.empty(0, dtype=np.int64)
+            lists.append(positions)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for positions in lists[1:]:
+            if len(candidates) <= _VERIFY_DIRECTLY:
+                break
+            candidates = np.intersect1d(candidates, positions, assume_unique=True)
+        return candidates
+
+    def _key_in_value(self, value: str) -> int:
+        best = len(self.lowered)
+        for length in self.key_lengths:
+            if length > len(value):
+                break
+            for start in range(len(value) - length + 1):
+                pos = self.first_position.get(value[start:start + length])
+                if pos is not None and pos < best:
+                    best = pos
+        return best
+
+    def _value_in_key(self, value: str, before: int) -> int:
+        candidates = self._candidates([value])
+        positions = range(before) if candidates is None else candidates
+        for pos in positions:
+            if pos >= before:
+                break
+            if value in self.lowered[pos]:
+                return int(pos)
+        return before
+
+    def find(self, value: str) -> int:
+        """Earliest key k with value in k or k in value (case-insensitive), or -1"""
+        value = value.lower()
+        best = self._value_in_key(value, self._key_in_value(value))
+        return best if best < len(self.lowered) else -1
+
+    def find_pattern(self, pattern: str) -> int:
+        """Earliest key fully matching a * / ? wildcard pattern (case-insensitive), or -1"""
+        regex, literals = _wildcard_regex(pattern.lower())
+        candidates = self._candidates(literals)
+        positions = range(len(self.lowered)) if candidates is None else candidates
+        for pos in positions:
+            if regex.fullmatch(self.lowered[pos]):
+                return int(pos)
+        return -1
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the index"""
+        strings = sum(sys.getsizeof(key) for key in self.lowered)
+        postings = sum(positions.nbytes + 100 for positions in self.postings.values())
+        return strings + postings + 100 * len(self.first_position)
+
+    def resolve(self, lookup_values: pd.Series, key_index: pd.Index, values: np.ndarray,
+                if_not_found: Any, pattern: bool = False) -> pd.Series:
+        """Resolve a column against the index, matching each distinct lookup value once.
+
+        key_index is a pd.Index over the same keys the index was built from.
+        """
+        result = np.full(len(lookup_values), if_not_found, dtype=object)
+        raw = lookup_values.to_numpy()
+        valid = ~pd.isna(raw)
+        pending = valid
+        if not pattern:
+            # Exact hits first, as a hash join on the raw values
+            exact = key_index.get_indexer(raw)
+            hit = valid & (exact >= 0)
+            result[hit] = values[exact[hit]]
+            pending = valid & ~hit
+        rows = np.flatnonzero(pending)
+        if len(rows) == 0:
+            return _as_result(result, lookup_values.index)
+        codes, uniques = pd.factorize(raw[rows])
+        finder: Callable[[str], int] = self.find_pattern if pattern else self.find
+        matches = np.array([finder(str(value)) for value in uniques], dtype=np.int64)
+        matched = matches[codes]
+        found = matched >= 0
+        result[rows[found]] = values[matched[found]]
+        return _as_result(result, lookup_values.index)
+
+
+def exact_match(key_index: pd.Index, values: np.ndarray, lookup_values: pd.Series, if_not_found: Any) -> pd.Series:
+    """Exact lookup as one hash join: the value of each matching key, else if_not_found"""
+    result = np.full(len(lookup_values), if_not_found, dtype=object)
+    raw = lookup_values.to_numpy()
+    positions = key_index.get_indexer(raw)
+    hit = ~pd.isna(raw) & (positions >= 0)
+    result[hit] = values[positions[hit]]
+    return _as_result(result, lookup_values.index)
+
+
+def _key_index(frame: pd.DataFrame) -> pd.Index:
+    if frame.shape[1] == 1:
+        return pd.Index(frame.iloc[:, 0])
+    return pd.MultiIndex.from_frame(frame)
+
+
+def multi_key_match(lookup_keys: pd.DataFrame, lookup_values: pd.Series, main_keys: pd.DataFrame,
+                    if_not_found: Any, on_multiple: str = "first") -> Tuple[pd.Series, int]:
+    """Match every row of main_keys against lookup_keys on all columns at once (a hash join).
+
+    Each main row takes the return value of the first lookup row with the same
+    keys. A key is ambiguous when its rows hold more than one distinct return
+    value; with on_multiple="blank" those rows get if_not_found instead. Rows
+    with a missing key never match. Returns the result and the number of rows
+    that matched an ambiguous key.
+    """
+    result = np.full(len(main_keys), if_not_found, dtype=object)
+    complete = lookup_keys.notna().all(axis=1).to_numpy()
+    lookup_keys, lookup_values = lookup_keys[complete], lookup_values[complete]
+    if len(lookup_keys) == 0:
+        return _as_result(result, main_keys.index), 0
+
+    # First row per key, and the keys whose rows disagree on the return value
+    first = ~lookup_keys.duplicated(keep="first").to_numpy()
+    keys_with_values = lookup_keys.assign(__value__=lookup_values.to_numpy())
+    distinct = keys_with_values[~keys_with_values.duplicated(keep="first").to_numpy()]
+    ambiguous_keys = distinct[distinct.duplicated(subset=list(lookup_keys.columns), keep=False).to_numpy()]
+
+    unique_index = _key_index(lookup_keys[first])
+    ambiguous = unique_index.isin(_key_index(ambiguous_keys.drop(columns="__value__")))
+    values = lookup_values.to_numpy()[first]
+
+    positions = unique_index.get_indexer(_key_index(main_keys))
+    hit = main_keys.notna().all(axis=1).to_numpy() & (positions >= 0)
+    hit_ambiguous = hit.copy()
+    hit_ambiguous[hit] = ambiguous[positions[hit]]
+    result[hit] = values[positions[hit]]
+    if on_multiple == "blank":
+        result[hit_ambiguous] = if_not_found
+    return _as_result(result, main_keys.index), int(hit_ambiguous.sum())
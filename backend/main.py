@@ -1,7 +1,8 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from database import create_tables, get_db, Dataset, SavedData, User
 from routes.upload import router as upload_router
@@ -14,12 +15,22 @@ from routes.data_info import router as data_info_router
 from routes.lookup_tables import router as lookup_tables_router
 from routes.formulas import router as formulas_router
 from routes.statistics import router as statistics_router
+from routes.metrics import router as metrics_router
+from routes.transformations import router as transformations_router
+from routes.recipes import router as recipes_router
+from routes.datasets import router as datasets_router
+from dataset_registry import registry, session_id, DEFAULT_SESSION, SESSION_HEADER
+from executor import shutdown_pools
+from dataset_store import migrate_pickled_rows
 from passlib.context import CryptContext
 import jwt
 import datetime
+import logging
 
 app = FastAPI(title="Easy AI Analytics API", version="1.0.0")
 
+logger = logging.getLogger(__name__)
+
 SECRET_KEY = "supersecretkey"  # Change this in production
 ALGORITHM = "HS256"
 
@@ -47,12 +58,33 @@ def startup():
     if not db.query(User).filter(User.email == "123@mail.com").first():
         user = User(email="123@mail.com", hashed_password=get_password_hash("123"))
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Created meanwhile by another worker process
+            db.rollback()
+    migrated = migrate_pickled_rows(db)
+    if migrated:
+        logger.info("Migrated %d pickled datasets to Arrow storage", migrated)
     db.close()
+    registry.start_sweeper()
 
 startup()
 
+@app.on_event("shutdown")
+def shutdown():
+    shutdown_pools()
+    registry.close()
+
+@app.middleware("http")
+async def bind_session(request: Request, call_next):
+    """Serve the request against the datasets of the session named by the X-Session-Id header"""
+    token = session_id.set(request.headers.get(SESSION_HEADER) or DEFAULT_SESSION)
+    try:
+        return await call_next(request)
+    finally:
+        session_id.reset(token)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -67,6 +99,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
 
 class SignupRequest(BaseModel):
@@ -135,6 +168,10 @@ app.include_router(data_info_router)
 app.include_router(lookup_tables_router)
 app.include_router(formulas_router)
 app.include_router(statistics_router)
+app.include_router(metrics_router)
+app.include_router(transformations_router)
+app.include_router(recipes_router)
+app.include_router(datasets_router)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,99 @@
+"""
+Cache of computed dataset profiles (basic_info, column_info, preview).
+
+Keys identify an immutable state of some data, e.g. ("current", version) for the
+in-memory dataset or ("saved", part, saved_data_id, file_path) for a stored one,
+so entries never need invalidating; old ones simply age out of the LRU. Next to
+each current summary the DatasetProfile it came from is kept, so the profile of
+the next version can be derived from it incrementally. Approximate summaries
+and their DatasetSketch are cached under keys of their own.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+PROFILE_CACHE_ENTRIES = int(os.environ.get("EAA_PROFILE_CACHE_ENTRIES", "64"))
+
+
+class ProfileCache:
+    """Thread-safe LRU of profile dicts with hit/miss counters"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            profile = self._entries.get(key)
+            if profile is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return profile
+
+    def peek(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """The entry for key, if cached, without counting a hit or miss or refreshing it"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key: Hashable, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = profile
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+profile_cache = ProfileCache(PROFILE_CACHE_ENTRIES)
+
+
+def current_profile_key(version: int) -> Hashable:
+    """Cache key for the profile of a version of the current dataset"""
+    return ("current", version)
+
+
+def current_state_key(version: int) -> Hashable:
+    """Cache key for the DatasetProfile of a version of the current dataset"""
+    return ("current-state", version)
+
+
+def current_approximate_key(version: int) -> Hashable:
+    """Cache key for the sketch-based profile of a version of the current dataset"""
+    return ("current-approximate", version)
+
+
+def current_sketch_key(version: int) -> Hashable:
+    """Cache key for the DatasetSketch of a version of the current dataset"""
+    return ("current-sketch", version)
+
+
+def remember_current_approximate(version: int, summary: Dict[str, Any], sketch) -> None:
+    """Cache the sketch-based summary and the DatasetSketch of a version of the current dataset"""
+    profile_cache.put(current_approximate_key(version), summary)
+    profile_cache.put(current_sketch_key(version), sketch)
+
+
+def remember_current(version: int, summary: Dict[str, Any], profile=None) -> None:
+    """Cache the summary (and DatasetProfile, if any) of a version of the current dataset"""
+    profile_cache.put(current_profile_key(version), summary)
+    if profile is not None:
+        profile_cache.put(current_state_key(version), profile)
+
+
+def saved_profile_key(saved_data, part: str = "summary") -> Hashable:
+    """Cache key for (part of) the profile of a stored SavedData row"""
+    return ("saved", part, saved_data.id, saved_data.file_path or str(saved_data.created_at))
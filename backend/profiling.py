@@ -0,0 +1,230 @@
+"""
+Column profiling in as few passes over the data as possible.
+
+Missing counts and the numeric summaries (mean/std/min/max) are computed for
+all columns at once as frame-level reductions. Distinct counts and modes share
+a single factorization per column (numeric columns are counted by sorting
+instead) and several columns are processed in parallel. The output matches
+what DataProcessor.get_column_info has always returned.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+PROFILE_WORKERS = int(os.environ.get("EAA_PROFILE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Only these dtypes get the numeric summary, as before; everything else gets a top value
+NUMERIC_PROFILE_DTYPES = ("int64", "float64")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PROFILE_WORKERS, thread_name_prefix="eaa-profile")
+    return _executor
+
+
+def is_numeric_profile(dtype) -> bool:
+    """Whether a column of this dtype is profiled with mean/std/min/max"""
+    return dtype in NUMERIC_PROFILE_DTYPES
+
+
+def _optional_float(value) -> Optional[float]:
+    return float(value) if pd.notna(value) else None
+
+
+def _top_value(codes: np.ndarray, uniques) -> Optional[str]:
+    """Most frequent value; ties go to the smallest value, as Series.mode() orders them"""
+    present = codes[codes >= 0]
+    if len(present) == 0:
+        return None
+    counts = np.bincount(present, minlength=len(uniques))
+    tied = uniques[counts == counts.max()]
+    if len(tied) > 1:
+        # Let pandas order the (few) tied values exactly as mode() would
+        return str(pd.Series(tied).mode().iloc[0])
+    return str(tied[0])
+
+
+def _numeric_distinct(values: np.ndarray) -> int:
+    """Distinct non-NaN count of an int64/float64 array by sorting, which beats hashing on
+    high-cardinality columns and runs without the GIL"""
+    ordered = np.sort(values[~np.isnan(values)] if values.dtype.kind == "f" else values)
+    if len(ordered) == 0:
+        return 0
+    return 1 + int(np.count_nonzero(ordered[1:] != ordered[:-1]))
+
+
+def _distinct_and_top(series: pd.Series, with_top: bool) -> Tuple[int, Optional[str]]:
+    """Distinct non-null count and (optionally) top value"""
+    if not with_top:
+        return _numeric_distinct(series.to_numpy()), None
+    # One factorization gives both the distinct count and the counts for the mode
+    codes, uniques = pd.factorize(series)
+    return len(uniques), _top_value(codes, uniques)
+
+
+def profile_columns(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Per-column dtype, missing and distinct counts, numeric summary or top value"""
+    if df.shape[1] == 0:
+        return []
+    numeric = [is_numeric_profile(dtype) for dtype in df.dtypes]
+    missing = df.isna().sum().to_numpy()
+
+    numeric_stats = {}
+    numeric_positions = [i for i, flag in enumerate(numeric) if flag]
+    if numeric_positions:
+        numeric_df = df.iloc[:, numeric_positions]
+        reductions = {
+            "mean": numeric_df.mean().to_numpy(),
+            "std": numeric_df.std().to_numpy(),
+            "min": numeric_df.min().to_numpy(),
+            "max": numeric_df.max().to_numpy()
+        }
+        for offset, position in enumerate(numeric_positions):
+            numeric_stats[position] = {name: _optional_float(values[offset]) for name, values in reductions.items()}
+
+    columns = [df.iloc[:, i] for i in range(df.shape[1])]
+    if PROFILE_WORKERS > 1 and len(columns) > 1:
+        distinct = list(_get_executor().map(_distinct_and_top, columns, [not flag for flag in numeric]))
+    else:
+        distinct = [_distinct_and_top(column, not flag) for column, flag in zip(columns, numeric)]
+
+    columns_info = []
+    for i, col in enumerate(df.columns):
+        unique_count, top = distinct[i]
+        col_info = {
+            'name': col,
+            'dtype': str(df.dtypes.iloc[i]),
+            'missing_count': int(missing[i]),
+            'unique_count': int(unique_count)
+        }
+        if numeric[i]:
+            col_info.update(numeric_stats[i])
+        else:
+            col_info['top_value'] = top
+        columns_info.append(col_info)
+    return columns_info
+
+
+def _column_memory(series: pd.Series) -> int:
+    return int(series.memory_usage(deep=True, index=False))
+
+
+def _drop_rows_from_column(info: Dict[str, Any], dropped: pd.Series, remaining: pd.Series,
+                           previous_rows: int) -> Optional[Dict[str, Any]]:
+    """Column stats after removing the dropped values, or None when a full recompute is needed"""
+    info = dict(info)
+    dropped_present = dropped.dropna()
+    info['missing_count'] -= len(dropped) - len(dropped_present)
+    if len(dropped_present) == 0:
+        return info
+
+    # Distinct values that no longer occur anywhere in the column; factorized as in
+    # _distinct_and_top, so they format like top_value (e.g. Timestamps, not datetime64)
+    dropped_uniques = pd.factorize(dropped_present)[1]
+    still_present = pd.unique(remaining[remaining.isin(dropped_uniques)])
+    info['unique_count'] -= len(dropped_uniques) - len(still_present)
+
+    if 'top_value' in info:
+        # Other values only lose occurrences, so the top value stands unless it was dropped
+        if any(str(value) == info['top_value'] for value in dropped_uniques):
+            return None
+        return info
+
+    if info['std'] is None:
+        return None
+    n_total = previous_rows - (info['missing_count'] + len(dropped) - len(dropped_present))
+    n_dropped = len(dropped_present)
+    n_kept = n_total - n_dropped
+    if n_kept < 2:
+        return None
+    # Remove the dropped values' mean and sum of squares (M2) from the running totals
+    values = dropped_present.to_numpy(dtype=float)
+    mean_dropped = values.mean()
+    m2_dropped = float(((values - mean_dropped) ** 2).sum())
+    m2_total = info['std'] ** 2 * (n_total - 1)
+    mean_kept = (n_total * info['mean'] - n_dropped * mean_dropped) / n_kept
+    m2_kept = m2_total - m2_dropped - n_kept * n_dropped / n_total * (mean_kept - mean_dropped) ** 2
+    if m2_kept <= m2_total * 1e-9:
+        # Too much cancellation to trust the difference
+        return None
+    info['mean'] = float(mean_kept)
+    info['std'] = float(np.sqrt(m2_kept / (n_kept - 1)))
+    if values.min() <= info['min']:
+        info['min'] = _optional_float(remaining.min())
+    if values.max() >= info['max']:
+        info['max'] = _optional_float(remaining.max())
+    return info
+
+
+class DatasetProfile:
+    """Column stats and memory of one version of a frame, from which the profile of a
+    derived version can be computed by only redoing what a transformation changed"""
+
+    def __init__(self, columns: List[Dict[str, Any]], memory: List[int], index_memory: int, rows: int):
+        self.columns = columns
+        self.memory = memory
+        self.index_memory = index_memory
+        self.rows = rows
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "DatasetProfile":
+        """Profile every column of df"""
+        return cls(
+            profile_columns(df),
+            [int(m) for m in df.memory_usage(deep=True, index=False)],
+            int(df.index.memory_usage(deep=True)),
+            len(df)
+        )
+
+    def basic_info(self) -> Dict[str, Any]:
+        """Same shape as DataProcessor.get_basic_info"""
+        return {
+            'rows': int(self.rows),
+            'columns': len(self.columns),
+            'file_size': f"{(self.index_memory + sum(self.memory)) / 1024:.1f} KB",
+            'missing_values': int(sum(col['missing_count'] for col in self.columns))
+        }
+
+    def column_info(self) -> List[Dict[str, Any]]:
+        return [dict(col) for col in self.columns]
+
+    def derive(self, df: pd.DataFrame, touched=(), dropped: Optional[pd.DataFrame] = None) -> "DatasetProfile":
+        """Profile of df, a version of this profile's frame in which the touched columns were
+        changed or added and the dropped rows were removed; other columns are reused"""
+        if df.columns.has_duplicates:
+            return DatasetProfile.build(df)
+        previous = {col['name']: (col, memory) for col, memory in zip(self.columns, self.memory)}
+        dirty = set(touched) | {col for col in df.columns if col not in previous}
+
+        columns, memory = [], []
+        for col in df.columns:
+            info, col_memory = previous.get(col, (None, None))
+            if info is not None and col not in dirty and dropped is not None and len(dropped):
+                info = _drop_rows_from_column(info, dropped[col], df[col], self.rows)
+                if info is not None and df[col].dtype == object:
+                    # Deep usage of object columns is a per-row sum, so the dropped rows subtract out
+                    col_memory -= _column_memory(dropped[col])
+            if info is not None and df[col].dtype != object:
+                # Cheap for every other dtype
+                col_memory = _column_memory(df[col])
+            if info is None or col in dirty:
+                dirty.add(col)
+            columns.append(info)
+            memory.append(col_memory)
+
+        dirty_names = [col for col in df.columns if col in dirty]
+        if dirty_names:
+            fresh = dict(zip(dirty_names, profile_columns(df[dirty_names])))
+            for position, col in enumerate(df.columns):
+                if col in fresh:
+                    columns[position] = fresh[col]
+                    memory[position] = _column_memory(df[col])
+        index_memory = int(df.index.memory_usage(deep=True)) if dropped is not None else self.index_memory
+        return DatasetProfile(columns, memory, index_memory, len(df))
@@ -1,75 +1,233 @@
 from fastapi import APIRouter, HTTPException, Form
-from typing import Optional
-from data_processing import DataProcessor
-from shared_state import get_current_data, get_current_cleaned_data, set_current_cleaned_data
+import json
+from typing import List, Optional
+import pandas as pd
+from data_processing import DataProcessor, profile_summary
+from executor import run_in_pool
+from profile_cache import profile_cache, current_profile_key, current_state_key, remember_current
+from shared_state import (get_current_data, get_current_cleaned_data, get_current_cleaned_data_version,
+                          set_current_cleaned_data, edit_current_data)
+from transform_plan import Operation, TARGET_TYPES, record_operation
+from type_inference import suggest_types
 
 router = APIRouter()
 
+def _processed(processor, previous):
+    """Result frame, basic_info and preview of an operation, plus the full summary and
+    DatasetProfile of the result when they can be derived from the previous profile"""
+    if previous is None:
+        return processor.df, processor.get_basic_info(), processor.get_preview(), None, None
+    summary, profile = profile_summary(processor.df, processor.derive_profile(previous))
+    return processor.df, summary["basic_info"], summary["preview"], summary, profile
+
+def _clean(df, method, fill_value, previous=None):
+    processor = DataProcessor(df)
+    processor.clean_missing_values(method, fill_value)
+    return _processed(processor, previous)
+
+def _detect_outliers(df, column, method, columns=None, cache_key=None):
+    processor = DataProcessor(df, read_only=True, cache_key=cache_key)
+    if columns:
+        return processor.isolation_forest_outliers(columns)
+    return processor.detect_outliers(column, method)
+
+def _detect_outliers_all(df, method, threshold):
+    return DataProcessor(df, read_only=True).detect_outliers_all(method, threshold)
+
+def _remove_outliers(df, column, method, previous=None, columns=None, cache_key=None):
+    processor = DataProcessor(df, cache_key=cache_key)
+    processor.remove_outliers(column, method, columns)
+    return _processed(processor, previous)
+
+def _outlier_columns(df, column: Optional[str], method: str, columns: Optional[str]) -> Optional[List[str]]:
+    """The columns of a multivariate (isolation_forest) request, or None for a single column"""
+    if not columns:
+        if not column:
+            raise HTTPException(status_code=400, detail="column or columns is required")
+        return None
+    if method != "isolation_forest":
+        raise HTTPException(status_code=400, detail="Multiple columns are only supported with isolation_forest")
+    names = [name.strip() for name in columns.split(",") if name.strip()]
+    for name in names:
+        if name not in df.columns:
+            raise HTTPException(status_code=400, detail=f"Column '{name}' not found in data")
+        if not pd.api.types.is_numeric_dtype(df[name]):
+            raise HTTPException(status_code=400, detail=f"Column '{name}' is not numeric")
+    if not names:
+        raise HTTPException(status_code=400, detail="columns is empty")
+    return names
+
+def _convert_type(df, column, target_type, previous=None):
+    processor = DataProcessor(df)
+    processor.convert_data_type(column, target_type)
+    return _processed(processor, previous)
+
+def _convert_types(df, conversions, previous=None):
+    processor = DataProcessor(df)
+    processor.convert_data_types(conversions)
+    return _processed(processor, previous)
+
 @router.post("/clean-data")
 async def clean_data(method: str = Form(...), fill_value: Optional[str] = Form(None)):
-    current_data = get_current_data()
-    current_cleaned_data = get_current_cleaned_data()
-    if current_data is None:
-        raise HTTPException(status_code=404, detail="No data loaded")
-    try:
-        processor = DataProcessor(current_cleaned_data)
-        cleaned_df = processor.clean_missing_values(method, fill_value)
-        set_current_cleaned_data(cleaned_df)
-        return {
-            "message": f"Data cleaned using {method} method",
-            "basic_info": processor.get_basic_info(),
-            "preview": processor.get_preview()
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error cleaning data: {str(e)}")
+    async with edit_current_data() as (current_cleaned_data, version):
+        current_data = await get_current_data()
+        if current_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
+        try:
+            previous = profile_cache.get(current_state_key(version))
+            cleaned_df, basic_info, preview, summary, profile = await run_in_pool(
+                "compute", _clean, current_cleaned_data, method, fill_value, previous)
+            new_version = await set_current_cleaned_data(cleaned_df)
+            record_operation(Operation.clean(method, fill_value))
+            if profile is not None:
+                remember_current(new_version, summary, profile)
+            return {
+                "message": f"Data cleaned using {method} method",
+                "basic_info": basic_info,
+                "preview": preview
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error cleaning data: {str(e)}")
 
 @router.post("/detect-outliers")
-async def detect_outliers(column: str = Form(...), method: str = Form("zscore")):
-    current_cleaned_data = get_current_cleaned_data()
+async def detect_outliers(column: Optional[str] = Form(None), method: str = Form("zscore"),
+                          columns: Optional[str] = Form(None)):
+    """Outliers of one column, or with columns (comma-separated, isolation_forest only) the rows
+    a multivariate IsolationForest flags; the fit is reused by /remove-outliers on the same data"""
+    current_cleaned_data, version = await get_current_cleaned_data_version()
     if current_cleaned_data is None:
         raise HTTPException(status_code=404, detail="No data loaded")
     try:
-        processor = DataProcessor(current_cleaned_data)
-        outlier_indices = processor.detect_outliers(column, method)
+        names = _outlier_columns(current_cleaned_data, column, method, columns)
+        outlier_indices = await run_in_pool("compute", _detect_outliers, current_cleaned_data, column, method,
+                                            names, current_profile_key(version))
         return {
-            "column": column,
+            "column": column if names is None else names,
             "method": method,
             "outlier_count": len(outlier_indices),
             "outlier_indices": outlier_indices[:10]
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error detecting outliers: {str(e)}")
 
-@router.post("/remove-outliers")
-async def remove_outliers(column: str = Form(...), method: str = Form("zscore")):
-    current_cleaned_data = get_current_cleaned_data()
+@router.post("/detect-outliers-all")
+async def detect_outliers_all(method: str = Form("zscore"), threshold: float = Form(3.0)):
+    """Outlier counts of every numeric column in one call (zscore or iqr)"""
+    current_cleaned_data = await get_current_cleaned_data()
     if current_cleaned_data is None:
         raise HTTPException(status_code=404, detail="No data loaded")
+    if method not in ("zscore", "iqr"):
+        raise HTTPException(status_code=400, detail="method must be zscore or iqr")
     try:
-        processor = DataProcessor(current_cleaned_data)
-        cleaned_df = processor.remove_outliers(column, method)
-        set_current_cleaned_data(cleaned_df)
-        return {
-            "message": f"Outliers removed from {column} using {method} method",
-            "basic_info": processor.get_basic_info(),
-            "preview": processor.get_preview()
-        }
+        result = await run_in_pool("compute", _detect_outliers_all, current_cleaned_data, method, threshold)
+        return {"method": method, **result}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error removing outliers: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error detecting outliers: {str(e)}")
+
+@router.post("/remove-outliers")
+async def remove_outliers(column: Optional[str] = Form(None), method: str = Form("zscore"),
+                          columns: Optional[str] = Form(None)):
+    async with edit_current_data() as (current_cleaned_data, version):
+        if current_cleaned_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
+        try:
+            names = _outlier_columns(current_cleaned_data, column, method, columns)
+            previous = profile_cache.get(current_state_key(version))
+            cleaned_df, basic_info, preview, summary, profile = await run_in_pool(
+                "compute", _remove_outliers, current_cleaned_data, column, method, previous, names,
+                current_profile_key(version))
+            new_version = await set_current_cleaned_data(cleaned_df)
+            record_operation(Operation.remove_outliers(column, method, names))
+            if profile is not None:
+                remember_current(new_version, summary, profile)
+            target = column if names is None else ", ".join(names)
+            return {
+                "message": f"Outliers removed from {target} using {method} method",
+                "basic_info": basic_info,
+                "preview": preview
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error removing outliers: {str(e)}")
 
 @router.post("/convert-type")
 async def convert_data_type(column: str = Form(...), target_type: str = Form(...)):
-    current_cleaned_data = get_current_cleaned_data()
+    async with edit_current_data() as (current_cleaned_data, version):
+        if current_cleaned_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
+        try:
+            previous = profile_cache.get(current_state_key(version))
+            converted_df, basic_info, preview, summary, profile = await run_in_pool(
+                "compute", _convert_type, current_cleaned_data, column, target_type, previous)
+            new_version = await set_current_cleaned_data(converted_df)
+            record_operation(Operation.convert_type(column, target_type))
+            if profile is not None:
+                remember_current(new_version, summary, profile)
+            return {
+                "message": f"Converted {column} to {target_type}",
+                "basic_info": basic_info,
+                "preview": preview
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error converting data type: {str(e)}")
+
+@router.get("/suggest-types")
+async def get_type_suggestions():
+    """Text columns whose values look numeric or like dates, with the detected format"""
+    current_cleaned_data = await get_current_cleaned_data()
     if current_cleaned_data is None:
         raise HTTPException(status_code=404, detail="No data loaded")
-    try:
-        processor = DataProcessor(current_cleaned_data)
-        converted_df = processor.convert_data_type(column, target_type)
-        set_current_cleaned_data(converted_df)
-        return {
-            "message": f"Converted {column} to {target_type}",
-            "basic_info": processor.get_basic_info(),
-            "preview": processor.get_preview()
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error converting data type: {str(e)}") 
\ No newline at end of file
+    return {"suggestions": await run_in_pool("compute", suggest_types, current_cleaned_data)}
+
+@router.post("/convert-types")
+async def convert_data_types(conversions: Optional[str] = Form(None)):
+    """Convert several columns in one pass; conversions is a JSON object of column to target
+    type, and without it every suggestion of /suggest-types is applied"""
+    async with edit_current_data() as (current_cleaned_data, version):
+        if current_cleaned_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
+        try:
+            if conversions is None:
+                suggestions = await run_in_pool("compute", suggest_types, current_cleaned_data)
+                targets = {suggestion["column"]: suggestion["suggested_type"] for suggestion in suggestions}
+            else:
+                try:
+                    targets = json.loads(conversions)
+                except json.JSONDecodeError:
+                    raise HTTPException(status_code=400, detail="conversions must be a JSON object")
+                if not isinstance(targets, dict):
+                    raise HTTPException(status_code=400, detail="conversions must be a JSON object")
+            for column, target_type in targets.items():
+                if column not in current_cleaned_data.columns:
+                    raise HTTPException(status_code=400, detail=f"Column '{column}' not found in data")
+                if target_type not in TARGET_TYPES:
+                    raise HTTPException(status_code=400, detail=f"target_type must be one of {', '.join(TARGET_TYPES)}")
+            if not targets:
+                return {"message": "No columns to convert", "conversions": {}}
+            previous = profile_cache.get(current_state_key(version))
+            converted_df, basic_info, preview, summary, profile = await run_in_pool(
+                "compute", _convert_types, current_cleaned_data, targets, previous)
+            new_version = await set_current_cleaned_data(converted_df)
+            for column, target_type in targets.items():
+                record_operation(Operation.convert_type(column, target_type))
+            if profile is not None:
+                remember_current(new_version, summary, profile)
+            return {
+                "message": f"Converted {len(targets)} columns",
+                "conversions": targets,
+                "basic_info": basic_info,
+                "preview": preview
+            }
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error converting data types: {str(e)}")
@@ -1,17 +1,73 @@
-from fastapi import APIRouter, HTTPException
-from data_processing import DataProcessor
-from shared_state import get_current_cleaned_data
+import os
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from data_processing import profile_summary, frame_preview, approximate_summary, use_approximate
+from executor import run_in_pool
+from profile_cache import (profile_cache, remember_current, current_approximate_key, current_sketch_key,
+                           remember_current_approximate)
+from shared_state import get_current_cleaned_data_version, get_current_profile, get_current_shape, data_etag
 
 router = APIRouter()
 
+# Largest page /data-preview serves in one request
+MAX_PREVIEW_ROWS = int(os.environ.get("EAA_MAX_PREVIEW_ROWS", "5000"))
+
 @router.get("/data-info")
-async def get_data_info():
-    current_cleaned_data = get_current_cleaned_data()
+async def get_data_info(request: Request, approximate: Optional[bool] = None):
+    """Profile of the current dataset; approximate (by default above EAA_APPROX_PROFILE_ROWS rows)
+    estimates distinct counts and top values from sketches and reports their error bounds"""
+    # Data spilled to disk is only read back if its profile has to be computed
+    rows, version = await get_current_shape()
+    if rows is None:
+        raise HTTPException(status_code=404, detail="No data loaded")
+    approximate = use_approximate(rows, approximate)
+    variant = "approximate" if approximate else ""
+    
+    # Clients holding the profile of this version get a 304 without a body
+    etag = data_etag(version, variant)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    
+    if approximate:
+        summary = profile_cache.get(current_approximate_key(version))
+    else:
+        summary = get_current_profile(version)
+    if summary is None:
+        # The data may have changed since get_current_shape: the frame and its version are read
+        # together, and the ETag is that of the version the body describes
+        current_cleaned_data, version = await get_current_cleaned_data_version()
+        if current_cleaned_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
+        if approximate:
+            summary, sketch = await run_in_pool("compute", approximate_summary, current_cleaned_data,
+                                                profile_cache.get(current_sketch_key(version)))
+            remember_current_approximate(version, summary, sketch)
+        else:
+            summary, profile = await run_in_pool("compute", profile_summary, current_cleaned_data)
+            remember_current(version, summary, profile)
+    headers = {"ETag": data_etag(version, variant), "Cache-Control": "no-cache"}
+    return JSONResponse(jsonable_encoder(summary), headers=headers)
+
+@router.get("/data-preview")
+async def get_data_preview(request: Request, offset: int = 0, limit: int = 100):
+    """A page of rows of the current dataset, serialized like the preview in /data-info"""
+    current_cleaned_data, version = await get_current_cleaned_data_version()
     if current_cleaned_data is None:
         raise HTTPException(status_code=404, detail="No data loaded")
-    processor = DataProcessor(current_cleaned_data)
-    return {
-        "basic_info": processor.get_basic_info(),
-        "column_info": processor.get_column_info(),
-        "preview": processor.get_preview()
-    } 
\ No newline at end of file
+    if offset < 0 or limit < 1 or limit > MAX_PREVIEW_ROWS:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit between 1 and {MAX_PREVIEW_ROWS}")
+    
+    etag = data_etag(version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    rows = await run_in_pool("compute", frame_preview, current_cleaned_data, offset, limit)
+    return JSONResponse(jsonable_encoder({
+        "offset": offset,
+        "limit": limit,
+        "total_rows": len(current_cleaned_data),
+        "rows": rows
+    }), headers=headers)
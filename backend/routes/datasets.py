@@ -0,0 +1,48 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+from database import get_db, SavedData
+from dataset_registry import registry
+from dataset_store import load_frame, saved_frame_loader
+from data_processing import profile_summary
+from executor import run_in_pool
+from profile_cache import profile_cache, current_profile_key, remember_current
+from shared_state import activate_data, get_current_cleaned_data_version, set_current_data, set_current_cleaned_data
+from transform_plan import start_plan
+
+router = APIRouter()
+
+@router.get("/datasets/session")
+async def get_session_datasets():
+    """Datasets of the requesting session (X-Session-Id header) and the memory they use"""
+    return registry.session_stats()
+
+@router.post("/datasets/{dataset_id}/activate")
+async def activate_dataset(dataset_id: int, db: Session = Depends(get_db)):
+    """Make a dataset the session's current one, loading it from storage if the session
+    has not loaded it yet; its cleaning and transformation plan are kept if it has"""
+    if not await activate_data(dataset_id):
+        saved_data = db.query(SavedData).filter(
+            SavedData.dataset_id == dataset_id,
+            SavedData.data_type == 'original'
+        ).first()
+        if not saved_data:
+            raise HTTPException(status_code=404, detail="Dataset not found")
+        try:
+            df = await run_in_pool("compute", load_frame, saved_data)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error loading dataset: {str(e)}")
+        df = await set_current_data(df, dataset_id, saved_frame_loader(saved_data.id), saved_data.file_path)
+        await set_current_cleaned_data(df.copy(deep=False))
+        start_plan(df)
+    current_cleaned_data, version = await get_current_cleaned_data_version()
+    summary = profile_cache.get(current_profile_key(version))
+    if summary is None:
+        summary, profile = await run_in_pool("compute", profile_summary, current_cleaned_data)
+        remember_current(version, summary, profile)
+    return {
+        "message": f"Dataset {dataset_id} is now the current dataset",
+        "dataset_id": dataset_id,
+        **summary
+    }
@@ -1,23 +1,30 @@
 from fastapi import APIRouter, HTTPException
 import io
 
+from executor import run_in_pool
 from shared_state import get_current_cleaned_data
 
 router = APIRouter()
 
+def _to_csv(df):
+    csv_buffer = io.StringIO()
+    df.to_csv(csv_buffer, index=False)
+    csv_content = csv_buffer.getvalue()
+    csv_buffer.close()
+    return csv_content
+
 @router.get("/export-data")
 async def export_data():
-    current_cleaned_data = get_current_cleaned_data()
+    current_cleaned_data = await get_current_cleaned_data()
     if current_cleaned_data is None:
         raise HTTPException(status_code=404, detail="No data loaded")
     try:
-        csv_buffer = io.StringIO()
-        current_cleaned_data.to_csv(csv_buffer, index=False)
-        csv_content = csv_buffer.getvalue()
-        csv_buffer.close()
+        csv_content = await run_in_pool("compute", _to_csv, current_cleaned_data)
         return {
             "csv_data": csv_content,
             "filename": "exported_data.csv"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error exporting data: {str(e)}") 
\ No newline at end of file
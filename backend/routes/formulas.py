@@ -2,298 +2,378 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 import pandas as pd
 import json
-import pickle
+from typing import List
 from database import get_db, Dataset, SavedData
-from data_processing import DataProcessor
-from shared_state import get_current_cleaned_data, set_current_cleaned_data
+from dataset_store import load_frame, frame_columns
+from data_processing import profile_summary
+from executor import run_in_pool
+from lookup_cache import pooled_prepared_lookup
+from lookup_engine import exact_match, multi_key_match
+from profile_cache import profile_cache, current_state_key, remember_current
+from shared_state import edit_current_data, set_current_cleaned_data
+from transform_plan import Operation, record_operation
 
 router = APIRouter()
 
+def _get_lookup_saved_data(db: Session, table_id) -> SavedData:
+    """SavedData row of a lookup table, raising 404 if either the table or its data is missing"""
+    lookup_table = db.query(Dataset).filter(Dataset.id == table_id).first()
+    if not lookup_table:
+        raise HTTPException(status_code=404, detail="Lookup table not found")
+    
+    saved_data = db.query(SavedData).filter(
+        SavedData.dataset_id == lookup_table.id,
+        SavedData.data_type == 'lookup_table'
+    ).first()
+    
+    if not saved_data:
+        raise HTTPException(status_code=404, detail="Lookup table data not found")
+    
+    return saved_data
+
+def _projection(*columns) -> List[str]:
+    """Column names to load from the dataset store, deduplicated in first-seen order"""
+    return list(dict.fromkeys(columns))
+
+def _vlookup_column(df, prepared, request):
+    """VLOOKUP result for every row of df"""
+    if_not_found = request.get('ifNotFound', '')
+    lookup_values = df[request['lookupColumn']]
+    
+    if request.get('exactMatch', True):
+        # Exact match: one hash join against the cached key index
+        result = exact_match(prepared.hash_index(), prepared.values, lookup_values, if_not_found)
+    else:
+        # Approximate match: keys are sorted once, every row resolves with one binary search
+        result = prepared.sorted_lookup().nearest(lookup_values, if_not_found)
+    
+    return result
+
+def _xlookup_column(df, prepared, request):
+    """XLOOKUP result for every row of df"""
+    search_mode = request.get('searchMode', 'exact')
+    if_not_found = request.get('ifNotFound', '')
+    lookup_values = df[request['lookupColumn']]
+    
+    if search_mode == 'exact':
+        result = exact_match(prepared.hash_index(), prepared.values, lookup_values, if_not_found)
+    elif search_mode == 'exact_or_next':
+        # Sorted-key modes run as one as-of join over keys sorted once
+        result = prepared.sorted_lookup().exact_or_next(lookup_values, if_not_found)
+    elif search_mode == 'exact_or_previous':
+        result = prepared.sorted_lookup().exact_or_previous(lookup_values, if_not_found)
+    elif search_mode in ('wildcard', 'wildcard_pattern'):
+        # Substring (wildcard) and */? pattern (wildcard_pattern) matching through a
+        # trigram index over the keys
+        result = prepared.substring_index().resolve(
+            lookup_values, prepared.hash_index(), prepared.values, if_not_found,
+            pattern=search_mode == 'wildcard_pattern'
+        )
+    else:
+        result = pd.Series(if_not_found, index=lookup_values.index, dtype=object)
+    
+    return result
+
+def _dax_filter_mask(lookup_df, filters):
+    """Mask of lookup rows matching every constant (column = value) filter"""
+    filter_mask = pd.Series(True, index=lookup_df.index)
+    
+    for filter_condition in filters:
+        column = filter_condition['column']
+        value = filter_condition['value']
+        
+        # Apply filter
+        if pd.api.types.is_numeric_dtype(lookup_df[column]):
+            try:
+                value = float(value)
+                filter_mask &= (lookup_df[column] == value)
+            except ValueError:
+                filter_mask &= (lookup_df[column] == value)
+        else:
+            filter_mask &= (lookup_df[column] == value)
+    
+    return filter_mask
+
+def _dax_lookup_column(df, lookup_df, request):
+    """DAX LOOKUPVALUE result for every row of df"""
+    return_column = request['returnColumn']
+    alternate_result = request.get('alternateResult', '')
+    on_multiple = request.get('onMultiple', 'first')
+    
+    # Filters either compare a lookup column with a constant or with a column
+    # of the main dataset (search column = main column)
+    constant_filters = [f for f in request['filters'] if not f.get('mainColumn')]
+    join_filters = [f for f in request['filters'] if f.get('mainColumn')]
+    
+    filtered_df = lookup_df[_dax_filter_mask(lookup_df, constant_filters)]
+    
+    if join_filters:
+        # Every row resolves at once through a hash join on all join columns
+        result, ambiguous_rows = multi_key_match(
+            filtered_df[[f['column'] for f in join_filters]],
+            filtered_df[return_column],
+            df[[f['mainColumn'] for f in join_filters]],
+            alternate_result,
+            on_multiple
+        )
+    else:
+        # Constant filters only: the same first match for every row
+        matches = filtered_df[return_column]
+        ambiguous_rows = len(df) if matches.nunique(dropna=False) > 1 else 0
+        if len(matches) == 0 or (ambiguous_rows and on_multiple == 'blank'):
+            value = alternate_result
+        else:
+            value = matches.iloc[0]
+        result = pd.Series([value] * len(df), index=df.index)
+    
+    if ambiguous_rows and on_multiple == 'error':
+        raise HTTPException(status_code=400, detail=f"LOOKUPVALUE found multiple distinct values for {ambiguous_rows} row(s)")
+    
+    return result
+
+# Result column builders by formula type, each called as builder(df, source, request)
+# where source is a PreparedLookup (vlookup/xlookup) or the projected lookup frame (dax)
+FORMULA_BUILDERS = {
+    'vlookup': _vlookup_column,
+    'xlookup': _xlookup_column,
+    'dax': _dax_lookup_column
+}
+
+def _apply_formulas(df, steps, previous=None):
+    """Add the result columns of (formula_type, source, request) steps to one copy of df, in order.
+    
+    Returns the new frame, its summary and DatasetProfile; given the profile of df,
+    only the result columns are profiled.
+    """
+    # Shallow: the new columns are added to a frame that shares df's columns
+    result_df = df.copy(deep=False)
+    for formula_type, source, request in steps:
+        result_df[request['resultColumnName']] = FORMULA_BUILDERS[formula_type](result_df, source, request)
+    profile = None
+    if previous is not None:
+        profile = previous.derive(result_df, touched=[request['resultColumnName'] for _, _, request in steps])
+    summary, profile = profile_summary(result_df, profile)
+    return result_df, summary, profile
+
+def _validate_lookup_formula(request, main_columns, lookup_columns):
+    """Check the columns a VLOOKUP/XLOOKUP request refers to"""
+    if request['lookupColumn'] not in main_columns:
+        raise HTTPException(status_code=400, detail=f"Lookup column '{request['lookupColumn']}' not found in main dataset")
+    
+    if request['returnColumn'] not in lookup_columns:
+        raise HTTPException(status_code=400, detail=f"Return column '{request['returnColumn']}' not found in lookup table")
+
+def _validate_dax_formula(request, main_columns, lookup_columns):
+    """Check the columns and options of a DAX LOOKUPVALUE request"""
+    if request['returnColumn'] not in lookup_columns:
+        raise HTTPException(status_code=400, detail=f"Return column '{request['returnColumn']}' not found in lookup table")
+    
+    for filter_condition in request['filters']:
+        if filter_condition['column'] not in lookup_columns:
+            raise HTTPException(status_code=400, detail=f"Filter column '{filter_condition['column']}' not found in lookup table")
+        main_column = filter_condition.get('mainColumn')
+        if main_column and main_column not in main_columns:
+            raise HTTPException(status_code=400, detail=f"Main column '{main_column}' not found in main dataset")
+    
+    if request.get('onMultiple', 'first') not in ('first', 'error', 'blank'):
+        raise HTTPException(status_code=400, detail="onMultiple must be 'first', 'error' or 'blank'")
+
+def _dax_projection(request) -> List[str]:
+    """Lookup table columns a DAX LOOKUPVALUE request reads"""
+    return _projection(request['returnColumn'], *[f['column'] for f in request['filters']])
+
 @router.post("/apply-vlookup")
 async def apply_vlookup(request: dict, db: Session = Depends(get_db)):
     """Apply VLOOKUP formula to the current dataset"""
-    current_cleaned_data = get_current_cleaned_data()
-    
-    if current_cleaned_data is None:
-        raise HTTPException(status_code=404, detail="No data loaded")
-    
-    try:
-        # Get lookup table
-        lookup_table = db.query(Dataset).filter(Dataset.id == request['lookupTableId']).first()
-        if not lookup_table:
-            raise HTTPException(status_code=404, detail="Lookup table not found")
-        
-        saved_data = db.query(SavedData).filter(
-            SavedData.dataset_id == lookup_table.id,
-            SavedData.data_type == 'lookup_table'
-        ).first()
+    async with edit_current_data() as (current_cleaned_data, version):
         
-        if not saved_data:
-            raise HTTPException(status_code=404, detail="Lookup table data not found")
+        if current_cleaned_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
         
-        lookup_df = pickle.loads(saved_data.data_content)
-        
-        # Validate columns exist
-        if request['lookupColumn'] not in current_cleaned_data.columns:
-            raise HTTPException(status_code=400, detail=f"Lookup column '{request['lookupColumn']}' not found in main dataset")
-        
-        if request['returnColumn'] not in lookup_df.columns:
-            raise HTTPException(status_code=400, detail=f"Return column '{request['returnColumn']}' not found in lookup table")
-        
-        # Apply VLOOKUP
-        result_df = current_cleaned_data.copy()
-        
-        # Create lookup dictionary for better performance
-        lookup_dict = dict(zip(lookup_df.iloc[:, 0], lookup_df[request['returnColumn']]))
-        
-        # Apply lookup
-        def vlookup(value):
-            if pd.isna(value):
-                return request.get('ifNotFound', '')
+        try:
+            # Get lookup table
+            saved_data = _get_lookup_saved_data(db, request['lookupTableId'])
+            lookup_columns = frame_columns(saved_data)
             
-            if request.get('exactMatch', True):
-                # Exact match
-                return lookup_dict.get(value, request.get('ifNotFound', ''))
-            else:
-                # Approximate match (find closest value)
-                if value in lookup_dict:
-                    return lookup_dict[value]
-                
-                # Find closest value
-                lookup_values = list(lookup_dict.keys())
-                if not lookup_values:
-                    return request.get('ifNotFound', '')
-                
-                # Sort values and find closest
-                lookup_values.sort()
-                for i, lv in enumerate(lookup_values):
-                    if value <= lv:
-                        if i == 0:
-                            return lookup_dict[lv]
-                        else:
-                            # Return the closest value
-                            prev_val = lookup_values[i-1]
-                            if abs(value - prev_val) <= abs(value - lv):
-                                return lookup_dict[prev_val]
-                            else:
-                                return lookup_dict[lv]
-                
-                # If value is greater than all lookup values, return the last one
-                return lookup_dict[lookup_values[-1]]
-        
-        result_df[request['resultColumnName']] = result_df[request['lookupColumn']].apply(vlookup)
-        
-        # Update global data
-        set_current_cleaned_data(result_df)
-        
-        # Process results
-        processor = DataProcessor(result_df)
-        
-        return {
-            "message": "VLOOKUP applied successfully",
-            "basic_info": processor.get_basic_info(),
-            "column_info": processor.get_column_info(),
-            "preview": processor.get_preview()
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"VLOOKUP error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error applying VLOOKUP: {str(e)}")
+            # Validate columns exist
+            _validate_lookup_formula(request, current_cleaned_data.columns, lookup_columns)
+            
+            # Prepared keys/values come from the lookup cache; on a miss only the
+            # key (first) column and the return column are loaded
+            prepared = await pooled_prepared_lookup(saved_data, lookup_columns[0], request['returnColumn'])
+            
+            # Apply VLOOKUP
+            previous = profile_cache.get(current_state_key(version))
+            result_df, summary, profile = await run_in_pool("compute", _apply_formulas, current_cleaned_data, [('vlookup', prepared, request)], previous)
+            
+            # Update global data; the summary is the profile of the new version
+            remember_current(await set_current_cleaned_data(result_df), summary, profile)
+            record_operation(Operation.added_columns(f"VLOOKUP into {request['resultColumnName']}", result_df,
+                                                    [request['resultColumnName']]))
+            
+            return {
+                "message": "VLOOKUP applied successfully",
+                **summary
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"VLOOKUP error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error applying VLOOKUP: {str(e)}")
 
 @router.post("/apply-xlookup")
 async def apply_xlookup(request: dict, db: Session = Depends(get_db)):
     """Apply XLOOKUP formula to the current dataset"""
-    current_cleaned_data = get_current_cleaned_data()
-    
-    if current_cleaned_data is None:
-        raise HTTPException(status_code=404, detail="No data loaded")
-    
-    try:
-        # Get lookup table
-        lookup_table = db.query(Dataset).filter(Dataset.id == request['lookupTableId']).first()
-        if not lookup_table:
-            raise HTTPException(status_code=404, detail="Lookup table not found")
-        
-        saved_data = db.query(SavedData).filter(
-            SavedData.dataset_id == lookup_table.id,
-            SavedData.data_type == 'lookup_table'
-        ).first()
-        
-        if not saved_data:
-            raise HTTPException(status_code=404, detail="Lookup table data not found")
-        
-        lookup_df = pickle.loads(saved_data.data_content)
-        
-        # Validate columns exist
-        if request['lookupColumn'] not in current_cleaned_data.columns:
-            raise HTTPException(status_code=400, detail=f"Lookup column '{request['lookupColumn']}' not found in main dataset")
-        
-        if request['returnColumn'] not in lookup_df.columns:
-            raise HTTPException(status_code=400, detail=f"Return column '{request['returnColumn']}' not found in lookup table")
-        
-        # Apply XLOOKUP
-        result_df = current_cleaned_data.copy()
+    async with edit_current_data() as (current_cleaned_data, version):
         
-        # Create lookup dictionary
-        lookup_dict = dict(zip(lookup_df.iloc[:, 0], lookup_df[request['returnColumn']]))
+        if current_cleaned_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
         
-        # Apply lookup based on search mode
-        def xlookup(value):
-            if pd.isna(value):
-                return request.get('ifNotFound', '')
+        try:
+            # Get lookup table
+            saved_data = _get_lookup_saved_data(db, request['lookupTableId'])
+            lookup_columns = frame_columns(saved_data)
             
-            search_mode = request.get('searchMode', 'exact')
+            # Validate columns exist
+            _validate_lookup_formula(request, current_cleaned_data.columns, lookup_columns)
             
-            if search_mode == 'exact':
-                return lookup_dict.get(value, request.get('ifNotFound', ''))
+            # Prepared keys/values come from the lookup cache; on a miss only the
+            # key (first) column and the return column are loaded
+            prepared = await pooled_prepared_lookup(saved_data, lookup_columns[0], request['returnColumn'])
             
-            elif search_mode == 'exact_or_next':
-                if value in lookup_dict:
-                    return lookup_dict[value]
-                
-                # Find next value
-                lookup_values = sorted(lookup_dict.keys())
-                for lv in lookup_values:
-                    if lv >= value:
-                        return lookup_dict[lv]
-                
-                return request.get('ifNotFound', '')
+            # Apply XLOOKUP
+            previous = profile_cache.get(current_state_key(version))
+            result_df, summary, profile = await run_in_pool("compute", _apply_formulas, current_cleaned_data, [('xlookup', prepared, request)], previous)
             
-            elif search_mode == 'exact_or_previous':
-                if value in lookup_dict:
-                    return lookup_dict[value]
-                
-                # Find previous value
-                lookup_values = sorted(lookup_dict.keys(), reverse=True)
-                for lv in lookup_values:
-                    if lv <= value:
-                        return lookup_dict[lv]
-                
-                return request.get('ifNotFound', '')
+            # Update global data; the summary is the profile of the new version
+            remember_current(await set_current_cleaned_data(result_df), summary, profile)
+            record_operation(Operation.added_columns(f"XLOOKUP into {request['resultColumnName']}", result_df,
+                                                    [request['resultColumnName']]))
             
-            elif search_mode == 'wildcard':
-                # Simple wildcard matching
-                if value in lookup_dict:
-                    return lookup_dict[value]
-                
-                # Try partial matches
-                for k, v in lookup_dict.items():
-                    if str(value).lower() in str(k).lower() or str(k).lower() in str(value).lower():
-                        return v
-                
-                return request.get('ifNotFound', '')
+            return {
+                "message": "XLOOKUP applied successfully",
+                **summary
+            }
             
-            else:
-                return request.get('ifNotFound', '')
-        
-        result_df[request['resultColumnName']] = result_df[request['lookupColumn']].apply(xlookup)
-        
-        # Update global data
-        set_current_cleaned_data(result_df)
-        
-        # Process results
-        processor = DataProcessor(result_df)
-        
-        return {
-            "message": "XLOOKUP applied successfully",
-            "basic_info": processor.get_basic_info(),
-            "column_info": processor.get_column_info(),
-            "preview": processor.get_preview()
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"XLOOKUP error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error applying XLOOKUP: {str(e)}")
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"XLOOKUP error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error applying XLOOKUP: {str(e)}")
 
 @router.post("/apply-dax-lookup")
 async def apply_dax_lookup(request: dict, db: Session = Depends(get_db)):
     """Apply DAX LOOKUPVALUE formula to the current dataset"""
-    current_cleaned_data = get_current_cleaned_data()
-    
-    if current_cleaned_data is None:
-        raise HTTPException(status_code=404, detail="No data loaded")
-    
-    try:
-        # Get lookup table
-        lookup_table = db.query(Dataset).filter(Dataset.id == request['lookupTableId']).first()
-        if not lookup_table:
-            raise HTTPException(status_code=404, detail="Lookup table not found")
-        
-        saved_data = db.query(SavedData).filter(
-            SavedData.dataset_id == lookup_table.id,
-            SavedData.data_type == 'lookup_table'
-        ).first()
-        
-        if not saved_data:
-            raise HTTPException(status_code=404, detail="Lookup table data not found")
-        
-        lookup_df = pickle.loads(saved_data.data_content)
-        
-        # Validate return column exists
-        if request['returnColumn'] not in lookup_df.columns:
-            raise HTTPException(status_code=400, detail=f"Return column '{request['returnColumn']}' not found in lookup table")
+    async with edit_current_data() as (current_cleaned_data, version):
         
-        # Validate filter columns exist
-        for filter_condition in request['filters']:
-            if filter_condition['column'] not in lookup_df.columns:
-                raise HTTPException(status_code=400, detail=f"Filter column '{filter_condition['column']}' not found in lookup table")
+        if current_cleaned_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
         
-        # Apply DAX LOOKUPVALUE
-        result_df = current_cleaned_data.copy()
-        
-        # Create filter mask
-        filter_mask = pd.Series([True] * len(lookup_df), index=lookup_df.index)
-        
-        for filter_condition in request['filters']:
-            column = filter_condition['column']
-            value = filter_condition['value']
+        try:
+            # Get lookup table
+            saved_data = _get_lookup_saved_data(db, request['lookupTableId'])
+            lookup_columns = frame_columns(saved_data)
+            
+            # Validate return and filter columns exist
+            _validate_dax_formula(request, current_cleaned_data.columns, lookup_columns)
+            
+            # Only the return and filter columns are materialized
+            lookup_df = await run_in_pool("compute", load_frame, saved_data, _dax_projection(request))
+            
+            # Apply DAX LOOKUPVALUE
+            previous = profile_cache.get(current_state_key(version))
+            result_df, summary, profile = await run_in_pool("compute", _apply_formulas, current_cleaned_data, [('dax', lookup_df, request)], previous)
+            
+            # Update global data; the summary is the profile of the new version
+            remember_current(await set_current_cleaned_data(result_df), summary, profile)
+            record_operation(Operation.added_columns(f"LOOKUPVALUE into {request['resultColumnName']}", result_df,
+                                                    [request['resultColumnName']]))
             
-            # Apply filter
-            if pd.api.types.is_numeric_dtype(lookup_df[column]):
+            return {
+                "message": "DAX LOOKUPVALUE applied successfully",
+                **summary
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"DAX LOOKUPVALUE error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error applying DAX LOOKUPVALUE: {str(e)}") 
+
+@router.post("/apply-formulas")
+async def apply_formulas(request: dict, db: Session = Depends(get_db)):
+    """Apply an ordered list of VLOOKUP, XLOOKUP and DAX LOOKUPVALUE formulas in one pass"""
+    async with edit_current_data() as (current_cleaned_data, version):
+        
+        if current_cleaned_data is None:
+            raise HTTPException(status_code=404, detail="No data loaded")
+        
+        formulas = request.get('formulas') or []
+        if not formulas:
+            raise HTTPException(status_code=400, detail="No formulas given")
+        
+        try:
+            saved_rows = {}
+            lookup_columns = {}
+            dax_columns = {}
+            # Later formulas may use the result columns of earlier ones
+            main_columns = set(current_cleaned_data.columns)
+            
+            for position, formula in enumerate(formulas, start=1):
                 try:
-                    value = float(value)
-                    filter_mask &= (lookup_df[column] == value)
-                except ValueError:
-                    filter_mask &= (lookup_df[column] == value)
-            else:
-                filter_mask &= (lookup_df[column] == value)
-        
-        # Get filtered results
-        filtered_df = lookup_df[filter_mask]
-        
-        # Apply lookup for each row in main dataset
-        def dax_lookup(row_index):
-            # For DAX LOOKUPVALUE, we return the first matching value
-            # In a real implementation, you might want to handle multiple matches differently
-            if len(filtered_df) == 0:
-                return ''
+                    formula_type = formula.get('type')
+                    if formula_type not in FORMULA_BUILDERS:
+                        raise HTTPException(status_code=400, detail=f"Unknown formula type '{formula_type}'")
+                    
+                    table_id = formula['lookupTableId']
+                    if table_id not in saved_rows:
+                        saved_rows[table_id] = _get_lookup_saved_data(db, table_id)
+                        lookup_columns[table_id] = frame_columns(saved_rows[table_id])
+                    
+                    if formula_type == 'dax':
+                        _validate_dax_formula(formula, main_columns, lookup_columns[table_id])
+                        dax_columns.setdefault(table_id, []).extend(_dax_projection(formula))
+                    else:
+                        _validate_lookup_formula(formula, main_columns, lookup_columns[table_id])
+                    
+                    main_columns.add(formula['resultColumnName'])
+                except HTTPException as e:
+                    raise HTTPException(status_code=e.status_code, detail=f"Formula {position}: {e.detail}")
             
-            # Return the first value from the return column
-            return filtered_df.iloc[0][request['returnColumn']]
-        
-        # Apply to each row (this is a simplified implementation)
-        # In practice, you might want to apply this differently based on your specific use case
-        result_df[request['resultColumnName']] = [dax_lookup(i) for i in range(len(result_df))]
-        
-        # Update global data
-        set_current_cleaned_data(result_df)
-        
-        # Process results
-        processor = DataProcessor(result_df)
-        
-        return {
-            "message": "DAX LOOKUPVALUE applied successfully",
-            "basic_info": processor.get_basic_info(),
-            "column_info": processor.get_column_info(),
-            "preview": processor.get_preview()
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"DAX LOOKUPVALUE error: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error applying DAX LOOKUPVALUE: {str(e)}") 
\ No newline at end of file
+            # Each lookup table is loaded at most once for all of its DAX formulas,
+            # VLOOKUP/XLOOKUP structures are shared through the lookup cache
+            dax_frames = {}
+            for table_id, columns in dax_columns.items():
+                dax_frames[table_id] = await run_in_pool("compute", load_frame, saved_rows[table_id], _projection(*columns))
+            
+            steps = []
+            for formula in formulas:
+                table_id = formula['lookupTableId']
+                if formula['type'] == 'dax':
+                    source = dax_frames[table_id]
+                else:
+                    source = await pooled_prepared_lookup(saved_rows[table_id], lookup_columns[table_id][0],
+                                                          formula['returnColumn'])
+                steps.append((formula['type'], source, formula))
+            
+            # One copy of the dataset and one profile for the whole batch
+            previous = profile_cache.get(current_state_key(version))
+            result_df, summary, profile = await run_in_pool("compute", _apply_formulas, current_cleaned_data, steps, previous)
+            
+            # Update global data; the summary is the profile of the new version
+            result_columns = [formula['resultColumnName'] for formula in formulas]
+            remember_current(await set_current_cleaned_data(result_df), summary, profile)
+            record_operation(Operation.added_columns(f"formulas into {', '.join(result_columns)}", result_df, result_columns))
+            
+            return {
+                "message": f"{len(formulas)} formulas applied successfully",
+                "result_columns": result_columns,
+                **summary
+            }
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"Batch formula error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error applying formulas: {str(e)}")
@@ -1,49 +1,37 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
 from sqlalchemy.orm import Session
-import pandas as pd
-import io
 import json
-import pickle
+from typing import Optional
 from database import get_db, Dataset, SavedData
-from data_processing import DataProcessor
+from dataset_store import store_frame, load_frame, delete_frame_file
+from data_processing import DataProcessor, build_summary
+from executor import run_in_pool
+from ingest import ingest_upload
+from lookup_cache import lookup_cache
+from profile_cache import profile_cache, saved_profile_key
 
 router = APIRouter()
 
+def _basic_info_from_store(saved_data):
+    return DataProcessor(load_frame(saved_data), read_only=True).get_basic_info()
+
 @router.post("/upload-lookup-table")
-async def upload_lookup_table(file: UploadFile = File(...), table_name: str = Form(...), db: Session = Depends(get_db)):
+async def upload_lookup_table(file: UploadFile = File(...), table_name: str = Form(...), upload_id: Optional[str] = Form(None), db: Session = Depends(get_db)):
     """Upload a lookup table"""
     try:
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No filename provided")
-        
-        content = await file.read()
-        if not content:
-            raise HTTPException(status_code=400, detail="Empty file")
-        
-        try:
-            if file.filename.lower().endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(content))
-            elif file.filename.lower().endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(io.BytesIO(content))
-            else:
-                raise HTTPException(status_code=400, detail=f"Unsupported file format: {file.filename}")
-        except Exception as pandas_error:
-            raise HTTPException(status_code=400, detail=f"Error reading file: {str(pandas_error)}")
-        
-        if df.empty:
-            raise HTTPException(status_code=400, detail="File contains no data")
+        df = await ingest_upload(file, upload_id)
         
         # Process data
-        processor = DataProcessor(df)
-        basic_info = processor.get_basic_info()
-        column_info = processor.get_column_info()
-        preview = processor.get_preview()
+        summary = await run_in_pool("compute", build_summary, df)
+        basic_info = summary["basic_info"]
+        column_info = summary["column_info"]
+        preview = summary["preview"]
         
         # Save to database as lookup table
         dataset = Dataset(
             name=table_name,
             filename=file.filename,
-            file_size=int(basic_info['file_size'].replace(' KB', '').replace(' MB', '')),
+            file_size=int(float(basic_info['file_size'].split()[0])),
             rows=basic_info['rows'],
             columns=basic_info['columns'],
             data_preview=json.dumps(preview),
@@ -57,11 +45,15 @@ async def upload_lookup_table(file: UploadFile = File(...), table_name: str = Fo
         saved_data = SavedData(
             dataset_id=dataset.id,
             data_type='lookup_table',
-            data_content=pickle.dumps(df)
+            **await run_in_pool("compute", store_frame, df, dataset.id, 'lookup_table')
         )
         db.add(saved_data)
         db.commit()
         
+        # SQLite may hand out the id of a deleted table again
+        lookup_cache.invalidate_table(dataset.id)
+        profile_cache.put(saved_profile_key(saved_data, "basic_info"), basic_info)
+        
         return {
             "id": dataset.id,
             "name": table_name,
@@ -94,9 +86,6 @@ async def get_lookup_tables(db: Session = Depends(get_db)):
             ).first()
             
             if saved_data:
-                df = pickle.loads(saved_data.data_content)
-                processor = DataProcessor(df)
-                
                 tables.append({
                     "id": dataset.id,
                     "name": dataset.name,
@@ -127,8 +116,10 @@ async def get_lookup_table(table_id: int, db: Session = Depends(get_db)):
         if not saved_data:
             raise HTTPException(status_code=404, detail="Lookup table data not found")
         
-        df = pickle.loads(saved_data.data_content)
-        processor = DataProcessor(df)
+        basic_info = profile_cache.get(saved_profile_key(saved_data, "basic_info"))
+        if basic_info is None:
+            basic_info = await run_in_pool("compute", _basic_info_from_store, saved_data)
+            profile_cache.put(saved_profile_key(saved_data, "basic_info"), basic_info)
         
         return {
             "id": dataset.id,
@@ -137,7 +128,7 @@ async def get_lookup_table(table_id: int, db: Session = Depends(get_db)):
             "columns": dataset.columns,
             "column_info": json.loads(dataset.column_info),
             "preview": json.loads(dataset.data_preview),
-            "basic_info": processor.get_basic_info()
+            "basic_info": basic_info
         }
         
     except HTTPException:
@@ -160,11 +151,13 @@ async def delete_lookup_table(table_id: int, db: Session = Depends(get_db)):
         ).all()
         
         for data in saved_data:
+            delete_frame_file(data)
             db.delete(data)
         
         # Delete dataset
         db.delete(dataset)
         db.commit()
+        lookup_cache.invalidate_table(table_id)
         
         return {"message": "Lookup table deleted successfully"}
         
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from dataset_registry import registry
+from executor import pool_metrics
+from lookup_cache import lookup_cache
+from profile_cache import profile_cache
+
+router = APIRouter()
+
+@router.get("/metrics/pools")
+async def get_pool_metrics():
+    """Queue depth, throughput and latency for each worker pool"""
+    return pool_metrics()
+
+
+@router.get("/metrics/lookup-cache")
+async def get_lookup_cache_metrics():
+    """Size and hit/miss counters of the prepared lookup cache"""
+    return lookup_cache.stats()
+
+
+@router.get("/metrics/profile-cache")
+async def get_profile_cache_metrics():
+    """Size and hit/miss counters of the dataset profile cache"""
+    return profile_cache.stats()
+
+
+@router.get("/metrics/datasets")
+async def get_dataset_metrics():
+    """Memory per session against the dataset memory budget, with spill/rehydrate and
+    eviction/reload counters and latencies"""
+    return registry.stats()
@@ -0,0 +1,109 @@
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+import json
+from typing import Any, Dict, List, Optional
+from database import get_db, CleaningRecipe
+from routes.transformations import apply_steps, require_plan
+from transform_plan import parse_steps
+
+router = APIRouter()
+
+class RecipeRequest(BaseModel):
+    name: str
+    description: Optional[str] = None
+    steps: Optional[List[Dict[str, Any]]] = None
+    from_plan: bool = False
+
+class ApplyRecipeRequest(BaseModel):
+    recipe_id: Optional[int] = None
+    steps: Optional[List[Dict[str, Any]]] = None
+    save_as: Optional[str] = None
+
+def _recipe_dict(recipe: CleaningRecipe) -> Dict[str, Any]:
+    return {
+        "id": recipe.id,
+        "name": recipe.name,
+        "description": recipe.description,
+        "steps": json.loads(recipe.steps),
+        "created_at": recipe.created_at.isoformat() if recipe.created_at else None
+    }
+
+def _new_recipe(name: str, steps: List[Dict[str, Any]], description: Optional[str] = None) -> CleaningRecipe:
+    """A recipe of validated steps; columns are not checked, so a recipe can outlive the data it was made on"""
+    if not name.strip():
+        raise HTTPException(status_code=400, detail="Recipe name is required")
+    if not steps:
+        raise HTTPException(status_code=400, detail="A recipe needs at least one step")
+    try:
+        operations = parse_steps(steps)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return CleaningRecipe(
+        name=name.strip(),
+        description=description,
+        steps=json.dumps([operation.to_step() for operation in operations])
+    )
+
+def _store_recipe(db: Session, recipe: CleaningRecipe) -> CleaningRecipe:
+    db.add(recipe)
+    db.commit()
+    db.refresh(recipe)
+    return recipe
+
+@router.post("/recipes")
+async def create_recipe(request: RecipeRequest, db: Session = Depends(get_db)):
+    """Save a cleaning recipe from the given steps, or from the operations applied to the current data"""
+    skipped = 0
+    steps = request.steps or []
+    if request.from_plan:
+        plan, _ = await require_plan()
+        steps, skipped = plan.recipe_steps()
+    recipe = _store_recipe(db, _new_recipe(request.name, steps, request.description))
+    return {
+        "message": f"Recipe '{recipe.name}' saved",
+        **_recipe_dict(recipe),
+        # Formula results and checkpoints in the plan cannot be part of a recipe
+        "skipped_steps": skipped
+    }
+
+@router.get("/recipes")
+async def list_recipes(db: Session = Depends(get_db)):
+    recipes = db.query(CleaningRecipe).order_by(CleaningRecipe.created_at.desc()).all()
+    return [_recipe_dict(recipe) for recipe in recipes]
+
+@router.get("/recipes/{recipe_id}")
+async def get_recipe(recipe_id: int, db: Session = Depends(get_db)):
+    recipe = db.query(CleaningRecipe).filter(CleaningRecipe.id == recipe_id).first()
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    return _recipe_dict(recipe)
+
+@router.delete("/recipes/{recipe_id}")
+async def delete_recipe(recipe_id: int, db: Session = Depends(get_db)):
+    recipe = db.query(CleaningRecipe).filter(CleaningRecipe.id == recipe_id).first()
+    if not recipe:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+    db.delete(recipe)
+    db.commit()
+    return {"message": "Recipe deleted successfully"}
+
+@router.post("/apply-recipe")
+async def apply_recipe(request: ApplyRecipeRequest, db: Session = Depends(get_db)):
+    """Run a stored recipe (recipe_id) or an inline one (steps) on the current data in one
+    fused pass with a single profile of the result; save_as also stores inline steps"""
+    if (request.recipe_id is None) == (request.steps is None):
+        raise HTTPException(status_code=400, detail="Give either recipe_id or steps")
+    if request.recipe_id is not None:
+        recipe = db.query(CleaningRecipe).filter(CleaningRecipe.id == request.recipe_id).first()
+        if not recipe:
+            raise HTTPException(status_code=404, detail="Recipe not found")
+        steps = json.loads(recipe.steps)
+    else:
+        steps = request.steps
+    # Checked before the data changes, so a bad name leaves the data as it was
+    recipe = _new_recipe(request.save_as, steps) if request.save_as and request.steps is not None else None
+    result = await apply_steps(steps)
+    if recipe is not None:
+        result["recipe_id"] = _store_recipe(db, recipe).id
+    return result
@@ -4,27 +4,33 @@ import base64
 from data_processing import DataProcessor
 from visualization import Visualizer
 from reporting import ReportGenerator
+from executor import run_in_pool
 from shared_state import get_current_cleaned_data
 
 router = APIRouter()
 
+def _render_report(df, title, company, charts_list):
+    data_processor = DataProcessor(df, read_only=True)
+    visualizer = Visualizer(df)
+    report_gen = ReportGenerator(data_processor, visualizer)
+    return report_gen.generate_pdf_report(title, company, charts_list)
+
 @router.post("/generate-report")
 async def generate_report(title: str = Form(...), company: str = Form(...), charts: str = Form("[]")):
-    current_cleaned_data = get_current_cleaned_data()
+    current_cleaned_data = await get_current_cleaned_data()
     if current_cleaned_data is None:
         raise HTTPException(status_code=404, detail="No data loaded")
     try:
-        data_processor = DataProcessor(current_cleaned_data)
-        visualizer = Visualizer(current_cleaned_data)
-        report_gen = ReportGenerator(data_processor, visualizer)
         charts_list = json.loads(charts)
-        pdf_bytes = report_gen.generate_pdf_report(title, company, charts_list)
+        pdf_bytes = await run_in_pool("render", _render_report, current_cleaned_data, title, company, charts_list)
         pdf_base64 = base64.b64encode(pdf_bytes).decode()
         return {
             "message": "Report generated successfully",
             "pdf_base64": pdf_base64,
             "filename": f"{title.replace(' ', '_')}.pdf"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Report generation error: {str(e)}")
         import traceback
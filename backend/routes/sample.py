@@ -4,12 +4,12 @@ import pandas as pd
 import random
 from data_processing import DataProcessor
 from shared_state import set_current_data, set_current_cleaned_data
+from transform_plan import start_plan
 
 router = APIRouter()
 
 @router.get("/sample-data")
 async def get_sample_data():
-    global current_data, current_cleaned_data
     np.random.seed(42)
     dates = pd.date_range(start='2023-01-01', periods=100, freq='D')
     products = ['Laptop', 'Phone', 'Tablet', 'Monitor', 'Keyboard']
@@ -37,9 +37,10 @@ async def get_sample_data():
             'Customer_Satisfaction': satisfaction
         })
     df = pd.DataFrame(data)
-    set_current_data(df)
-    set_current_cleaned_data(df.copy())
-    processor = DataProcessor(df)
+    df = await set_current_data(df, "sample")
+    await set_current_cleaned_data(df.copy(deep=False))
+    start_plan(df)
+    processor = DataProcessor(df, read_only=True)
     return {
         "message": "Sample data loaded successfully",
         "basic_info": processor.get_basic_info(),
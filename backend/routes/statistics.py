@@ -9,21 +9,43 @@ from sklearn.linear_model import LinearRegression
 from sklearn.metrics import r2_score, mean_squared_error
 import json
 from typing import List, Optional, Dict, Any
-import io
+from ingest import ingest_upload
+from executor import run_in_pool
+from data_processing import frame_preview
+from shared_state import get_dataset, set_current_data, set_current_cleaned_data
+from transform_plan import start_plan
 
 router = APIRouter()
 
-# Global variable to store the main dataset
-main_dataset = None
+async def _dataset(dataset_id: Any = None, cleaned: bool = True) -> pd.DataFrame:
+    """The session's current dataset, or the one with the given id it has loaded"""
+    if isinstance(dataset_id, str) and dataset_id.isdigit():
+        dataset_id = int(dataset_id)
+    df = await get_dataset(dataset_id, cleaned)
+    if df is None:
+        detail = "No dataset loaded" if dataset_id is None else f"Dataset {dataset_id} is not loaded"
+        raise HTTPException(status_code=400, detail=detail)
+    return df
+
+async def _analysis_data(request_data: dict, columns: List[Any]) -> pd.DataFrame:
+    """The columns an analysis needs of the dataset "datasetId" (default: the current one),
+    cleaned unless "useCleaned" is false. Selecting columns does not copy their data
+    (copy-on-write), so analyses share the frames the other routers work on."""
+    df = await _dataset(request_data.get("datasetId"), bool(request_data.get("useCleaned", True)))
+    columns = list(dict.fromkeys(column for column in columns if column is not None))
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Columns not found: {', '.join(map(str, missing))}")
+    return df[columns]
 
 @router.post("/hypothesis-test")
 async def hypothesis_test(request_data: dict):
     """Run hypothesis testing (t-test, ANOVA)"""
+    data = await _analysis_data(request_data, [request_data.get("groupColumn"), request_data.get("valueColumn")])
+    return await run_in_pool("compute", _hypothesis_test, data, request_data)
+
+def _hypothesis_test(data: pd.DataFrame, request_data: dict):
     try:
-        global main_dataset
-        if main_dataset is None:
-            raise HTTPException(status_code=400, detail="No dataset loaded")
-        
         test_type = request_data.get("testType", "t-test")
         group_column = request_data.get("groupColumn")
         value_column = request_data.get("valueColumn")
@@ -31,8 +53,7 @@ async def hypothesis_test(request_data: dict):
         alternative = request_data.get("alternative", "two-sided")
         
         # Prepare data
-        df = main_dataset.copy()
-        df = df.dropna(subset=[group_column, value_column])
+        df = data.dropna(subset=[group_column, value_column])
         
         if test_type == "t-test":
             # Independent t-test
@@ -65,14 +86,14 @@ async def hypothesis_test(request_data: dict):
                 "statistics": {
                     "t_statistic": float(t_stat),
                     "p_value": float(p_value),
-                    "significant": p_value < alpha,
+                    "significant": bool(p_value < alpha),
                     "effect_size": float(cohens_d),
                     "effect_interpretation": interpret_cohens_d(cohens_d)
                 },
                 "assumptions": {
-                    "normality_group1": normality_p1 > 0.05,
-                    "normality_group2": normality_p2 > 0.05,
-                    "equal_variance": levene_p > 0.05
+                    "normality_group1": bool(normality_p1 > 0.05),
+                    "normality_group2": bool(normality_p2 > 0.05),
+                    "equal_variance": bool(levene_p > 0.05)
                 },
                 "group_stats": {
                     "group1": {
@@ -125,7 +146,7 @@ async def hypothesis_test(request_data: dict):
                 "statistics": {
                     "f_statistic": float(f_stat),
                     "p_value": float(p_value),
-                    "significant": p_value < alpha,
+                    "significant": bool(p_value < alpha),
                     "effect_size": float(eta_squared),
                     "effect_interpretation": interpret_eta_squared(eta_squared)
                 },
@@ -154,11 +175,15 @@ async def hypothesis_test(request_data: dict):
 @router.post("/multivariate")
 async def multivariate_analysis(request_data: dict):
     """Run multivariate analysis (PCA, correlation, regression)"""
+    if request_data.get("analysisType", "pca") == "regression":
+        columns = [request_data.get("targetColumn")] + list(request_data.get("independentColumns", []))
+    else:
+        columns = list(request_data.get("columns", []))
+    data = await _analysis_data(request_data, columns)
+    return await run_in_pool("compute", _multivariate_analysis, data, request_data)
+
+def _multivariate_analysis(data: pd.DataFrame, request_data: dict):
     try:
-        global main_dataset
-        if main_dataset is None:
-            raise HTTPException(status_code=400, detail="No dataset loaded")
-        
         analysis_type = request_data.get("analysisType", "pca")
         
         if analysis_type == "pca":
@@ -169,7 +194,7 @@ async def multivariate_analysis(request_data: dict):
                 raise HTTPException(status_code=400, detail="PCA requires at least 2 variables")
             
             # Prepare data
-            df = main_dataset[columns].dropna()
+            df = data[columns].dropna()
             
             # Standardize data
             scaler = StandardScaler()
@@ -211,7 +236,7 @@ async def multivariate_analysis(request_data: dict):
                 raise HTTPException(status_code=400, detail="Correlation analysis requires at least 2 variables")
             
             # Prepare data
-            df = main_dataset[columns].dropna()
+            df = data[columns].dropna()
             
             # Calculate correlation matrix
             corr_matrix = df.corr()
@@ -254,7 +279,7 @@ async def multivariate_analysis(request_data: dict):
                 raise HTTPException(status_code=400, detail="Regression requires target and independent variables")
             
             # Prepare data
-            df = main_dataset[[target_column] + independent_columns].dropna()
+            df = data[[target_column] + independent_columns].dropna()
             X = df[independent_columns]
             y = df[target_column]
             
@@ -307,11 +332,14 @@ async def multivariate_analysis(request_data: dict):
 @router.post("/bayesian")
 async def bayesian_analysis(request_data: dict):
     """Run Bayesian analysis (estimation, A/B testing)"""
+    columns = [request_data.get("column")]
+    if request_data.get("analysisType", "estimation") == "ab-test":
+        columns.append(request_data.get("groupColumn"))
+    data = await _analysis_data(request_data, columns)
+    return await run_in_pool("compute", _bayesian_analysis, data, request_data)
+
+def _bayesian_analysis(data: pd.DataFrame, request_data: dict):
     try:
-        global main_dataset
-        if main_dataset is None:
-            raise HTTPException(status_code=400, detail="No dataset loaded")
-        
         analysis_type = request_data.get("analysisType", "estimation")
         column = request_data.get("column")
         samples = request_data.get("samples", 10000)
@@ -320,7 +348,7 @@ async def bayesian_analysis(request_data: dict):
             raise HTTPException(status_code=400, detail="Please specify a column for analysis")
         
         # Prepare data
-        df = main_dataset[column].dropna()
+        df = data[column].dropna()
         
         if analysis_type == "estimation":
             # Bayesian parameter estimation (simplified)
@@ -370,7 +398,7 @@ async def bayesian_analysis(request_data: dict):
                 raise HTTPException(status_code=400, detail="A/B testing requires group column and two group values")
             
             # Prepare data
-            df = main_dataset[[column, group_column]].dropna()
+            df = data[[column, group_column]].dropna()
             group1_data = df[df[group_column] == group1][column]
             group2_data = df[df[group_column] == group2][column]
             
@@ -494,54 +522,48 @@ def calculate_correlation_pvalues(df: pd.DataFrame) -> pd.DataFrame:
     return p_values
 
 @router.post("/load-dataset")
-async def load_dataset(file: UploadFile = File(...)):
-    """Load main dataset for analysis"""
+async def load_dataset(file: UploadFile = File(...), upload_id: Optional[str] = Form(None)):
+    """Load a dataset for analysis as the session's current dataset (the one /upload and
+    /sample-data load as well), replacing it"""
     try:
-        global main_dataset
-        
-        if file.filename.endswith('.csv'):
-            content = await file.read()
-            main_dataset = pd.read_csv(io.BytesIO(content))
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            content = await file.read()
-            main_dataset = pd.read_excel(io.BytesIO(content))
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file format")
+        df = await ingest_upload(file, upload_id)
+        df = await set_current_data(df)
+        await set_current_cleaned_data(df.copy(deep=False))
+        start_plan(df)
         
         return {
             "message": "Dataset loaded successfully",
-            "rows": len(main_dataset),
-            "columns": len(main_dataset.columns),
+            "rows": len(df),
+            "columns": len(df.columns),
             "column_info": [
                 {
                     "name": col,
-                    "type": str(main_dataset[col].dtype),
-                    "missing": int(main_dataset[col].isnull().sum())
-                } for col in main_dataset.columns
+                    "type": str(df[col].dtype),
+                    "missing": int(df[col].isnull().sum())
+                } for col in df.columns
             ]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/dataset-info")
-async def get_dataset_info():
-    """Get information about loaded dataset"""
-    global main_dataset
-    
-    if main_dataset is None:
-        raise HTTPException(status_code=400, detail="No dataset loaded")
+async def get_dataset_info(dataset_id: Optional[str] = None, use_cleaned: bool = True):
+    """Get information about the current (or a loaded) dataset"""
+    df = await _dataset(dataset_id, use_cleaned)
     
     return {
-        "rows": len(main_dataset),
-        "columns": len(main_dataset.columns),
+        "rows": len(df),
+        "columns": len(df.columns),
         "column_info": [
             {
                 "name": col,
-                "type": str(main_dataset[col].dtype),
-                "missing": int(main_dataset[col].isnull().sum()),
-                "unique": int(main_dataset[col].nunique())
-            } for col in main_dataset.columns
+                "type": str(df[col].dtype),
+                "missing": int(df[col].isnull().sum()),
+                "unique": int(df[col].nunique())
+            } for col in df.columns
         ],
-        "preview": main_dataset.head(10).to_dict('records')
-    } 
\ No newline at end of file
+        "preview": frame_preview(df)
+    }
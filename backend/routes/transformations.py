@@ -0,0 +1,101 @@
+from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, List
+from pydantic import BaseModel
+from data_processing import profile_summary
+from executor import run_in_pool
+from profile_cache import remember_current
+from shared_state import edit_current_data, get_current_cleaned_data_version, get_current_data, set_current_cleaned_data
+from transform_plan import get_plan, parse_steps, record_operation, replay
+
+router = APIRouter()
+
+class TransformationsRequest(BaseModel):
+    operations: List[Dict[str, Any]]
+
+async def require_plan():
+    # Data first: in shared mode reading it takes over a newer version, and the plan with it
+    current_cleaned_data, version = await get_current_cleaned_data_version()
+    plan = get_plan()
+    if plan is None or current_cleaned_data is None:
+        raise HTTPException(status_code=404, detail="No data loaded")
+    return plan, current_cleaned_data
+
+async def _publish(df, message: str, plan, update_plan):
+    """Make df the current cleaned data, then update_plan() to describe it, and respond
+    with its summary and the plan"""
+    summary, profile = await run_in_pool("compute", profile_summary, df)
+    remember_current(await set_current_cleaned_data(df), summary, profile)
+    # Only once the data is published, so a failure leaves the plan matching the data
+    update_plan()
+    return {
+        "message": message,
+        "basic_info": summary["basic_info"],
+        "preview": summary["preview"],
+        **plan.to_dict()
+    }
+
+async def _move_to(plan, current_cleaned_data, step: int, message: str):
+    try:
+        # The original comes from the registry now, as the plan drops it while the data is spilled
+        source, operations = plan.replay_source(step, await get_current_data(), current_cleaned_data)
+        df = await run_in_pool("compute", replay, source, operations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _publish(df, message, plan, lambda: plan.move_to(step))
+
+@router.get("/transformations")
+async def get_transformations():
+    """The operations applied to the current dataset and the current position among them"""
+    plan, _ = await require_plan()
+    return plan.to_dict()
+
+async def apply_steps(steps: List[Dict[str, Any]]):
+    """Validate steps against the current data, run them as one fused replay, record them
+    in the plan and profile the result once"""
+    async with edit_current_data():
+        plan, current_cleaned_data = await require_plan()
+        if not steps:
+            raise HTTPException(status_code=400, detail="No operations given")
+        try:
+            operations = parse_steps(steps, current_cleaned_data.columns)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            df = await run_in_pool("compute", replay, current_cleaned_data, operations)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error applying transformations: {str(e)}")
+        def record():
+            for operation in operations:
+                record_operation(operation)
+        return await _publish(df, f"{len(operations)} operations applied", plan, record)
+
+@router.post("/transformations/apply")
+async def apply_transformations(request: TransformationsRequest):
+    """Apply several cleaning operations in one go; consecutive fills, conversions
+    and row filters are fused into single passes"""
+    return await apply_steps(request.operations)
+
+@router.post("/transformations/undo")
+async def undo_transformation():
+    async with edit_current_data():
+        plan, current_cleaned_data = await require_plan()
+        if plan.position == 0:
+            raise HTTPException(status_code=400, detail="Nothing to undo")
+        return await _move_to(plan, current_cleaned_data, plan.position - 1, "Undid the last operation")
+
+@router.post("/transformations/redo")
+async def redo_transformation():
+    async with edit_current_data():
+        plan, current_cleaned_data = await require_plan()
+        if plan.position >= len(plan.operations):
+            raise HTTPException(status_code=400, detail="Nothing to redo")
+        return await _move_to(plan, current_cleaned_data, plan.position + 1, "Redid the next operation")
+
+@router.post("/transformations/replay/{step}")
+async def replay_to_step(step: int):
+    """Rebuild the data as it was after the given number of operations (0 is the original)"""
+    async with edit_current_data():
+        plan, current_cleaned_data = await require_plan()
+        return await _move_to(plan, current_cleaned_data, step, f"Data rebuilt at step {step}")
@@ -1,45 +1,38 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Form
 from sqlalchemy.orm import Session
-import pandas as pd
-import io
 import json
-import pickle
+from typing import Optional
 from database import get_db, Dataset, SavedData
-from data_processing import DataProcessor
+from dataset_store import store_frame, load_frame, saved_frame_loader
+from data_processing import build_summary, profile_summary, approximate_summary, use_approximate, APPROX_PROFILE_ROWS
+from executor import run_in_pool
+from ingest import ingest_upload, get_progress
+from profile_cache import profile_cache, remember_current, remember_current_approximate, saved_profile_key
+from sketches import DatasetSketch
+from transform_plan import start_plan
+from type_inference import suggest_types, SUGGEST_TYPES_ON_UPLOAD
 from shared_state import set_current_data, set_current_cleaned_data
 
 router = APIRouter()
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    global current_data, current_cleaned_data
+async def upload_file(file: UploadFile = File(...), upload_id: Optional[str] = Form(None), db: Session = Depends(get_db)):
     try:
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No filename provided")
-        content = await file.read()
-        if not content:
-            raise HTTPException(status_code=400, detail="Empty file")
-        try:
-            if file.filename.lower().endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(content))
-            elif file.filename.lower().endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(io.BytesIO(content))
-            else:
-                raise HTTPException(status_code=400, detail=f"Unsupported file format: {file.filename}")
-        except Exception as pandas_error:
-            raise HTTPException(status_code=400, detail=f"Error reading file: {str(pandas_error)}")
-        if df.empty:
-            raise HTTPException(status_code=400, detail="File contains no data")
-        set_current_data(df)
-        set_current_cleaned_data(df.copy())
-        processor = DataProcessor(df)
-        basic_info = processor.get_basic_info()
-        column_info = processor.get_column_info()
-        preview = processor.get_preview()
+        # With approximate profiling enabled the file is sketched while it is parsed
+        sketch = DatasetSketch() if APPROX_PROFILE_ROWS > 0 else None
+        df = await ingest_upload(file, upload_id, on_chunk=sketch.update if sketch is not None else None)
+        approximate = sketch is not None and use_approximate(len(df))
+        if approximate:
+            summary, sketch = await run_in_pool("compute", approximate_summary, df, sketch)
+        else:
+            summary, profile = await run_in_pool("compute", profile_summary, df)
+        basic_info = summary["basic_info"]
+        column_info = summary["column_info"]
+        preview = summary["preview"]
         dataset = Dataset(
             name=file.filename,
             filename=file.filename,
-            file_size=int(basic_info['file_size'].replace(' KB', '').replace(' MB', '')),
+            file_size=int(float(basic_info['file_size'].split()[0])),
             rows=basic_info['rows'],
             columns=basic_info['columns'],
             data_preview=json.dumps(preview),
@@ -51,16 +44,29 @@ async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db
         saved_data = SavedData(
             dataset_id=dataset.id,
             data_type='original',
-            data_content=pickle.dumps(df)
+            **await run_in_pool("compute", store_frame, df, dataset.id, 'original')
         )
         db.add(saved_data)
         db.commit()
+        profile_cache.put(saved_profile_key(saved_data), summary)
+        # Registered once stored, so the session's copy can be evicted and read back
+        df = await set_current_data(df, dataset.id, saved_frame_loader(saved_data.id), saved_data.file_path)
+        version = await set_current_cleaned_data(df.copy(deep=False))
+        start_plan(df)
+        if approximate:
+            remember_current_approximate(version, summary, sketch)
+        else:
+            remember_current(version, summary, profile)
+        # Detected formats are cached, so converting a suggested column later skips detection
+        suggestions = await run_in_pool("compute", suggest_types, df) if SUGGEST_TYPES_ON_UPLOAD else None
         return {
             "message": "File uploaded and saved successfully",
             "dataset_id": dataset.id,
             "basic_info": basic_info,
             "column_info": column_info,
-            "preview": preview
+            "preview": preview,
+            **({"type_suggestions": suggestions} if suggestions is not None else {}),
+            **({"approximation": summary["approximation"]} if "approximation" in summary else {})
         }
     except HTTPException:
         raise
@@ -68,6 +74,14 @@ async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db
         print(f"Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
+@router.get("/upload-progress/{upload_id}")
+async def get_upload_progress(upload_id: str):
+    """Rows parsed so far for an upload started with the given upload_id"""
+    progress = get_progress(upload_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return progress.to_dict()
+
 @router.get("/saved-data")
 async def get_saved_data(db: Session = Depends(get_db)):
     try:
@@ -80,15 +94,18 @@ async def get_saved_data(db: Session = Depends(get_db)):
             SavedData.data_type == 'original'
         ).first()
         if saved_data:
-            df = pickle.loads(saved_data.data_content)
-            processor = DataProcessor(df)
+            summary = profile_cache.get(saved_profile_key(saved_data))
+            if summary is None:
+                df = await run_in_pool("compute", load_frame, saved_data)
+                summary = await run_in_pool("compute", build_summary, df)
+                profile_cache.put(saved_profile_key(saved_data), summary)
             return {
                 "message": "Saved data loaded successfully",
-                "basic_info": processor.get_basic_info(),
-                "column_info": processor.get_column_info(),
-                "preview": processor.get_preview()
+                **summary
             }
         else:
             return {"message": "No saved data available", "data": None}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading saved data: {str(e)}") 
\ No newline at end of file
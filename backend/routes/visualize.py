@@ -1,36 +1,48 @@
 from fastapi import APIRouter, HTTPException
 from typing import Optional
 from visualization import Visualizer
-from shared_state import get_current_cleaned_data
+from executor import run_in_pool
+from profile_cache import profile_cache, current_sketch_key
+from shared_state import get_current_cleaned_data, get_current_cleaned_data_version
 
 router = APIRouter()
 
+def _build_chart(df, chart_type, column, x_col, y_col, color_col, approximate=False, sketch=None):
+    visualizer = Visualizer(df, sketch)
+    if chart_type == "missing":
+        return visualizer.plot_missing_values()
+    elif chart_type == "correlation":
+        return visualizer.plot_correlation_matrix()
+    elif chart_type == "distribution" and column:
+        return visualizer.plot_distribution(column)
+    elif chart_type == "numeric_distribution" and column:
+        return visualizer.plot_numeric_distribution(column, approximate)
+    elif chart_type == "categorical_distribution" and column:
+        return visualizer.plot_categorical_distribution(column)
+    elif chart_type == "scatter" and x_col and y_col:
+        return visualizer.plot_scatter(x_col, y_col, color_col)
+    elif chart_type == "line" and x_col and y_col:
+        return visualizer.plot_line(x_col, y_col)
+    elif chart_type == "missing_heatmap":
+        return visualizer.plot_missing_heatmap()
+    return None
+
+def _build_missing_heatmap(df):
+    return Visualizer(df).plot_missing_heatmap()
+
 @router.get("/visualize/{chart_type}")
 async def create_visualization(chart_type: str, column: Optional[str] = None, 
                              x_col: Optional[str] = None, y_col: Optional[str] = None,
-                             color_col: Optional[str] = None):
-    current_cleaned_data = get_current_cleaned_data()
+                             color_col: Optional[str] = None, approximate: bool = False):
+    current_cleaned_data, version = await get_current_cleaned_data_version()
     if current_cleaned_data is None:
         raise HTTPException(status_code=404, detail="No data loaded")
     try:
-        visualizer = Visualizer(current_cleaned_data)
-        if chart_type == "missing":
-            result = visualizer.plot_missing_values()
-        elif chart_type == "correlation":
-            result = visualizer.plot_correlation_matrix()
-        elif chart_type == "distribution" and column:
-            result = visualizer.plot_distribution(column)
-        elif chart_type == "numeric_distribution" and column:
-            result = visualizer.plot_numeric_distribution(column)
-        elif chart_type == "categorical_distribution" and column:
-            result = visualizer.plot_categorical_distribution(column)
-        elif chart_type == "scatter" and x_col and y_col:
-            result = visualizer.plot_scatter(x_col, y_col, color_col)
-        elif chart_type == "line" and x_col and y_col:
-            result = visualizer.plot_line(x_col, y_col)
-        elif chart_type == "missing_heatmap":
-            result = visualizer.plot_missing_heatmap()
-        else:
+        # Reuse the sketch taken at upload or by /data-info, if this version has one
+        sketch = profile_cache.get(current_sketch_key(version)) if approximate else None
+        result = await run_in_pool("compute", _build_chart, current_cleaned_data, chart_type, column, x_col, y_col,
+                                   color_col, approximate, sketch)
+        if result is None:
             raise HTTPException(status_code=400, detail="Invalid chart type or missing parameters")
         if isinstance(result, dict) and "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
@@ -45,12 +57,11 @@ async def create_visualization(chart_type: str, column: Optional[str] = None,
 
 @router.get("/visualize/missing_heatmap")
 async def missing_heatmap():
-    current_cleaned_data = get_current_cleaned_data()
+    current_cleaned_data = await get_current_cleaned_data()
     if current_cleaned_data is None:
         raise HTTPException(status_code=404, detail="No data loaded")
     try:
-        visualizer = Visualizer(current_cleaned_data)
-        result = visualizer.plot_missing_heatmap()
+        result = await run_in_pool("compute", _build_missing_heatmap, current_cleaned_data)
         if isinstance(result, dict) and "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         return result
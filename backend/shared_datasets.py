@@ -0,0 +1,172 @@
+"""
+Datasets shared between worker processes (EAA_SHARED_DATASETS=1).
+
+With uvicorn --workers N every worker has its own memory, so data loaded
+through one worker would be missing in the others, or loaded N times. In
+shared mode every state of a session's data is written once as an Arrow IPC
+file (an upload reuses its stored file) and recorded in the shared_datasets
+table, whose row id is the data version. Each worker memory-maps the files of
+the session's latest row, so the columns are shared through the page cache
+rather than copied into every worker.
+
+Transformation plans stay in the worker that recorded them. A worker that
+takes over a version published by another one starts a plan whose only step
+is that version, so undo there goes back to the original data in one step.
+"""
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+from database import SessionLocal, SharedDataset
+from dataset_registry import DatasetEntry, VersionConflict, registry, same_columns, session_id
+from dataset_store import DATASET_DIR, read_arrow, write_arrow
+
+SHARED_DATASETS = int(os.environ.get("EAA_SHARED_DATASETS", "0"))
+SHARED_DATASET_DIR = os.environ.get("EAA_SHARED_DATASET_DIR", os.path.join(DATASET_DIR, "shared"))
+# Seconds reads keep to the version a worker last found before it checks for a newer one again
+SHARED_SYNC_SECONDS = float(os.environ.get("EAA_SHARED_SYNC_SECONDS", "1"))
+
+# Held from recording a version until the registry has it, so a concurrent request of this
+# worker does not mistake the worker's own new version for another worker's
+_publish_lock = threading.Lock()
+
+# When each session last checked for a newer version (time.monotonic())
+_synced_at: Dict[str, float] = {}
+_MAX_SYNCED_SESSIONS = 10000
+
+
+def _write(df: pd.DataFrame) -> Optional[str]:
+    """Write df to a new file in SHARED_DATASET_DIR; None if Arrow cannot represent it"""
+    os.makedirs(SHARED_DATASET_DIR, exist_ok=True)
+    path = os.path.join(SHARED_DATASET_DIR, f"{uuid.uuid4().hex}.arrow")
+    try:
+        write_arrow(df, path)
+        return path
+    except Exception as e:
+        print(f"Dataset cannot be shared between workers: {str(e)}")
+        if os.path.exists(f"{path}.tmp"):
+            os.remove(f"{path}.tmp")
+        return None
+
+
+def _parse_dataset_id(value: str) -> Hashable:
+    return int(value) if value.isdigit() else value
+
+
+def _remove_file(path: Optional[str]) -> None:
+    # Only files written here; workers that still map a removed file keep their mapping
+    if path and os.path.dirname(os.path.abspath(path)) == os.path.abspath(SHARED_DATASET_DIR) \
+            and os.path.exists(path):
+        os.remove(path)
+
+
+def map_original(df: pd.DataFrame, path: Optional[str] = None) -> Tuple[pd.DataFrame, Optional[str]]:
+    """The original data memory-mapped from its Arrow file (written unless path is given),
+    and that file; df itself if it cannot be shared"""
+    path = path or _write(df)
+    return (read_arrow(path), path) if path else (df, None)
+
+
+def publish(entry: DatasetEntry, cleaned: pd.DataFrame, expected_version: Optional[int] = None) -> int:
+    """Make cleaned (memory-mapped from a new file) the entry's cleaned data and the session's
+    current data for all workers, returning its version. If Arrow cannot represent it, the
+    other workers keep their data. With expected_version, raises VersionConflict if the
+    session's data changed since that version, also through another worker."""
+    if entry.original is not None and same_columns(entry.original, cleaned):
+        path, mapped = entry.original_path, cleaned
+    else:
+        path = _write(cleaned)
+        mapped = read_arrow(path) if path else cleaned
+    with _publish_lock:
+        latest = _latest(entry.session) if expected_version else None
+        if latest is not None and latest.id != expected_version:
+            if path != entry.original_path:
+                _remove_file(path)
+            raise VersionConflict(f"Data of session {entry.session} was changed by another worker")
+        version = _record(entry, path)
+        entry.cleaned_path = path
+        return registry.update(entry, mapped, version, expected_version)
+
+
+def _record(entry: DatasetEntry, path: Optional[str]) -> int:
+    """Insert the row of a new version, dropping the session's older rows and cleaned files"""
+    db = SessionLocal()
+    try:
+        record = SharedDataset(
+            session_id=entry.session,
+            dataset_id=str(entry.dataset_id),
+            original_path=entry.original_path,
+            cleaned_path=path
+        )
+        db.add(record)
+        db.commit()
+        stale = db.query(SharedDataset).filter(
+            SharedDataset.session_id == entry.session,
+            SharedDataset.id < record.id
+        ).all()
+        for old in stale:
+            # Originals may still back other datasets of the session, so only cleaned files go
+            if old.cleaned_path not in (old.original_path, record.cleaned_path):
+                _remove_file(old.cleaned_path)
+            db.delete(old)
+        db.commit()
+        return record.id
+    finally:
+        db.close()
+
+
+def _latest(session: str) -> Optional[SharedDataset]:
+    db = SessionLocal()
+    try:
+        return db.query(SharedDataset).filter(
+            SharedDataset.session_id == session
+        ).order_by(SharedDataset.id.desc()).first()
+    finally:
+        db.close()
+
+
+def sync_due(max_age: float = 0) -> bool:
+    """Whether sync_session(max_age) would check the shared table"""
+    return max_age <= 0 or time.monotonic() - _synced_at.get(session_id.get(), float("-inf")) >= max_age
+
+
+def sync_session(max_age: float = 0) -> None:
+    """Take over the session's current data if another worker published a newer version;
+    with max_age, only if the session last checked more than max_age seconds ago"""
+    if not sync_due(max_age):
+        return
+    session = session_id.get()
+    now = time.monotonic()
+    with _publish_lock:
+        if len(_synced_at) >= _MAX_SYNCED_SESSIONS:
+            _synced_at.clear()
+        _synced_at[session] = now
+        record = _latest(session)
+        if record is None or record.original_path is None or record.cleaned_path is None:
+            return
+        entry = registry.active(session)
+        # Up to date, or newly loaded here and about to be published
+        if entry is not None and (entry.version >= record.id or (entry.loaded and entry.cleaned is None)):
+            return
+        _adopt(session, record)
+
+
+def _adopt(session: str, record: SharedDataset) -> None:
+    # Deferred: transform_plan depends on shared_state, which depends on this module
+    from transform_plan import Operation, TransformPlan
+
+    dataset_id = _parse_dataset_id(record.dataset_id)
+    original_path = record.original_path
+    original = read_arrow(original_path)
+    cleaned = original.copy(deep=False) if record.cleaned_path == original_path else read_arrow(record.cleaned_path)
+    entry = registry.register(original, dataset_id, lambda: read_arrow(original_path), session)
+    entry.original_path, entry.cleaned_path = original_path, record.cleaned_path
+    plan = TransformPlan(original)
+    if record.cleaned_path != original_path:
+        plan.record(Operation.checkpoint("changes made in another worker", cleaned))
+    entry.plan = plan
+    registry.update(entry, cleaned, record.id)
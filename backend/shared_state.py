@@ -1,33 +1,228 @@
 """
-Shared state module for managing global data across routers
+Shared state module for managing the current dataset across routers.
+
+The current dataset is the active dataset of the requesting session in the
+dataset registry (see dataset_registry), so concurrent sessions each see only
+their own data. With EAA_SHARED_DATASETS=1 every change is also published to
+the other worker processes (see shared_datasets).
+
+Published frames are immutable: readers get their own shallow copy of the
+version they read (columns are shared under copy-on-write, so a reader that
+assigns a column changes only its copy), and a change replaces the cleaned
+frame and its version together. Requests changing a dataset do so within
+edit_current_data, which serializes changes per dataset without blocking
+readers, who keep the version they pinned.
+
+The accessors are coroutines: reading back a spilled or evicted dataset
+(which replays its transformation plan) and, with shared datasets, writing,
+publishing and syncing run in the "datasets" worker pool, so the event loop
+keeps serving other requests meanwhile.
 """
+import contextvars
+import uuid
 import pandas as pd
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Optional, Tuple
+from fastapi import HTTPException
+from executor import run_in_pool
+from dataset_registry import DatasetEntry, VersionConflict, registry
+from dataset_store import read_arrow
+from profile_cache import profile_cache, current_profile_key, remember_current
+from shared_datasets import SHARED_DATASETS, SHARED_SYNC_SECONDS, map_original, publish, sync_due, sync_session
+
+# Together with the data version (unique across sessions) the per-process epoch
+# identifies one state of the data (e.g. for ETags and profile caching); with shared
+# datasets the version is a row id of the shared table, the same in every worker
+DATA_EPOCH = uuid.uuid4().hex[:12]
+
+# Dataset id of data that is not stored in the database (e.g. the sample data)
+UNSAVED_DATASET = "unsaved"
+
+class _Edit:
+    """A change in progress: the dataset being changed and the version it is based on"""
+
+    def __init__(self, entry: DatasetEntry, version: int):
+        self.entry = entry
+        self.version = version
+
+# Change the current request makes, if it is within edit_current_data
+_editing: contextvars.ContextVar[Optional[_Edit]] = contextvars.ContextVar("editing", default=None)
+
+async def _active_entry():
+    edit = _editing.get()
+    if edit is not None:
+        return edit.entry
+    # Reads query the shared table at most every SHARED_SYNC_SECONDS, edits always check
+    await _sync(SHARED_SYNC_SECONDS)
+    return registry.active()
+
+async def _sync(max_age: float = 0) -> None:
+    """sync_session in the datasets pool, when datasets are shared and a check is due"""
+    if SHARED_DATASETS and sync_due(max_age):
+        await run_in_pool("datasets", sync_session, max_age)
+
+def _pin(df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    return df.copy(deep=False) if df is not None else None
 
-# Global data storage
-current_data: Optional[pd.DataFrame] = None
-current_cleaned_data: Optional[pd.DataFrame] = None
+async def _on_entry(fn: Callable, entry: DatasetEntry, *args):
+    """fn(entry, *args), a registry method that reads the entry back if it is not loaded:
+    then (it blocks for the reload and replay) in the datasets pool"""
+    if entry.loaded:
+        return fn(entry, *args)
+    return await run_in_pool("datasets", fn, entry, *args)
 
-def set_current_data(df: pd.DataFrame) -> None:
-    """Set the current main dataset"""
-    global current_data
-    current_data = df
+async def _snapshot(entry: DatasetEntry) -> Tuple[pd.DataFrame, Optional[pd.DataFrame], int]:
+    return await _on_entry(registry.snapshot, entry)
 
-def get_current_data() -> Optional[pd.DataFrame]:
+async def set_current_data(df: pd.DataFrame, dataset_id: Hashable = UNSAVED_DATASET,
+                     loader: Optional[Callable[[], pd.DataFrame]] = None,
+                     path: Optional[str] = None) -> pd.DataFrame:
+    """Load a new main dataset into the session and make it the current one; loader reads
+    it back from storage, which allows the registry to evict it.
+
+    Returns the frame as registered, which callers should use from then on: when datasets
+    are shared between workers, df memory-mapped from its Arrow file path (written if not given).
+    """
+    original_path = None
+    if SHARED_DATASETS:
+        df, original_path = await run_in_pool("datasets", map_original, df, path)
+        if loader is None and original_path:
+            loader = lambda: read_arrow(original_path)
+    entry = registry.register(df, dataset_id, loader)
+    entry.original_path = original_path
+    return df
+
+async def get_current_data() -> Optional[pd.DataFrame]:
     """Get the current main dataset"""
-    return current_data
+    entry = await _active_entry()
+    return _pin((await _snapshot(entry))[0]) if entry is not None else None
+
+async def set_current_cleaned_data(df: pd.DataFrame) -> int:
+    """Set the current cleaned dataset, returning its new version. Within edit_current_data
+    it replaces the version the edit started from, in the dataset being edited."""
+    edit = _editing.get()
+    entry = edit.entry if edit is not None else registry.active()
+    if entry is None:
+        await set_current_data(df)
+        entry = registry.active()
+    expected_version = edit.version if edit is not None else None
+    try:
+        if SHARED_DATASETS:
+            version = await run_in_pool("datasets", publish, entry, df, expected_version)
+        else:
+            version = await _on_entry(registry.update, entry, df, None, expected_version)
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=f"The data was changed meanwhile, try again ({str(e)})")
+    if edit is not None:
+        edit.version = version
+    return version
 
-def set_current_cleaned_data(df: pd.DataFrame) -> None:
-    """Set the current cleaned dataset"""
-    global current_cleaned_data
-    current_cleaned_data = df
+@asynccontextmanager
+async def edit_current_data() -> AsyncIterator[Tuple[Optional[pd.DataFrame], int]]:
+    """Change the current dataset: yields its cleaned data and version (None, 0 without data)
+    while holding the dataset's write lock, so changes to a dataset apply one after another,
+    each to the result of the previous one. Inside, the shared_state functions keep
+    to this dataset even if the session switches to another one meanwhile."""
+    while True:
+        entry = await _active_entry()
+        if entry is None:
+            yield None, 0
+            return
+        await entry.write_lock.acquire()
+        # Replaced while waiting (reloaded, or taken over from another worker): edit the replacement
+        await _sync()
+        if registry.get(entry.dataset_id, entry.session) is entry:
+            break
+        entry.write_lock.release()
+    try:
+        _, cleaned, version = await _snapshot(entry)
+        token = _editing.set(_Edit(entry, version))
+        try:
+            yield _pin(cleaned), version
+        finally:
+            _editing.reset(token)
+    finally:
+        entry.write_lock.release()
 
-def get_current_cleaned_data() -> Optional[pd.DataFrame]:
+async def get_current_cleaned_data() -> Optional[pd.DataFrame]:
     """Get the current cleaned dataset"""
-    return current_cleaned_data
+    return (await get_current_cleaned_data_version())[0]
+
+async def get_current_cleaned_data_version() -> Tuple[Optional[pd.DataFrame], int]:
+    """The current cleaned dataset together with its version"""
+    entry = await _active_entry()
+    if entry is None:
+        return None, 0
+    _, cleaned, version = await _snapshot(entry)
+    return _pin(cleaned), version
+
+async def get_current_shape() -> Tuple[Optional[int], int]:
+    """Row count (None without data) and version of the current cleaned data, without
+    reading it back if it is spilled or evicted"""
+    entry = await _active_entry()
+    if entry is None or entry.version == 0:
+        return None, 0
+    return entry.rows, entry.version
+
+def get_current_profile(version: int) -> Optional[Dict[str, Any]]:
+    """Cached profile summary of a version of the current data, including the one a
+    spilled dataset keeps"""
+    summary = profile_cache.get(current_profile_key(version))
+    if summary is None:
+        entry = registry.active()
+        if entry is not None and entry.version == version and entry.profile is not None:
+            summary = entry.profile
+            remember_current(version, summary)
+    return summary
+
+async def get_dataset(dataset_id: Optional[Hashable] = None, cleaned: bool = True) -> Optional[pd.DataFrame]:
+    """A dataset the session has loaded (the current one without an id), cleaned or as
+    originally loaded; None if the session has not loaded it"""
+    if dataset_id is None:
+        entry = await _active_entry()
+    else:
+        await _sync(SHARED_SYNC_SECONDS)
+        entry = registry.get(dataset_id)
+    if entry is None:
+        return None
+    original, current, _ = await _snapshot(entry)
+    return _pin(current if cleaned and current is not None else original)
+
+def get_current_plan():
+    """Transformation plan of the current dataset (the one being edited, else the session's
+    active one as the last read found it), if one is kept"""
+    edit = _editing.get()
+    entry = edit.entry if edit is not None else registry.active()
+    return entry.plan if entry is not None else None
+
+def set_current_plan(plan) -> None:
+    edit = _editing.get()
+    entry = edit.entry if edit is not None else registry.active()
+    if entry is not None:
+        entry.plan = plan
+
+async def activate_data(dataset_id: Hashable) -> bool:
+    """Make a dataset the session loaded before its current one again; False if it has none"""
+    entry = registry.activate(dataset_id)
+    if entry is None:
+        return False
+    if SHARED_DATASETS:
+        # Published again so the other workers switch as well
+        cleaned = (await _snapshot(entry))[1]
+        if cleaned is not None:
+            await set_current_cleaned_data(cleaned)
+    return True
+
+def data_etag(version: int, variant: str = "") -> str:
+    """ETag for a version of the current data, unique across server restarts (shared versions
+    are row ids of the shared table, which keeps growing); representations
+    of the same version that differ (e.g. approximate profiles) pass a variant"""
+    suffix = f"-{variant}" if variant else ""
+    if SHARED_DATASETS:
+        # Any worker serving the version gives the same ETag
+        return f'"shared-{version}{suffix}"'
+    return f'"{DATA_EPOCH}-{version}{suffix}"'
 
 def clear_data() -> None:
-    """Clear all stored data"""
-    global current_data, current_cleaned_data
-    current_data = None
-    current_cleaned_data = None 
\ No newline at end of file
+    """Clear the session's current data"""
+    registry.remove()
@@ -0,0 +1,304 @@
+"""
+Mergeable sketches for approximate profiling of large datasets.
+
+HyperLogLog estimates distinct counts, a KLL sketch estimates quantiles and
+Misra-Gries keeps the heavy hitters for the top value. Every sketch can be fed
+chunk by chunk and merged with another sketch of the same kind, so a dataset can
+be sketched while it is being parsed. Missing counts, mean, std, min and max
+are still exact, since they are cheap running totals.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from profiling import is_numeric_profile
+
+HLL_PRECISION = 14
+KLL_K = 200
+HEAVY_HITTERS = 64
+
+
+def _hash_values(values: np.ndarray) -> np.ndarray:
+    """64-bit hashes of non-null values; numbers hash by value, so 1 and 1.0 collide as in nunique()"""
+    if values.dtype.kind in "iuf":
+        values = values.astype(np.float64, copy=False)
+    elif values.dtype.kind in "mM":
+        values = values.view(np.int64)
+    elif values.dtype != object:
+        values = values.astype(object)
+    return pd.util.hash_array(values, categorize=False)
+
+
+class HyperLogLog:
+    """Distinct count estimate with relative standard error 1.04 / sqrt(2 ** precision)"""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values: np.ndarray) -> None:
+        """Add non-null values (duplicates cost nothing, so distinct values suffice)"""
+        if len(values) == 0:
+            return
+        hashes = _hash_values(values)
+        tail_bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(tail_bits)).astype(np.int64)
+        tail = (hashes & np.uint64((1 << tail_bits) - 1)).astype(np.float64)
+        # Position of the leading one bit in the tail; frexp gives the bit length (0 for 0)
+        _, bit_length = np.frexp(tail)
+        rank = (tail_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is far more accurate for small cardinalities
+            raw = m * np.log(m / zeros)
+        return int(round(raw))
+
+    def relative_error(self) -> float:
+        return float(1.04 / np.sqrt(len(self.registers)))
+
+
+class KLLSketch:
+    """Quantile estimate whose rank error is about 2.296 / k ** 0.9723 of the count"""
+
+    def __init__(self, k: int = KLL_K, seed: Optional[int] = None):
+        self.k = k
+        self.count = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind so the total weight is preserved
+                keep = items[len(items) - len(items) % 2:]
+                promoted = items[self._rng.integers(2):len(items) - len(items) % 2:2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+
+    def quantiles(self, qs) -> List[Optional[float]]:
+        items = np.concatenate(self.levels)
+        if len(items) == 0:
+            return [None for _ in qs]
+        weights = np.concatenate([np.full(len(items), 1 << level, dtype=np.int64)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(qs, dtype=float) * cumulative[-1], side="left")
+        return [float(items[min(pos, len(items) - 1)]) for pos in positions]
+
+    def rank_error(self) -> float:
+        return 2.296 / self.k ** 0.9723
+
+
+class MisraGries:
+    """Heavy hitters; each reported count undercounts the true one by at most n / (k + 1)"""
+
+    def __init__(self, k: int = HEAVY_HITTERS):
+        self.k = k
+        self.count = 0
+        self.counters: Dict[Any, int] = {}
+
+    def _prune(self, counters: Dict[Any, int]) -> Dict[Any, int]:
+        if len(counters) <= self.k:
+            return counters
+        cut = sorted(counters.values(), reverse=True)[self.k]
+        return {value: count - cut for value, count in counters.items() if count > cut}
+
+    def update(self, values: pd.Index, counts: np.ndarray) -> None:
+        """Add a chunk given as its distinct values and their counts"""
+        if len(values) == 0:
+            return
+        self.count += int(counts.sum())
+        if len(values) > self.k:
+            # Summarize the chunk on its own first, which keeps the merge small
+            order = np.argsort(counts, kind="stable")[::-1]
+            cut = counts[order[self.k]]
+            kept = order[:self.k][counts[order[:self.k]] > cut]
+            values, counts = values[kept], counts[kept] - cut
+        merged = dict(self.counters)
+        for value, count in zip(values, counts.tolist()):
+            merged[value] = merged.get(value, 0) + count
+        self.counters = self._prune(merged)
+
+    def merge(self, other: "MisraGries") -> None:
+        merged = dict(self.counters)
+        for value, count in other.counters.items():
+            merged[value] = merged.get(value, 0) + count
+        self.count += other.count
+        self.counters = self._prune(merged)
+
+    def top(self) -> Optional[Any]:
+        if not self.counters:
+            return None
+        return max(self.counters.items(), key=lambda item: item[1])[0]
+
+    def count_error(self) -> int:
+        return int(self.count // (self.k + 1))
+
+
+class ColumnSketch:
+    """Exact missing count and moments plus the three sketches for one column"""
+
+    def __init__(self):
+        self.rows = 0
+        self.missing = 0
+        self.numeric_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.distinct = HyperLogLog()
+        self.quantile_sketch = KLLSketch()
+        self.heavy_hitters = MisraGries()
+
+    def _add_moments(self, count: int, mean: float, m2: float) -> None:
+        # Chan et al.'s pairwise combination of mean and sum of squares
+        total = self.numeric_count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta * delta * self.numeric_count * count / total
+        self.mean += delta * count / total
+        self.numeric_count = total
+
+    def update(self, series: pd.Series) -> None:
+        present = series.dropna()
+        self.rows += len(series)
+        self.missing += len(series) - len(present)
+        if len(present) == 0:
+            return
+        # One factorization feeds the heavy hitters, and the distinct count only hashes the uniques
+        codes, uniques = pd.factorize(present)
+        self.distinct.update(np.asarray(uniques))
+        self.heavy_hitters.update(uniques, np.bincount(codes, minlength=len(uniques)))
+        if pd.api.types.is_numeric_dtype(present.dtype) and not pd.api.types.is_bool_dtype(present.dtype):
+            values = present.to_numpy(dtype=np.float64)
+            self.quantile_sketch.update(values)
+            chunk_mean = float(values.mean())
+            self._add_moments(len(values), chunk_mean, float(((values - chunk_mean) ** 2).sum()))
+            low, high = float(values.min()), float(values.max())
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+
+    def merge(self, other: "ColumnSketch") -> None:
+        self.rows += other.rows
+        self.missing += other.missing
+        if other.numeric_count:
+            self._add_moments(other.numeric_count, other.mean, other.m2)
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self.distinct.merge(other.distinct)
+        self.quantile_sketch.merge(other.quantile_sketch)
+        self.heavy_hitters.merge(other.heavy_hitters)
+
+    def quantiles(self, qs) -> List[Optional[float]]:
+        return self.quantile_sketch.quantiles(qs)
+
+    def info(self, name: Any, dtype) -> Dict[str, Any]:
+        """Same shape as a profile_columns entry, with approximate unique_count/top_value"""
+        col_info = {
+            'name': name,
+            'dtype': str(dtype),
+            'missing_count': int(self.missing),
+            'unique_count': min(self.distinct.estimate(), self.rows - self.missing)
+        }
+        if is_numeric_profile(str(dtype)):
+            std = np.sqrt(self.m2 / (self.numeric_count - 1)) if self.numeric_count > 1 else None
+            col_info.update({
+                'mean': float(self.mean) if self.numeric_count else None,
+                'std': float(std) if std is not None else None,
+                'min': self.min,
+                'max': self.max
+            })
+        else:
+            top = self.heavy_hitters.top()
+            col_info['top_value'] = None if top is None else str(top)
+        return col_info
+
+
+class DatasetSketch:
+    """A ColumnSketch per column, fed chunk by chunk (e.g. from ingest_upload's on_chunk)"""
+
+    def __init__(self):
+        self.names: List[Any] = []
+        self.columns: List[ColumnSketch] = []
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        if not self.columns:
+            self.names = list(chunk.columns)
+            self.columns = [ColumnSketch() for _ in self.names]
+        elif list(chunk.columns) != self.names:
+            raise ValueError("Chunk columns do not match the sketched columns")
+        for i, column in enumerate(self.columns):
+            column.update(chunk.iloc[:, i])
+
+    def merge(self, other: "DatasetSketch") -> None:
+        if not self.columns:
+            self.names, self.columns = list(other.names), [ColumnSketch() for _ in other.names]
+        elif other.names != self.names:
+            raise ValueError("Cannot merge sketches of different columns")
+        for column, other_column in zip(self.columns, other.columns):
+            column.merge(other_column)
+
+    def column(self, name: Any) -> Optional[ColumnSketch]:
+        for column_name, column in zip(self.names, self.columns):
+            if column_name == name:
+                return column
+        return None
+
+    def column_info(self, dtypes: pd.Series) -> List[Dict[str, Any]]:
+        """Column info for the frame the chunks add up to; dtypes are that frame's"""
+        return [column.info(name, dtype) for name, column, dtype in zip(self.names, self.columns, dtypes)]
+
+    def error_bounds(self) -> Dict[str, Any]:
+        """Declared errors: one standard error for distinct counts, worst cases for the others"""
+        return {
+            'unique_count_relative_error': max((c.distinct.relative_error() for c in self.columns), default=0.0),
+            'top_value_count_error': max((c.heavy_hitters.count_error() for c in self.columns), default=0),
+            'quantile_rank_error': max((c.quantile_sketch.rank_error() for c in self.columns), default=0.0)
+        }
+
+
+def sketch_frame(df: pd.DataFrame, chunk_rows: int = 100_000) -> DatasetSketch:
+    """Sketch an in-memory frame in chunks of chunk_rows rows"""
+    sketch = DatasetSketch()
+    if df.shape[1] == 0:
+        return sketch
+    for start in range(0, max(len(df), 1), chunk_rows):
+        sketch.update(df.iloc[start:start + chunk_rows])
+    return sketch
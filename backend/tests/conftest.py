@@ -0,0 +1,32 @@
+"""
+Test setup: the backend modules are imported the way main.py runs them (from the backend
+directory), with the database and dataset files in a temporary directory
+"""
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Set before the backend modules read them at import
+_data_dir = tempfile.mkdtemp(prefix="eaa_tests_")
+os.environ.setdefault("EAA_DATASET_DIR", os.path.join(_data_dir, "dataset_files"))
+os.environ.setdefault("EAA_DATASET_SPILL_DIR", os.path.join(_data_dir, "spill"))
+os.chdir(_data_dir)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_data_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    """A client of the app with a session of its own"""
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app, headers={"X-Session-Id": uuid.uuid4().hex})
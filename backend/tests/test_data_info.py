@@ -0,0 +1,21 @@
+import pytest
+
+import routes.data_info
+
+
+@pytest.mark.parametrize("approximate", [False, True])
+def test_profile_computed_after_a_change_carries_the_etag_of_its_own_version(client, monkeypatch, approximate):
+    assert client.get("/sample-data").status_code == 200
+    expected = client.get("/data-info", params={"approximate": approximate})
+    get_current_shape = routes.data_info.get_current_shape
+
+    async def stale_shape():
+        # As if the data changed right after its shape was read
+        rows, version = await get_current_shape()
+        return rows, version - 1
+
+    monkeypatch.setattr(routes.data_info, "get_current_shape", stale_shape)
+    response = client.get("/data-info", params={"approximate": approximate})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == expected.headers["ETag"]
+    assert response.json() == expected.json()
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pandas as pd
+
+from dataset_registry import DatasetRegistry, frames_memory, registry
+from transform_plan import Operation, TransformPlan
+
+
+def test_sessions_keep_their_own_datasets_and_the_least_recently_used_goes_first():
+    local = DatasetRegistry(1, 10)
+    df = pd.DataFrame({"a": range(100)})
+    first = local.register(df, "same-id", lambda: df, session="one")
+    second = local.register(df.assign(a=-1), "same-id", lambda: df, session="two")
+    assert local.active("one") is first and local.active("two") is second
+    # Over the budget, only the most recently used dataset stays in memory
+    assert not first.loaded and second.loaded
+
+    assert local.get("same-id", "one") is first
+    original, _, _ = local.snapshot(first)
+    assert original["a"].tolist() == list(range(100))
+    assert first.loaded and not second.loaded
+    local.close()
+
+
+def test_undo_and_redo_after_the_dataset_was_spilled(client):
+    original = client.get("/sample-data").json()["basic_info"]
+    applied = client.post("/transformations/apply", json={"operations": [{"type": "clean", "method": "drop"}]})
+    assert applied.status_code == 200
+    cleaned_rows = applied.json()["basic_info"]["rows"]
+    assert cleaned_rows < original["rows"]
+
+    registry.spill_idle(0)
+    entry = registry.get("sample", client.headers["X-Session-Id"])
+    assert entry.spilled and not entry.loaded
+    assert entry.plan.base is None
+    # Served from the profile kept with the spill, without reading the data back
+    assert client.get("/data-info").json()["basic_info"]["rows"] == cleaned_rows
+    assert entry.spilled
+
+    undone = client.post("/transformations/undo")
+    assert undone.status_code == 200
+    assert undone.json()["basic_info"] == original
+    assert entry.loaded
+
+    registry.spill_idle(0)
+    redone = client.post("/transformations/redo")
+    assert redone.status_code == 200
+    assert redone.json()["basic_info"]["rows"] == cleaned_rows
+    assert registry.stats()["rehydrations"] >= 2
+
+
+def test_spilled_dataset_still_counts_the_columns_its_plan_keeps():
+    local = DatasetRegistry(0, 10)
+    df = pd.DataFrame({"a": range(1000), "b": [float(i) for i in range(1000)]})
+    entry = local.register(df, "plan-memory", session="plan-memory")
+    entry.plan = TransformPlan(df)
+    with_result = df.assign(r=df["a"] * 3)
+    local.update(entry, with_result)
+    entry.plan.record(Operation.added_columns("formula into r", with_result, ["r"]))
+    # A later change replaces the column the formula added
+    local.update(entry, with_result.assign(r=0))
+
+    local.spill_idle(0)
+    assert entry.spilled
+    assert entry.memory_bytes == frames_memory(entry.plan.frames()[0]) > 0
+    local.close()
+
+
+def test_spill_files_are_written_by_the_sweeper_without_the_entry_lock(monkeypatch):
+    local = DatasetRegistry(1, 10)
+    entries, writes = [], []
+    write_spill = local._write_spill
+
+    def record_write(df, path):
+        writes.append((threading.current_thread().name, [e.lock.locked() for e in entries]))
+        write_spill(df, path)
+
+    monkeypatch.setattr(local, "_write_spill", record_write)
+    local.start_sweeper()
+    try:
+        for dataset_id in ("first", "second"):
+            entries.append(local.register(pd.DataFrame({"a": range(100)}), dataset_id, session="budget"))
+        deadline = time.time() + 5
+        while not entries[0].spilled and time.time() < deadline:
+            time.sleep(0.01)
+        assert entries[0].spilled
+        assert entries[1].loaded
+        assert writes and all(name == "eaa-spill" and not any(locked) for name, locked in writes)
+    finally:
+        local.close()
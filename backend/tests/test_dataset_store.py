@@ -0,0 +1,92 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import inspect
+
+import database
+from database import Migration, SavedData, SessionLocal
+from dataset_store import (ARROW_MIGRATION, STORAGE_ARROW, STORAGE_PICKLE, frame_columns, load_frame,
+                           migrate_pickled_rows, store_frame)
+from lookup_cache import prepared_lookup
+
+
+def _saved(df: pd.DataFrame, row_id: int) -> SavedData:
+    return SavedData(id=row_id, dataset_id=row_id, data_type="lookup", **store_frame(df, row_id, "lookup"))
+
+
+def test_pickled_frame_with_numeric_header_loads_by_schema_names():
+    saved = _saved(pd.DataFrame({2020: ["a", "b"], "Price": [1.5, 2.5]}), 9001)
+    assert saved.storage_format == STORAGE_PICKLE
+    columns = frame_columns(saved)
+    assert columns == ["2020", "Price"]
+
+    projected = load_frame(saved, columns)
+    assert list(projected.columns) == columns
+    assert projected["2020"].tolist() == ["a", "b"]
+
+
+def test_lookup_table_with_numeric_first_header():
+    saved = _saved(pd.DataFrame({2020: ["a", "b"], "Price": [1.5, 2.5]}), 9002)
+    key_column = frame_columns(saved)[0]
+    prepared = prepared_lookup(saved, key_column, "Price")
+    assert prepared.keys.tolist() == ["a", "b"]
+    np.testing.assert_array_equal(prepared.values, [1.5, 2.5])
+
+
+@pytest.fixture
+def db():
+    database.create_tables()
+    session = SessionLocal()
+    # As on a database the migration has not run on yet
+    session.query(Migration).filter(Migration.name == ARROW_MIGRATION).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_pickled_rows_are_migrated_by_the_first_worker_only(db):
+    legacy = SavedData(dataset_id=9003, data_type="cleaned", data_content=pickle.dumps(pd.DataFrame({"a": [1, 2]})))
+    db.add(legacy)
+    db.commit()
+
+    assert migrate_pickled_rows(db) == 1
+    db.refresh(legacy)
+    assert legacy.storage_format == STORAGE_ARROW
+    assert load_frame(legacy)["a"].tolist() == [1, 2]
+
+    # Another worker starting later finds the migration claimed
+    legacy.storage_format = None
+    db.commit()
+    assert migrate_pickled_rows(db) == 0
+    db.refresh(legacy)
+    assert legacy.storage_format is None
+
+
+def test_failed_migration_is_retried_on_the_next_start(db, monkeypatch):
+    def fail(db):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr("dataset_store._migrate_pickled_rows", fail)
+    with pytest.raises(RuntimeError):
+        migrate_pickled_rows(db)
+    assert db.query(Migration).filter(Migration.name == ARROW_MIGRATION).first() is None
+
+
+def test_columns_added_meanwhile_by_another_worker_are_not_added_again(db, monkeypatch):
+    real_inspect = inspect
+
+    class Stale:
+        """The columns as seen before another worker added storage_format"""
+        def __init__(self, engine):
+            self.inspector = real_inspect(engine)
+
+        def get_columns(self, table_name):
+            columns = self.inspector.get_columns(table_name)
+            return [col for col in columns if not (table_name == "saved_data" and col["name"] == "storage_format")]
+
+    views = iter([Stale])
+    monkeypatch.setattr(database, "inspect", lambda engine: next(views, real_inspect)(engine))
+    database._add_missing_columns()
+    assert "storage_format" in {col["name"] for col in real_inspect(database.engine).get_columns("saved_data")}
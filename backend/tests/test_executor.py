@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from executor import WorkerPool
+
+
+def _square(value: int) -> int:
+    return value * value
+
+
+def _not_found(name: str) -> None:
+    raise HTTPException(status_code=404, detail=f"{name} not found")
+
+
+class _Unpicklable(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _fail_unpicklable() -> None:
+    raise _Unpicklable(7, "broken")
+
+
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_pool_runs_work_and_raises_http_errors(kind):
+    pool = WorkerPool("test", kind=kind, max_workers=1, max_queue=4)
+    try:
+        assert asyncio.run(pool.run(_square, 7)) == 49
+        with pytest.raises(HTTPException) as raised:
+            asyncio.run(pool.run(_not_found, "Column 'x'"))
+        assert raised.value.status_code == 404
+        assert raised.value.detail == "Column 'x' not found"
+        assert pool.metrics()["failed"] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_process_pool_errors_that_do_not_pickle_arrive_as_runtime_errors():
+    pool = WorkerPool("test", kind="process", max_workers=1, max_queue=4)
+    try:
+        with pytest.raises(RuntimeError, match="_Unpicklable: broken"):
+            asyncio.run(pool.run(_fail_unpicklable))
+    finally:
+        pool.shutdown()
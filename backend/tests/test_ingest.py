@@ -0,0 +1,48 @@
+import asyncio
+
+import pandas as pd
+import pandas.testing as tm
+import pytest
+
+import executor
+import ingest
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(ingest, "CSV_CHUNK_ROWS", 3)
+
+
+@pytest.mark.parametrize("text", [
+    # Numbers in the first chunk, a word in the second
+    "a,b\n1,x\n2,y\n3,z\nfoo,w\n5,v\n,u\n",
+    # Integers, then floats
+    "a,b\n1,2\n2,3\n3,4\n4.5,5\n,6\n7,7\n",
+    # A chunk with only empty values
+    "a,b,c\n1,x,True\n2,y,False\n3,z,True\n,,\n,,\n,,\n4,w,False\n",
+    # Booleans, then text
+    "a,b\nTrue,1\nFalse,2\nTrue,3\nyes,4\n",
+])
+def test_chunked_csv_matches_single_read(tmp_path, small_chunks, text):
+    path = tmp_path / "data.csv"
+    path.write_text(text)
+    chunks = []
+    df = ingest.read_tabular(str(path), "data.csv", on_chunk=chunks.append)
+    assert len(chunks) > 1
+    tm.assert_frame_equal(df, pd.read_csv(path))
+
+
+def test_parsing_in_a_process_pool_still_reports_progress_and_chunks(tmp_path, monkeypatch):
+    pool = executor.WorkerPool("compute", "process", max_workers=1)
+    monkeypatch.setitem(executor._pools, "compute", pool)
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,x\n2,y\n3,z\n")
+    progress = ingest.IngestProgress("upload", "data.csv")
+    chunks = []
+    try:
+        df = asyncio.run(ingest._parse_in_pool(str(path), "data.csv", progress, chunks.append))
+    finally:
+        pool.shutdown()
+    tm.assert_frame_equal(df, pd.read_csv(path))
+    assert progress.rows_parsed == 3
+    assert [len(chunk) for chunk in chunks] == [3]
@@ -0,0 +1,20 @@
+import pickle
+
+import numpy as np
+
+from lookup_cache import LookupCache
+
+
+def test_prepared_lookup_pickles_without_the_cache():
+    cache = LookupCache(1024 * 1024)
+    keys, values = np.array(["a", "b", "c"], dtype=object), np.array([1.0, 2.0, 3.0])
+    prepared = cache.get(1, "Price", "v1", lambda: (keys, values))
+    prepared.hash_index()
+
+    copy = pickle.loads(pickle.dumps(prepared))
+    assert copy._on_grow is None
+    assert copy.hash_index().get_loc("b") == 1
+    assert copy.sorted_lookup().keys.tolist() == ["a", "b", "c"]
+    # The cache still tracks its own entry
+    assert prepared._on_grow is not None
+    assert cache.get(1, "Price", "v1", lambda: (keys, values)) is prepared
@@ -0,0 +1,171 @@
+"""
+The vectorized lookups against per-row references written like the formula endpoints'
+original implementations, over random tables with ties, duplicate and missing keys
+and values no key matches
+"""
+from fnmatch import fnmatchcase
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lookup_engine import SortedLookup, SubstringIndex, multi_key_match, unique_keys
+
+NOT_FOUND = "NF"
+
+
+def _lookup_dict(keys: pd.Series, values: pd.Series) -> dict:
+    """dict(zip(keys, values)) without the missing keys, which never match"""
+    return {key: value for key, value in zip(keys, values) if not pd.isna(key)}
+
+
+def _numeric_table(rng) -> pd.DataFrame:
+    # Even keys, so odd lookup values lie exactly halfway between two of them
+    keys = rng.integers(0, 20, 30).astype(float) * 2
+    keys[rng.random(30) < 0.15] = np.nan
+    return pd.DataFrame({"key": keys, "value": [f"v{i}" for i in range(30)]})
+
+
+def _numeric_lookups(rng) -> pd.Series:
+    values = rng.integers(-5, 45, 200).astype(float)
+    values[::9] += 0.25
+    values[rng.random(200) < 0.1] = np.nan
+    return pd.Series(values, index=rng.permutation(200))
+
+
+def _reference_nearest(lookup: dict, value):
+    if pd.isna(value):
+        return NOT_FOUND
+    if value in lookup:
+        return lookup[value]
+    ordered = sorted(lookup)
+    if not ordered:
+        return NOT_FOUND
+    for i, key in enumerate(ordered):
+        if value <= key:
+            if i == 0:
+                return lookup[key]
+            previous = ordered[i - 1]
+            return lookup[previous] if abs(value - previous) <= abs(value - key) else lookup[key]
+    return lookup[ordered[-1]]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_nearest_matches_the_per_row_approximate_vlookup(seed):
+    rng = np.random.default_rng(seed)
+    table, lookups = _numeric_table(rng), _numeric_lookups(rng)
+    lookup = SortedLookup(*unique_keys(table["key"], table["value"]))
+
+    result = lookup.nearest(lookups, NOT_FOUND)
+    reference = _lookup_dict(table["key"], table["value"])
+    assert result.index.equals(lookups.index)
+    assert result.tolist() == [_reference_nearest(reference, value) for value in lookups]
+
+
+def test_nearest_without_keys_is_not_found():
+    lookup = SortedLookup(*unique_keys(pd.Series([np.nan]), pd.Series(["v"])))
+    assert lookup.nearest(pd.Series([1.0, np.nan]), NOT_FOUND).tolist() == [NOT_FOUND, NOT_FOUND]
+
+
+def _reference_as_of(lookup: dict, value, forwards: bool):
+    if pd.isna(value):
+        return NOT_FOUND
+    if value in lookup:
+        return lookup[value]
+    for key in sorted(lookup, reverse=not forwards):
+        if (key >= value) if forwards else (key <= value):
+            return lookup[key]
+    return NOT_FOUND
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("forwards", [True, False])
+def test_as_of_modes_match_the_per_row_xlookup(seed, forwards):
+    rng = np.random.default_rng(seed)
+    table, lookups = _numeric_table(rng), _numeric_lookups(rng)
+    lookup = SortedLookup(*unique_keys(table["key"], table["value"]))
+
+    if forwards:
+        result = lookup.exact_or_next(lookups, NOT_FOUND)
+    else:
+        result = lookup.exact_or_previous(lookups, NOT_FOUND)
+    reference = _lookup_dict(table["key"], table["value"])
+    assert result.index.equals(lookups.index)
+    assert result.tolist() == [_reference_as_of(reference, value, forwards) for value in lookups]
+
+
+def _text(rng, alphabet: str, shortest: int, longest: int) -> str:
+    return "".join(rng.choice(list(alphabet), rng.integers(shortest, longest + 1)))
+
+
+def _reference_wildcard(lookup: dict, value):
+    if pd.isna(value):
+        return NOT_FOUND
+    if value in lookup:
+        return lookup[value]
+    for key, found in lookup.items():
+        if str(value).lower() in str(key).lower() or str(key).lower() in str(value).lower():
+            return found
+    return NOT_FOUND
+
+
+def _reference_pattern(lookup: dict, pattern):
+    if pd.isna(pattern):
+        return NOT_FOUND
+    return next((found for key, found in lookup.items() if fnmatchcase(str(key).lower(), pattern.lower())), NOT_FOUND)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("pattern", [False, True])
+def test_substring_index_matches_the_per_row_wildcard_scan(seed, pattern):
+    rng = np.random.default_rng(seed)
+    # Enough keys that common trigrams have more candidates than are verified directly
+    keys = [_text(rng, "abcAB", 1, 7) if rng.random() > 0.05 else None for _ in range(400)]
+    table = pd.DataFrame({"key": keys, "value": [f"v{i}" for i in range(400)]})
+    alphabet = "abcA*?" if pattern else "abcAB"
+    lookups = pd.Series([_text(rng, alphabet, 0, 9) if rng.random() > 0.1 else None for _ in range(300)])
+    unique, values = unique_keys(table["key"], table["value"])
+
+    result = SubstringIndex(unique).resolve(lookups, pd.Index(unique), values, NOT_FOUND, pattern=pattern)
+    reference = _lookup_dict(table["key"], table["value"])
+    matcher = _reference_pattern if pattern else _reference_wildcard
+    assert result.tolist() == [matcher(reference, value) for value in lookups]
+
+
+def _reference_multi_key(lookup: pd.DataFrame, keys: tuple, on_multiple: str):
+    """Return value of the row's keys, and whether they were ambiguous"""
+    if any(pd.isna(key) for key in keys):
+        return NOT_FOUND, False
+    matches = lookup[(lookup["k1"] == keys[0]) & (lookup["k2"] == keys[1])]["value"]
+    if len(matches) == 0:
+        return NOT_FOUND, False
+    ambiguous = matches.nunique(dropna=False) > 1
+    if ambiguous and on_multiple == "blank":
+        return NOT_FOUND, True
+    return matches.iloc[0], ambiguous
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("on_multiple", ["first", "blank"])
+def test_multi_key_match_matches_the_per_row_lookupvalue(seed, on_multiple):
+    rng = np.random.default_rng(seed)
+    lookup = pd.DataFrame({
+        "k1": rng.integers(0, 5, 40).astype(float),
+        "k2": rng.choice(["x", "y", "z"], 40).astype(object),
+        # Few distinct values, so some keys repeat one value and others disagree
+        "value": rng.choice(["a", "b", None], 40, p=[0.6, 0.3, 0.1]).astype(object)
+    })
+    lookup.loc[rng.random(40) < 0.1, "k1"] = np.nan
+    lookup.loc[rng.random(40) < 0.1, "k2"] = None
+    main = pd.DataFrame({
+        "m1": rng.integers(0, 6, 150).astype(float),
+        "m2": rng.choice(["x", "y", "z", "w"], 150).astype(object)
+    }, index=rng.permutation(150))
+    main.loc[main.index[rng.random(150) < 0.1], "m1"] = np.nan
+    main.loc[main.index[rng.random(150) < 0.1], "m2"] = None
+
+    result, ambiguous_rows = multi_key_match(lookup[["k1", "k2"]], lookup["value"], main, NOT_FOUND, on_multiple)
+    reference = [_reference_multi_key(lookup, keys, on_multiple) for keys in main.itertuples(index=False)]
+    assert result.index.equals(main.index)
+    assert result.tolist() == [found for found, _ in reference]
+    assert ambiguous_rows == sum(ambiguous for _, ambiguous in reference)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from profiling import DatasetProfile
+
+
+def _random_frame(rng: np.random.Generator, rows: int) -> pd.DataFrame:
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 4, rows), unit="D")
+    df = pd.DataFrame({
+        "ints": rng.integers(0, 5, rows),
+        "floats": rng.normal(0, 1, rows).round(1),
+        "text": rng.choice(["a", "b", "c"], rows),
+        "dates": dates,
+        "durations": pd.to_timedelta(rng.integers(0, 3, rows), unit="h"),
+        "category": pd.Categorical(rng.choice(["x", "y"], rows)),
+        "flags": rng.choice([True, False], rows)
+    })
+    for col in ["floats", "text", "dates", "durations"]:
+        df.loc[rng.random(rows) < 0.15, col] = None
+    return df
+
+
+def _assert_same_profile(derived: DatasetProfile, rebuilt: DatasetProfile) -> None:
+    assert derived.rows == rebuilt.rows
+    assert derived.basic_info() == rebuilt.basic_info()
+    for got, expected in zip(derived.columns, rebuilt.columns):
+        assert got.keys() == expected.keys()
+        for key, value in expected.items():
+            if isinstance(value, float):
+                assert got[key] == pytest.approx(value, rel=1e-9, abs=1e-12), (expected['name'], key)
+            else:
+                assert got[key] == value, (expected['name'], key)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_derived_profile_after_dropping_rows_matches_a_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    df = _random_frame(rng, int(rng.integers(5, 40)))
+    keep = rng.random(len(df)) < rng.uniform(0.3, 0.95)
+    kept = df[keep]
+    touched = []
+    if seed % 2:
+        # A transformation that also changed a column
+        kept = kept.assign(ints=kept["ints"] * 2)
+        touched = ["ints"]
+
+    derived = DatasetProfile.build(df).derive(kept, touched, dropped=df[~keep])
+    _assert_same_profile(derived, DatasetProfile.build(kept))
+
+
+def test_dropping_the_rows_of_the_top_date_recomputes_it():
+    df = pd.DataFrame({"d": pd.to_datetime(["2020-01-01"] * 3 + ["2020-01-02"] * 2)})
+    keep = np.array([False, False, False, True, True])
+    derived = DatasetProfile.build(df).derive(df[keep], dropped=df[~keep])
+    assert derived.columns[0]["top_value"] == "2020-01-02 00:00:00"
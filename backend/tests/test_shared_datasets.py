@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import uuid
+
+import pandas as pd
+
+import shared_datasets
+import shared_state
+from dataset_registry import registry, session_id
+
+
+def test_reads_check_for_newer_versions_at_most_every_max_age(monkeypatch):
+    queries = []
+    monkeypatch.setattr(shared_datasets, "_latest", lambda session: queries.append(session))
+    token = session_id.set("sync-test")
+    try:
+        shared_datasets.sync_session(60)
+        shared_datasets.sync_session(60)
+        assert queries == ["sync-test"]
+        # Edits always check
+        shared_datasets.sync_session()
+        assert len(queries) == 2
+    finally:
+        session_id.reset(token)
+
+
+def test_shared_writes_publishes_and_syncs_run_off_the_event_loop(monkeypatch):
+    calls = []
+
+    def recorded(name, fn):
+        def call(*args):
+            calls.append((name, threading.current_thread().name))
+            return fn(*args)
+        return call
+
+    monkeypatch.setattr(shared_state, "SHARED_DATASETS", 1)
+    monkeypatch.setattr(shared_state, "map_original", recorded("write", lambda df, path: (df, None)))
+    monkeypatch.setattr(shared_state, "publish", recorded(
+        "publish", lambda entry, df, expected: registry.update(entry, df, expected_version=expected)))
+    monkeypatch.setattr(shared_state, "sync_session", recorded("sync", lambda max_age: None))
+
+    async def load_and_edit():
+        df = await shared_state.set_current_data(pd.DataFrame({"a": [1, 2]}), "shared")
+        await shared_state.set_current_cleaned_data(df)
+        async with shared_state.edit_current_data() as (df, version):
+            await shared_state.set_current_cleaned_data(df.assign(a=df["a"] + 1))
+
+    token = session_id.set(uuid.uuid4().hex)
+    try:
+        asyncio.run(load_and_edit())
+    finally:
+        registry.remove()
+        session_id.reset(token)
+    assert {name for name, _ in calls} == {"write", "publish", "sync"}
+    assert all(thread.startswith("eaa-datasets") for _, thread in calls)
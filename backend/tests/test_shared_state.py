@@ -0,0 +1,67 @@
+import asyncio
+import threading
+import uuid
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from dataset_registry import registry, session_id
+from shared_state import (edit_current_data, get_current_cleaned_data_version, set_current_cleaned_data,
+                          set_current_data)
+
+
+@pytest.fixture
+def session():
+    token = session_id.set(uuid.uuid4().hex)
+    try:
+        df = asyncio.run(set_current_data(pd.DataFrame({"a": [1, 2, 3]}), "edits"))
+        asyncio.run(set_current_cleaned_data(df))
+        yield
+    finally:
+        registry.remove()
+        session_id.reset(token)
+
+
+def test_edit_of_a_version_changed_meanwhile_is_a_conflict(session):
+    async def edit():
+        async with edit_current_data() as (df, version):
+            # Another writer (e.g. another worker) replaces the version the edit started from
+            registry.update(registry.active(), df.assign(a=df["a"] * 10))
+            with pytest.raises(HTTPException) as raised:
+                await set_current_cleaned_data(df.assign(a=df["a"] + 1))
+            assert raised.value.status_code == 409
+
+    asyncio.run(edit())
+    df, _ = asyncio.run(get_current_cleaned_data_version())
+    assert df["a"].tolist() == [10, 20, 30]
+
+
+def test_concurrent_edits_apply_one_after_another(session):
+    async def increment():
+        async with edit_current_data() as (df, version):
+            await asyncio.sleep(0)
+            await set_current_cleaned_data(df.assign(a=df["a"] + 1))
+
+    async def run():
+        await asyncio.gather(*[increment() for _ in range(5)])
+
+    asyncio.run(run())
+    df, _ = asyncio.run(get_current_cleaned_data_version())
+    assert df["a"].tolist() == [6, 7, 8]
+
+
+def test_evicted_data_is_read_back_off_the_event_loop(session):
+    threads = []
+
+    def load():
+        threads.append(threading.current_thread().name)
+        return pd.DataFrame({"a": [1, 2, 3]})
+
+    entry = registry.active()
+    entry.loader = load
+    registry._evict(entry)
+    assert not entry.loaded
+    df, _ = asyncio.run(get_current_cleaned_data_version())
+    assert df["a"].tolist() == [1, 2, 3]
+    assert len(threads) == 1 and threads[0].startswith("eaa-datasets")
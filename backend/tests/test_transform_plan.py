@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pandas.testing as tm
+import pytest
+
+from transform_plan import Operation, TransformPlan, replay
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({"a": [1.0, None, 3.0, 100.0], "b": ["x", "y", None, "z"]})
+
+
+def test_replay_source_uses_the_given_original_when_the_plan_dropped_it():
+    base = _frame()
+    plan = TransformPlan(base)
+    operations = [Operation.clean("zero", columns=["a"]), Operation.clean("drop")]
+    current = replay(base, operations)
+    for operation in operations:
+        plan.record(operation)
+    # As the registry leaves it while the dataset is spilled or evicted
+    plan.base = None
+
+    source, pending = plan.replay_source(1, base, current)
+    tm.assert_frame_equal(replay(source, pending), replay(base, operations[:1]))
+
+
+def _messy_frame() -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame({
+        "a": rng.normal(10, 2, 60),
+        "b": rng.choice(["x", "y", "z"], 60),
+        "c": rng.integers(0, 5, 60).astype(float),
+        "d": rng.choice(["1", "2", "3.5"], 60)
+    })
+    df.loc[::7, "a"] = np.nan
+    df.loc[3::11, "c"] = np.nan
+    df.loc[5, "a"] = 500.0
+    return pd.concat([df, df.iloc[:6]], ignore_index=True)
+
+
+@pytest.mark.parametrize("operations", [
+    [Operation.clean("mean", columns=["a"]), Operation.convert_type("d", "numeric"), Operation.clean("zero")],
+    [Operation.clean("drop", columns=["c"]), Operation.remove_outliers("a", "zscore"), Operation.dedupe()],
+    [Operation.clean("median"), Operation.dedupe(["b", "c"], "last"), Operation.convert_type("b", "categorical"),
+     Operation.remove_outliers("a", "iqr"), Operation.clean("custom", "missing"), Operation.dedupe(keep="none")],
+])
+def test_fused_replay_matches_running_operations_one_by_one(operations):
+    df = _messy_frame()
+    expected = df
+    for operation in operations:
+        expected = replay(expected, [operation])
+    tm.assert_frame_equal(replay(df, operations), expected)
+
+
+def test_formula_columns_are_put_back_when_replaying():
+    base = _frame()
+    plan = TransformPlan(base)
+    clean = Operation.clean("zero", columns=["a"])
+    cleaned = replay(base, [clean])
+    with_result = cleaned.assign(r=cleaned["a"] * 2, b=cleaned["b"].str.upper())
+    formula = Operation.added_columns("formula into r, b", with_result, ["r", "b"])
+    drop = Operation.clean("drop")
+    for operation in [clean, formula, drop]:
+        plan.record(operation)
+
+    assert list(formula.frame.columns) == ["r", "b"]
+    tm.assert_frame_equal(replay(*plan.replay_source(3, base)), replay(with_result, [drop]))
+    tm.assert_frame_equal(replay(*plan.replay_source(2, base)), with_result)
+    assert plan.recipe_steps() == ([clean.to_step(), drop.to_step()], 1)
@@ -0,0 +1,27 @@
+from fastapi import HTTPException
+
+import routes.transformations
+
+
+def test_failed_publish_leaves_the_plan_as_it_was(client, monkeypatch):
+    assert client.get("/sample-data").status_code == 200
+
+    async def conflict(df):
+        raise HTTPException(status_code=409, detail="The data was changed meanwhile, try again")
+
+    monkeypatch.setattr(routes.transformations, "set_current_cleaned_data", conflict)
+    response = client.post("/transformations/apply", json={"operations": [{"type": "clean", "method": "drop"}]})
+    assert response.status_code == 409
+    plan = client.get("/transformations").json()
+    assert plan["position"] == 0
+    assert plan["steps"] == []
+
+
+def test_bad_recipe_name_is_rejected_before_the_data_changes(client):
+    assert client.get("/sample-data").status_code == 200
+    etag = client.get("/data-info").headers["ETag"]
+
+    response = client.post("/apply-recipe", json={"steps": [{"type": "clean", "method": "drop"}], "save_as": "  "})
+    assert response.status_code == 400
+    assert client.get("/data-info").headers["ETag"] == etag
+    assert client.get("/transformations").json()["position"] == 0
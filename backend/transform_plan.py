@@ -0,0 +1,352 @@
+"""
+Recorded transformation plan of the current dataset.
+
+Every change to the cleaned data is appended to an ordered log of operations.
+Frames of intermediate steps are not kept: any step is rebuilt on demand from
+the nearest checkpoint (the original data, or data the plan cannot rebuild,
+such as changes taken over from another worker) by replaying the operations
+after it. Formulas are recorded with only the columns they added, which
+replays put back in place.
+Replays fuse consecutive column operations (missing-value fills and type
+conversions) into one assignment of the changed columns, and consecutive row
+filters (dropping rows with missing values, removing outliers) into a single
+row selection, with the same result as running them one by one.
+
+Replayable operations serialize to plain dicts ("steps"), which is also the
+format of stored cleaning recipes.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_processing import DataProcessor
+from shared_state import get_current_plan, set_current_plan
+
+CLEAN_METHODS = ("drop", "mean", "median", "mode", "zero", "custom")
+OUTLIER_METHODS = ("zscore", "iqr", "isolation_forest")
+TARGET_TYPES = ("string", "numeric", "datetime", "categorical")
+DEDUPE_KEEP = ("first", "last", "none")
+
+
+class Operation:
+    """One step of a plan: a replayable cleaning operation, columns added by a formula, or a
+    checkpoint holding its result"""
+
+    def __init__(self, kind: str, params: Dict[str, Any], frame: Optional[pd.DataFrame] = None):
+        self.kind = kind
+        self.params = params
+        self.frame = frame
+
+    @classmethod
+    def clean(cls, method: str, fill_value: Optional[Any] = None, columns: Optional[List[str]] = None) -> "Operation":
+        """Missing-value handling as in /clean-data, optionally limited to some columns"""
+        params = {"method": method, "fill_value": fill_value}
+        if columns is not None:
+            params["columns"] = list(columns)
+        return cls("clean", params)
+
+    @classmethod
+    def remove_outliers(cls, column: Optional[str], method: str = "zscore",
+                        columns: Optional[List[str]] = None) -> "Operation":
+        """Outlier removal on one column, or with columns a multivariate isolation forest"""
+        params = {"column": column, "method": method}
+        if columns:
+            params["columns"] = list(columns)
+        return cls("remove_outliers", params)
+
+    @classmethod
+    def convert_type(cls, column: str, target_type: str) -> "Operation":
+        return cls("convert_type", {"column": column, "target_type": target_type})
+
+    @classmethod
+    def dedupe(cls, columns: Optional[List[str]] = None, keep: str = "first") -> "Operation":
+        """Drop duplicate rows (judged on the given columns, else all), keeping the first, last or none"""
+        return cls("dedupe", {"columns": list(columns) if columns is not None else None, "keep": keep})
+
+    @classmethod
+    def checkpoint(cls, label: str, frame: pd.DataFrame) -> "Operation":
+        """A step the plan cannot replay (e.g. changes made in another worker), recorded with its result"""
+        return cls("checkpoint", {"label": label}, frame)
+
+    @classmethod
+    def added_columns(cls, label: str, result: pd.DataFrame, columns: List[Any]) -> "Operation":
+        """Columns a formula added to (or replaced in) the data, recorded with their values only"""
+        columns = list(dict.fromkeys(columns))
+        return cls("add_columns", {"label": label, "columns": columns}, result[columns])
+
+    @property
+    def recipe_step(self) -> bool:
+        """Whether the operation is a cleaning step, which recipes can hold"""
+        return self.kind not in ("checkpoint", "add_columns")
+
+    def add_to(self, df: pd.DataFrame) -> pd.DataFrame:
+        """df with the recorded columns (of an add_columns operation) put back"""
+        if len(df) != len(self.frame):
+            raise ValueError(f"Cannot add columns recorded for {len(self.frame)} rows to {len(df)} rows")
+        result = df.copy(deep=False)
+        for name in self.frame.columns:
+            result[name] = self.frame[name].set_axis(result.index)
+        return result
+
+    @property
+    def filters_rows(self) -> bool:
+        return self.kind in ("remove_outliers", "dedupe") or (self.kind == "clean" and self.params["method"] == "drop")
+
+    def apply_to_column(self, series: pd.Series, name: Any) -> pd.Series:
+        """This column-local operation applied to one column; the same object if unchanged"""
+        if self.kind == "clean":
+            if not series.hasnans or name not in self.params.get("columns", [name]):
+                return series
+            processor = DataProcessor(series.to_frame(name))
+            processor.clean_missing_values(self.params["method"], self.params["fill_value"])
+            return processor.df.iloc[:, 0] if processor.touched_columns else series
+        if self.kind == "convert_type" and name == self.params["column"]:
+            processor = DataProcessor(series.to_frame(name))
+            processor.convert_data_type(name, self.params["target_type"])
+            return processor.df.iloc[:, 0]
+        return series
+
+    def describe(self) -> str:
+        if self.kind == "clean":
+            scope = f" in {', '.join(map(str, self.params['columns']))}" if "columns" in self.params else ""
+            return f"Clean missing values{scope} ({self.params['method']})"
+        if self.kind == "remove_outliers":
+            target = ", ".join(map(str, self.params["columns"])) if "columns" in self.params else self.params["column"]
+            return f"Remove outliers from {target} ({self.params['method']})"
+        if self.kind == "dedupe":
+            scope = f" on {', '.join(map(str, self.params['columns']))}" if self.params["columns"] else ""
+            return f"Remove duplicate rows{scope} (keep {self.params['keep']})"
+        if self.kind == "convert_type":
+            return f"Convert {self.params['column']} to {self.params['target_type']}"
+        return f"Apply {self.params['label']}"
+
+    def to_step(self) -> Dict[str, Any]:
+        """The operation as a recipe step, the format parse_operation reads"""
+        return {"type": self.kind, **self.params}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.to_step(), description=self.describe())
+
+
+def _check_columns(names, columns) -> None:
+    if columns is None:
+        return
+    for name in names:
+        if name not in columns:
+            raise ValueError(f"Column '{name}' not found in data")
+
+
+def parse_operation(item: Dict[str, Any], columns=None) -> Operation:
+    """Validate one step (as produced by Operation.to_step) and build its operation.
+
+    With columns, the columns the step refers to must be among them. Raises ValueError.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Each step must be an object")
+    op_type = item.get("type")
+    if op_type == "clean":
+        if item.get("method") not in CLEAN_METHODS:
+            raise ValueError(f"method must be one of {', '.join(CLEAN_METHODS)}")
+        scope = item.get("columns")
+        if scope is not None:
+            if not isinstance(scope, list) or not scope:
+                raise ValueError("columns must be a non-empty list")
+            _check_columns(scope, columns)
+        return Operation.clean(item["method"], item.get("fill_value"), scope)
+    if op_type == "dedupe":
+        scope = item.get("columns")
+        if scope is not None:
+            if not isinstance(scope, list) or not scope:
+                raise ValueError("columns must be a non-empty list")
+            _check_columns(scope, columns)
+        keep = item.get("keep", "first")
+        if keep not in DEDUPE_KEEP:
+            raise ValueError(f"keep must be one of {', '.join(DEDUPE_KEEP)}")
+        return Operation.dedupe(scope, keep)
+    if op_type not in ("remove_outliers", "convert_type"):
+        raise ValueError("type must be clean, remove_outliers, convert_type or dedupe")
+    if op_type == "remove_outliers" and item.get("columns") is not None:
+        scope = item["columns"]
+        if not isinstance(scope, list) or not scope:
+            raise ValueError("columns must be a non-empty list")
+        if item.get("method", "isolation_forest") != "isolation_forest":
+            raise ValueError("Multiple columns are only supported with isolation_forest")
+        _check_columns(scope, columns)
+        return Operation.remove_outliers(None, "isolation_forest", scope)
+    if not item.get("column"):
+        raise ValueError("column is required")
+    _check_columns([item["column"]], columns)
+    if op_type == "remove_outliers":
+        method = item.get("method", "zscore")
+        if method not in OUTLIER_METHODS:
+            raise ValueError(f"method must be one of {', '.join(OUTLIER_METHODS)}")
+        return Operation.remove_outliers(item["column"], method)
+    if item.get("target_type") not in TARGET_TYPES:
+        raise ValueError(f"target_type must be one of {', '.join(TARGET_TYPES)}")
+    return Operation.convert_type(item["column"], item["target_type"])
+
+
+def parse_steps(steps: List[Dict[str, Any]], columns=None) -> List[Operation]:
+    """parse_operation for every step, prefixing errors with the step number"""
+    operations = []
+    for number, item in enumerate(steps, start=1):
+        try:
+            operations.append(parse_operation(item, columns))
+        except ValueError as e:
+            raise ValueError(f"Step {number}: {e}")
+    return operations
+
+
+def _apply_column_operations(df: pd.DataFrame, operations: List[Operation]) -> pd.DataFrame:
+    """Fills and conversions only depend on the column they change, so each column runs
+    through all of them in turn and the changed columns are assigned once"""
+    changed = {}
+    for position, name in enumerate(df.columns):
+        series = original = df.iloc[:, position]
+        for operation in operations:
+            series = operation.apply_to_column(series, name)
+        if series is not original:
+            changed[position] = series
+    if not changed:
+        return df
+    result = df.copy(deep=False)
+    for position, series in changed.items():
+        result.isetitem(position, series)
+    return result
+
+
+def _apply_row_filters(df: pd.DataFrame, operations: List[Operation]) -> pd.DataFrame:
+    """Evaluate each filter on the rows the previous ones kept, then select the rows once"""
+    keep = np.ones(len(df), dtype=bool)
+    for operation in operations:
+        if operation.kind == "clean":
+            scope = operation.params.get("columns")
+            missing = (df[scope] if scope is not None else df).isna().any(axis=1).to_numpy()
+            keep &= ~missing
+            continue
+        if operation.kind == "dedupe":
+            scope = operation.params["columns"]
+            kept = df.loc[keep, scope] if scope is not None else df[keep]
+            keep_option = operation.params["keep"] if operation.params["keep"] != "none" else False
+            keep[np.flatnonzero(keep)[kept.duplicated(keep=keep_option).to_numpy()]] = False
+            continue
+        scope = operation.params.get("columns")
+        if scope is not None:
+            outliers = DataProcessor(df.loc[keep, scope], read_only=True).isolation_forest_outliers(scope)
+            keep &= ~df.index.isin(outliers)
+            continue
+        column = operation.params["column"]
+        if column not in df.columns:
+            continue
+        kept = df.loc[keep, [column]]
+        outliers = DataProcessor(kept, read_only=True).detect_outliers(column, operation.params["method"])
+        keep &= ~df.index.isin(outliers)
+    return df if keep.all() else df[keep]
+
+
+def replay(df: pd.DataFrame, operations: List[Operation]) -> pd.DataFrame:
+    """Run the operations on df, fusing consecutive column operations and row filters"""
+    start = 0
+    while start < len(operations):
+        if operations[start].kind == "checkpoint":
+            df = operations[start].frame
+            start += 1
+            continue
+        if operations[start].kind == "add_columns":
+            df = operations[start].add_to(df)
+            start += 1
+            continue
+        filters_rows = operations[start].filters_rows
+        end = start
+        while end < len(operations) and operations[end].recipe_step \
+                and operations[end].filters_rows == filters_rows:
+            end += 1
+        run = operations[start:end]
+        df = _apply_row_filters(df, run) if filters_rows else _apply_column_operations(df, run)
+        start = end
+    return df
+
+
+class TransformPlan:
+    """The operations applied to a dataset since it was loaded, with an undo/redo position"""
+
+    def __init__(self, base: pd.DataFrame):
+        # The original data; None while the registry has the dataset evicted
+        self.base = base
+        self.operations: List[Operation] = []
+        # Number of operations the current cleaned data reflects
+        self.position = 0
+        self._lock = threading.Lock()
+
+    def record(self, operation: Operation) -> None:
+        """Append an operation applied to the current data, discarding any undone ones"""
+        with self._lock:
+            del self.operations[self.position:]
+            self.operations.append(operation)
+            self.position += 1
+
+    def replay_source(self, step: int, base: pd.DataFrame,
+                      current: Optional[pd.DataFrame] = None) -> Tuple[pd.DataFrame, List[Operation]]:
+        """The frame and operations replay turns into the data after the first step operations.
+        Going forward from the current position replays from current; otherwise from the
+        last checkpoint before step, or from base (the original data)."""
+        with self._lock:
+            if not 0 <= step <= len(self.operations):
+                raise ValueError(f"Step must be between 0 and {len(self.operations)}")
+            if current is not None and step >= self.position:
+                return current, self.operations[self.position:step]
+            start, df = 0, base
+            for index in range(step - 1, -1, -1):
+                if self.operations[index].kind == "checkpoint":
+                    start, df = index + 1, self.operations[index].frame
+                    break
+            return df, self.operations[start:step]
+
+    def frame_at(self, step: int, current: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """The data after the first step operations, replayed from current or self.base"""
+        return replay(*self.replay_source(step, self.base, current))
+
+    def move_to(self, step: int) -> None:
+        with self._lock:
+            self.position = step
+
+    def recipe_steps(self) -> Tuple[List[Dict[str, Any]], int]:
+        """Steps of the applied replayable operations, and how many formula results and
+        checkpoints were left out"""
+        with self._lock:
+            applied = self.operations[:self.position]
+        steps = [operation.to_step() for operation in applied if operation.recipe_step]
+        return steps, len(applied) - len(steps)
+
+    def frames(self) -> List[pd.DataFrame]:
+        """Frames the operations hold (checkpoints and added columns), for memory accounting"""
+        with self._lock:
+            return [operation.frame for operation in self.operations if operation.frame is not None]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "position": self.position,
+                "steps": [dict(operation.to_dict(), step=index + 1, applied=index < self.position)
+                          for index, operation in enumerate(self.operations)]
+            }
+
+
+def start_plan(base: pd.DataFrame) -> TransformPlan:
+    """Begin an empty plan for newly loaded data"""
+    plan = TransformPlan(base)
+    set_current_plan(plan)
+    return plan
+
+
+def get_plan() -> Optional[TransformPlan]:
+    return get_current_plan()
+
+
+def record_operation(operation: Operation) -> None:
+    """Record an operation on the current data, if a plan is being kept"""
+    plan = get_current_plan()
+    if plan is not None:
+        plan.record(operation)
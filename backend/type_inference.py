@@ -0,0 +1,205 @@
+"""
+Type inference for text columns: datetime formats and numeric-looking strings.
+
+Each column is inspected on a sample of its values: numbers (optionally with
+thousands separators) are recognised with pd.to_numeric, dates by trying the
+formats pandas guesses from the first values plus a list of common ones and
+keeping the format most of the sample parses with. Conversions then parse with
+that explicit format instead of letting pandas guess one from the first value,
+and parse each distinct value once when the values repeat. Results are cached
+under the column name and a hash of the sample, so a column keeps its detected
+format across versions of the data (and from /upload to /convert-type) until
+its values change.
+"""
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from profile_cache import ProfileCache
+
+# Values of a column inspected to infer its type
+INFERENCE_SAMPLE_ROWS = int(os.environ.get("EAA_TYPE_INFERENCE_SAMPLE_ROWS", "1000"))
+# Share of the sample that must parse for a type to be suggested
+INFERENCE_MIN_MATCH = float(os.environ.get("EAA_TYPE_INFERENCE_MIN_MATCH", "0.95"))
+TYPE_INFERENCE_WORKERS = int(os.environ.get("EAA_TYPE_INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Whether /upload returns type suggestions for the new data
+SUGGEST_TYPES_ON_UPLOAD = int(os.environ.get("EAA_SUGGEST_TYPES_ON_UPLOAD", "1"))
+
+# Tried after the formats guessed from the values themselves
+DATETIME_FORMATS = (
+    "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y/%m/%d",
+    "%m/%d/%Y", "%d/%m/%Y", "%m/%d/%Y %H:%M", "%d/%m/%Y %H:%M",
+    "%d-%m-%Y", "%d.%m.%Y", "%b %d, %Y", "%d %b %Y", "%B %d, %Y", "%d %B %Y",
+)
+# Values are parsed once per distinct value when the sample repeats values this much; a
+# sample of a column with (nearly) all values distinct has almost no repeats at all
+DISTINCT_CONVERSION_RATIO = 0.9
+
+inference_cache = ProfileCache(int(os.environ.get("EAA_TYPE_INFERENCE_CACHE_ENTRIES", "512")))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=TYPE_INFERENCE_WORKERS, thread_name_prefix="eaa-types")
+    return _executor
+
+
+def _map_columns(fn: Callable, items: List[Any]) -> List[Any]:
+    if TYPE_INFERENCE_WORKERS > 1 and len(items) > 1:
+        return list(_get_executor().map(fn, items))
+    return [fn(item) for item in items]
+
+
+def is_text(series: pd.Series) -> bool:
+    """Whether the column holds strings (object or string dtype)"""
+    return series.dtype == object or isinstance(series.dtype, pd.StringDtype)
+
+
+def _sample(series: pd.Series) -> pd.Series:
+    """Up to INFERENCE_SAMPLE_ROWS non-null values spread evenly over the column, as str"""
+    if len(series) > INFERENCE_SAMPLE_ROWS:
+        positions = np.linspace(0, len(series) - 1, INFERENCE_SAMPLE_ROWS).astype(np.int64)
+        sample = series.iloc[positions].dropna()
+        if sample.empty:
+            sample = series.dropna().iloc[:INFERENCE_SAMPLE_ROWS]
+    else:
+        sample = series.dropna()
+    return sample.astype(str).reset_index(drop=True)
+
+
+def _match_ratio(parsed: pd.Series) -> float:
+    return float(parsed.notna().mean()) if len(parsed) else 0.0
+
+
+def _numeric_format(sample: pd.Series) -> Tuple[str, float]:
+    """Thousands separator ("" for none) the sample parses best with, and its match ratio"""
+    ratio = _match_ratio(pd.to_numeric(sample, errors="coerce"))
+    if ratio >= INFERENCE_MIN_MATCH or not sample.str.contains(",", regex=False).any():
+        return "", ratio
+    separated = _match_ratio(pd.to_numeric(sample.str.replace(",", "", regex=False), errors="coerce"))
+    return (",", separated) if separated > ratio else ("", ratio)
+
+
+def _datetime_format(sample: pd.Series) -> Tuple[Optional[str], float]:
+    """Explicit format most of the sample parses with, and its match ratio"""
+    candidates = []
+    with warnings.catch_warnings():
+        # pandas warns when the guess contradicts dayfirst; both guesses are tried anyway
+        warnings.simplefilter("ignore", UserWarning)
+        for value in sample.iloc[:20]:
+            for dayfirst in (False, True):
+                guessed = guess_datetime_format(value, dayfirst=dayfirst)
+                if guessed and guessed not in candidates:
+                    candidates.append(guessed)
+    candidates += [fmt for fmt in DATETIME_FORMATS if fmt not in candidates]
+    best, best_ratio = None, 0.0
+    for fmt in candidates:
+        ratio = _match_ratio(pd.to_datetime(sample, format=fmt, errors="coerce"))
+        if ratio > best_ratio:
+            best, best_ratio = fmt, ratio
+            if ratio == 1.0:
+                break
+    return best, best_ratio
+
+
+def infer_series(series: pd.Series, name: Any = None) -> Dict[str, Any]:
+    """Detected type of a text column: {"type": "numeric", "datetime" or None, "format"
+    (datetime format), "thousands" (separator of numbers), "match_ratio", "distinct_ratio"}"""
+    if not is_text(series):
+        return {"type": None, "format": None, "thousands": "", "match_ratio": 0.0, "distinct_ratio": 1.0}
+    sample = _sample(series)
+    key = ("types", name if name is not None else series.name, len(series),
+           int(pd.util.hash_pandas_object(sample, index=False).sum()))
+    inferred = inference_cache.get(key)
+    if inferred is not None:
+        return inferred
+    inferred = {
+        "type": None,
+        "format": None,
+        "thousands": "",
+        "match_ratio": 0.0,
+        "distinct_ratio": sample.nunique() / len(sample) if len(sample) else 1.0
+    }
+    if len(sample):
+        thousands, ratio = _numeric_format(sample)
+        inferred.update(thousands=thousands, match_ratio=ratio)
+        if ratio >= INFERENCE_MIN_MATCH:
+            inferred["type"] = "numeric"
+        else:
+            fmt, ratio = _datetime_format(sample)
+            inferred.update(format=fmt)
+            if ratio >= INFERENCE_MIN_MATCH:
+                inferred.update(type="datetime", match_ratio=ratio)
+    inference_cache.put(key, inferred)
+    return inferred
+
+
+def _convert_distinct(series: pd.Series, convert: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """convert applied to each distinct value once, then spread back over the rows"""
+    codes, uniques = pd.factorize(series)
+    converted = pd.Series(convert(pd.Series(uniques))).array
+    return pd.Series(converted.take(codes, allow_fill=True), index=series.index, name=series.name)
+
+
+def convert_series(series: pd.Series, target_type: str, name: Any = None) -> pd.Series:
+    """series as target_type (string, numeric, datetime or categorical); unparseable values become missing"""
+    if target_type == "string":
+        return series.astype(str)
+    if target_type == "categorical":
+        return series.astype("category")
+    if target_type not in ("numeric", "datetime"):
+        raise ValueError(f"Unknown target type '{target_type}'")
+    if not is_text(series):
+        if target_type == "numeric":
+            return pd.to_numeric(series, errors="coerce")
+        return pd.to_datetime(series, errors="coerce")
+
+    inferred = infer_series(series, name)
+    if target_type == "numeric":
+        if inferred["thousands"]:
+            def convert(values):
+                return pd.to_numeric(values.astype(str).str.replace(inferred["thousands"], "", regex=False),
+                                     errors="coerce")
+        else:
+            def convert(values):
+                return pd.to_numeric(values, errors="coerce")
+    else:
+        fmt = inferred["format"]
+
+        def convert(values):
+            return pd.to_datetime(values, format=fmt, errors="coerce") if fmt else pd.to_datetime(values, errors="coerce")
+    if inferred["distinct_ratio"] <= DISTINCT_CONVERSION_RATIO:
+        return _convert_distinct(series, convert)
+    return convert(series)
+
+
+def convert_columns(df: pd.DataFrame, conversions: Dict[Any, str]) -> Dict[Any, pd.Series]:
+    """Converted columns of df by name, converting several columns in parallel"""
+    items = list(conversions.items())
+    converted = _map_columns(lambda item: convert_series(df[item[0]], item[1], item[0]), items)
+    return {name: series for (name, _), series in zip(items, converted)}
+
+
+def suggest_types(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Conversions worth making: text columns whose values look numeric or like dates"""
+    positions = [i for i in range(df.shape[1]) if is_text(df.iloc[:, i])]
+    inferred = _map_columns(lambda i: infer_series(df.iloc[:, i], df.columns[i]), positions)
+    return [
+        {
+            "column": df.columns[i],
+            "current_type": str(df.dtypes.iloc[i]),
+            "suggested_type": result["type"],
+            "format": result["format"] if result["type"] == "datetime" else None,
+            "thousands_separator": result["thousands"] or None,
+            "match_ratio": round(result["match_ratio"], 4)
+        }
+        for i, result in zip(positions, inferred) if result["type"] is not None
+    ]
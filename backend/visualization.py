@@ -1,11 +1,16 @@
 import pandas as pd
 import numpy as np
 from typing import Dict, Any, Optional
+from sketches import ColumnSketch, DatasetSketch
 
 class Visualizer:
-    def __init__(self, data):
-        self.data = data
-        self.df = data
+    def __init__(self, data, sketch: Optional[DatasetSketch] = None):
+        # Columns converted for a chart replace those of this shallow copy only, never the
+        # caller's frame (copy-on-write: untouched columns are not copied)
+        self.data = data.copy(deep=False)
+        self.df = self.data
+        # Sketch of this data, if one is at hand, for approximate statistics
+        self.sketch = sketch
     def plot_missing_values(self) -> Dict[str, Any]:
         try:
             missing = self.data.isna().sum().reset_index()
@@ -37,10 +42,18 @@ class Visualizer:
         except Exception as e:
             print(f"Missing values plot error: {e}")
             return {"error": f"Could not create missing values plot: {str(e)}"}
-    def plot_numeric_distribution(self, column: str) -> Dict[str, Any]:
+    def _column_sketch(self, column: str) -> ColumnSketch:
+        column_sketch = self.sketch.column(column) if self.sketch is not None else None
+        if column_sketch is None:
+            column_sketch = ColumnSketch()
+            column_sketch.update(self.data[column])
+        return column_sketch
+    def plot_numeric_distribution(self, column: str, approximate: bool = False) -> Dict[str, Any]:
         try:
             if column not in self.data.columns:
                 return {"error": f"Column '{column}' not found in data"}
+            # Quartiles from a KLL sketch instead of sorting the column; min/max stay exact
+            approximate = approximate and pd.api.types.is_numeric_dtype(self.data[column])
             if not pd.api.types.is_numeric_dtype(self.data[column]):
                 try:
                     self.data[column] = pd.to_numeric(self.data[column], errors='coerce')
@@ -51,12 +64,17 @@ class Visualizer:
                 return {"error": f"No valid numeric data in column {column}"}
             hist, bins = np.histogram(clean_data, bins=min(20, len(clean_data)//5))
             bin_centers = (bins[:-1] + bins[1:]) / 2
-            q1 = float(clean_data.quantile(0.25))
-            q3 = float(clean_data.quantile(0.75))
-            median = float(clean_data.median())
-            min_val = float(clean_data.min())
-            max_val = float(clean_data.max())
-            return {
+            if approximate:
+                column_sketch = self._column_sketch(column)
+                q1, median, q3 = column_sketch.quantiles([0.25, 0.5, 0.75])
+                min_val, max_val = column_sketch.min, column_sketch.max
+            else:
+                q1 = float(clean_data.quantile(0.25))
+                q3 = float(clean_data.quantile(0.75))
+                median = float(clean_data.median())
+                min_val = float(clean_data.min())
+                max_val = float(clean_data.max())
+            result = {
                 "title": f"Distribution of {column}",
                 "data": [{
                     "x": [float(x) for x in bin_centers.tolist()],
@@ -71,6 +89,9 @@ class Visualizer:
                     "max": max_val
                 }
             }
+            if approximate:
+                result["approximation"] = {"quantile_rank_error": column_sketch.quantile_sketch.rank_error()}
+            return result
         except Exception as e:
             print(f"Numeric distribution plot error: {e}")
             return {"error": f"Could not create numeric distribution plot: {str(e)}"}
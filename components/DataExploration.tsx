@@ -118,6 +118,29 @@ export default function DataExploration({ data, onDataUpdate }: DataExplorationP
     }
   }
 
+  const handleHistory = async (action: 'undo' | 'redo') => {
+    setLoading(true)
+    setMessage('')
+    
+    try {
+      const response = await axios.post(buildApiUrl(`/transformations/${action}`))
+      setMessage(`✅ ${response.data.message}`)
+      
+      // Update data via callback
+      if (onDataUpdate) {
+        onDataUpdate()
+      }
+    } catch (error: unknown) {
+      if (error instanceof Error) {
+        setMessage(`❌ Error: ${error.message}`)
+      } else {
+        setMessage(`❌ Error: ${error}`)
+      }
+    } finally {
+      setLoading(false)
+    }
+  }
+
   if (!data) {
     return (
       <div className="card text-center py-12">
@@ -161,6 +184,21 @@ export default function DataExploration({ data, onDataUpdate }: DataExplorationP
         >
           <span className="button_top">Outlier Detection</span>
         </button>
+        <div className="flex-1" />
+        <button
+          onClick={() => handleHistory('undo')}
+          disabled={loading}
+          className="btn-secondary btn-sm"
+        >
+          <span className="button_top">Undo</span>
+        </button>
+        <button
+          onClick={() => handleHistory('redo')}
+          disabled={loading}
+          className="btn-secondary btn-sm"
+        >
+          <span className="button_top">Redo</span>
+        </button>
       </div>
 
       {/* Column Analysis */}